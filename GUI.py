@@ -1,41 +1,23 @@
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QListWidget, QLineEdit, QHBoxLayout, QSpinBox, QComboBox, QGroupBox, QPushButton, QListWidgetItem, QMessageBox, QTextEdit, QSizePolicy, QTabWidget
-from phonenumbers import NumberParseException, PhoneNumberFormat
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QLabel, QListWidget, QLineEdit, QHBoxLayout, QSpinBox, QComboBox, QGroupBox, QPushButton, QListWidgetItem, QMessageBox, QTextEdit, QSizePolicy, QTabWidget, QListView, QPlainTextEdit
 from automateAIResponse import converse_with_AI
+from canonicalHandle import canonicalize_handle, format_handle
+from contactsSnapshot import diff_contacts, is_snapshot_stale, load_contacts_snapshot, refresh_contacts_snapshot
+from contactIndex import ContactIndex
+from outputLog import OUTPUT_LOG_MAX_LINES, OutputLog
+from pipelineMetrics import METRICS_JSONL_PATH, METRICS_PROMETHEUS_PATH, get_pipeline_metrics
 from PyQt5.QtCore import Qt, QTimer, QRegExp
-from PyQt5.QtGui import QRegExpValidator
+from PyQt5.QtGui import QRegExpValidator, QFontDatabase
 from PyQt5 import QtCore
-import phonenumbers
-import subprocess
 import threading
-import json
 import sys
 
-
-# function: compile swift script that fetches contacts
-# parameters: swift_file - string, executable_name - string
-# returns: success - boolean
-def compile_swift_script(swift_file, executable_name):
-    try:
-        subprocess.run(['swiftc', '-o', executable_name, swift_file], check=True) #compile swift script
-    except subprocess.CalledProcessError as e: #if error occurs during compilation
-        print(f"Error during Swift compilation: {e}") #print error
-        return False
-    return True
+SEARCH_DEBOUNCE_MS = 120 #milliseconds after the last keystroke before the contact list is filtered
 
 # function: get contacts from contacts file
 # parameters: none
 # returns: contacts - dictionary
 def get_contacts(): 
-    contacts_filename = 'ContactsFile' #name of storage file
-    compile_swift_script('FetchContacts.swift', contacts_filename) #compile swift script to fetch contacts
-    try:
-        result = subprocess.run([f'./{contacts_filename}'], capture_output=True, text=True, check=True) #get contacts from local file
-        contacts_json = result.stdout #get contacts from result stdout
-        sorted_contacts = dict(sorted(json.loads(contacts_json).items(), key=lambda x: x[0])) #sort contacts alphabetically
-        return sorted_contacts
-    except subprocess.CalledProcessError as e: #if error occurs during execution
-        print(f"Error: {e}") #print error
-        return None
+    return refresh_contacts_snapshot() #run the cached fetcher and save its output as the snapshot
     
 # class - widget for each thread in the list
 class ThreadItemWidget(QWidget):
@@ -80,17 +62,7 @@ class ThreadItemWidget(QWidget):
     # parameters: self - ThreadItemWidget, number - string
     # returns: formatted_number - string
     def format_phone_number(self, number):
-        try: 
-            if number.startswith('+'): #if number includes a country code
-                phone_number = phonenumbers.parse(number, None) #parse phone number
-                return phonenumbers.format_number(phone_number, PhoneNumberFormat.INTERNATIONAL) #format phone number
-            else: #if number does not include a country code
-                if len(number) == 10 and number.isdigit(): #if number is 10 digits
-                    return f"{number[:3]}-{number[3:6]}-{number[6:]}" #format number as xxx-xxx-xxxx
-                else: #if number is not 10 digits
-                    return number #return number as is
-        except NumberParseException: #if number is invalid
-            return number #return number as is
+        return format_handle(number) #parsed once per number, then cached
 
     # function: mouse double click event handler
     # parameters: self - ThreadItemWidget, event - QMouseEvent
@@ -111,7 +83,7 @@ class EmittingStream(QtCore.QObject):
 # class - custom line edit for search box
 class CustomLineEdit(QLineEdit):
     # function: constructor
-    # parameters: contact_list - QListWidget, *args, **kwargs
+    # parameters: contact_list - QListView, *args, **kwargs
     # returns: nothing
     def __init__(self, contact_list, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -122,33 +94,167 @@ class CustomLineEdit(QLineEdit):
     # returns: nothing
     def keyPressEvent(self, event):
         if event.key() == Qt.Key_Down: #if down arrow key is pressed
-            if self.contact_list.count() > 0: #if contact list is not empty
+            if self.contact_list.model().rowCount() > 0: #if contact list is not empty
                 self.contact_list.setFocus() #set focus to contact list
-                self.contact_list.setCurrentRow(0) #set current row to 0
+                self.contact_list.setCurrentIndex(self.contact_list.model().index(0, 0)) #set current row to 0
         else: 
             super().keyPressEvent(event) #call super key press event handler
 
-# class - custom list widget for contact list
-class CustomListWidget(QListWidget):
+# class - custom list view for contact list
+class CustomListView(QListView):
     # function: constructor
     # parameters: search_box - CustomLineEdit, *args, **kwargs
     # returns: nothing
     def __init__(self, search_box, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.search_box = search_box #set search box
+        self.setUniformItemSizes(True) #let the view lay out rows without measuring each one
 
     # function: key press event handler
-    # parameters: self - CustomListWidget, event - QKeyEvent
+    # parameters: self - CustomListView, event - QKeyEvent
     # returns: nothing
     def keyPressEvent(self, event):
-        if event.key() == Qt.Key_Up and self.currentRow() == 0: #if up arrow key is pressed and current row is 0
+        if event.key() == Qt.Key_Up and self.currentIndex().row() == 0: #if up arrow key is pressed and current row is 0
             self.search_box.setFocus() #set focus to search box
         else:
             super().keyPressEvent(event) #call super key press event handler
 
 
+# class - list model of contact names
+class ContactListModel(QtCore.QAbstractListModel):
+    # function: constructor
+    # parameters: self - ContactListModel, names - list of strings, parent - QObject
+    # returns: nothing
+    def __init__(self, names=(), parent=None):
+        super().__init__(parent)
+        self.names = list(names) #contact names in display order
+
+    # function: get the number of contacts
+    # parameters: self - ContactListModel, parent - QModelIndex
+    # returns: row count - int
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    # function: get the name shown for a row
+    # parameters: self - ContactListModel, index - QModelIndex, role - int
+    # returns: name - string or None
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.names[index.row()]
+        return None
+
+    # function: replace every contact name
+    # parameters: self - ContactListModel, names - list of strings
+    # returns: nothing
+    def set_names(self, names):
+        self.beginResetModel()
+        self.names = list(names)
+        self.endResetModel()
+
+# class - proxy showing the contact rows matched by a search, in rank order
+class ContactFilterProxy(QtCore.QAbstractProxyModel):
+    # function: constructor
+    # parameters: self - ContactFilterProxy, parent - QObject
+    # returns: nothing
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = [] #source rows shown, in order
+        self.positions = None #map of source row to proxy row, built when first needed
+
+    # function: set the model being filtered, showing every row
+    # parameters: self - ContactFilterProxy, model - ContactListModel
+    # returns: nothing
+    def setSourceModel(self, model):
+        self.beginResetModel()
+        super().setSourceModel(model)
+        self.rows = list(range(model.rowCount()))
+        self.positions = None
+        self.endResetModel()
+        model.modelReset.connect(self.reset_rows) #show every row again when contacts are replaced
+
+    # function: show every source row
+    # parameters: self - ContactFilterProxy
+    # returns: nothing
+    def reset_rows(self):
+        self.beginResetModel()
+        self.rows = list(range(self.sourceModel().rowCount()))
+        self.positions = None
+        self.endResetModel()
+
+    # function: show the given source rows, telling the view only about the rows that changed
+    # parameters: self - ContactFilterProxy, rows - list of ints
+    # returns: nothing
+    def set_rows(self, rows):
+        old_rows = self.rows
+        shortest = min(len(old_rows), len(rows))
+        prefix = 0
+        while prefix < shortest and old_rows[prefix] == rows[prefix]: #rows kept at the start
+            prefix += 1
+        suffix = 0
+        while suffix < shortest - prefix and old_rows[-1 - suffix] == rows[-1 - suffix]: #rows kept at the end
+            suffix += 1
+        if len(old_rows) - suffix > prefix: #if rows in between were removed
+            self.beginRemoveRows(QtCore.QModelIndex(), prefix, len(old_rows) - suffix - 1)
+            self.rows = old_rows[:prefix] + old_rows[len(old_rows) - suffix:]
+            self.positions = None
+            self.endRemoveRows()
+        if len(rows) - suffix > prefix: #if rows in between were added
+            self.beginInsertRows(QtCore.QModelIndex(), prefix, len(rows) - suffix - 1)
+            self.rows = list(rows)
+            self.positions = None
+            self.endInsertRows()
+
+    # function: get the number of rows shown
+    # parameters: self - ContactFilterProxy, parent - QModelIndex
+    # returns: row count - int
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    # function: get the number of columns
+    # parameters: self - ContactFilterProxy, parent - QModelIndex
+    # returns: column count - int
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 1
+
+    # function: get the index of a shown row
+    # parameters: self - ContactFilterProxy, row - int, column - int, parent - QModelIndex
+    # returns: index - QModelIndex
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if parent.isValid() or column != 0 or not 0 <= row < len(self.rows):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    # function: get the parent of an index, which is always the root for a list
+    # parameters: self - ContactFilterProxy, index - QModelIndex or None
+    # returns: parent - QModelIndex, or the parent QObject when called without an index
+    def parent(self, index=None):
+        if index is None:
+            return super().parent()
+        return QtCore.QModelIndex()
+
+    # function: map a shown row to its contact
+    # parameters: self - ContactFilterProxy, proxy_index - QModelIndex
+    # returns: source index - QModelIndex
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QtCore.QModelIndex()
+        return self.sourceModel().index(self.rows[proxy_index.row()], 0)
+
+    # function: map a contact to its shown row
+    # parameters: self - ContactFilterProxy, source_index - QModelIndex
+    # returns: proxy index - QModelIndex, invalid if the contact is filtered out
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QtCore.QModelIndex()
+        if self.positions is None:
+            self.positions = {row: position for position, row in enumerate(self.rows)}
+        position = self.positions.get(source_index.row())
+        return self.index(position, 0) if position is not None else QtCore.QModelIndex()
+
 # class - Graphical User Interface
 class App(QMainWindow):
+    contactsLoaded = QtCore.pyqtSignal(dict, object) #emitted from the loading thread with contacts and their search index
+
     # function: constructor
     # parameters: self - App
     # returns: nothing
@@ -157,7 +263,8 @@ class App(QMainWindow):
         self.setWindowTitle("Chat Pilot") #set title
         self.setGeometry(100, 100, 900, 600) #set window size and location
 
-        self.contacts = get_contacts() or {} #get the contacts from the contacts file
+        self.contacts, fetched_at = load_contacts_snapshot() #open instantly from the last saved contacts
+        self.contact_index = None #search index, built in the background
         self.contact_info = (None, None) #set contact info to None
 
         self.main_widget = QWidget() #create horizontal layout
@@ -169,10 +276,38 @@ class App(QMainWindow):
         self.running_threads = [] #initialize list of tuples containing the thread, stop flag, and thread info
 
         self.current_output_buffer = None #initialize the current output buffer to None
+        self.console_sequence = 0 #sequence number of the next output line to show in the console
+        self.current_metrics_number = None #recipient number of the conversation whose stage timings are shown
         self.update_timer = QTimer(self) #create a timer to update the console output area
         self.update_timer.timeout.connect(self.update_console_output_area) #connect the timeout signal to the update_console_output_area method
+        self.update_timer.timeout.connect(self.update_metrics_area) #refresh stage timings on the same tick
         self.update_timer.start(1000)  #update every 1000 milliseconds (1 second)
 
+        self.contactsLoaded.connect(self.apply_contacts) #apply loaded contacts on the UI thread
+        threading.Thread(target=self.load_contacts, args=(dict(self.contacts), fetched_at), daemon=True).start() #index and refresh contacts without blocking the window
+
+    # function: index contacts in the background, then refresh them if the snapshot is stale
+    # parameters: self - App, contacts - dictionary, fetched_at - float or None
+    # returns: nothing
+    def load_contacts(self, contacts, fetched_at):
+        self.contactsLoaded.emit(contacts, ContactIndex(sorted(contacts))) #hand the snapshot's index to the UI thread
+        if is_snapshot_stale(fetched_at): #if the snapshot is missing or old
+            refreshed = get_contacts() #run fetcher
+            if refreshed is not None and any(diff_contacts(contacts, refreshed)): #if contacts changed since the snapshot
+                self.contactsLoaded.emit(refreshed, ContactIndex(sorted(refreshed))) #hand refreshed contacts to the UI thread
+
+    # function: apply loaded contacts and their search index to the contact list
+    # parameters: self - App, contacts - dictionary, contact_index - ContactIndex
+    # returns: nothing
+    def apply_contacts(self, contacts, contact_index):
+        added, removed, changed = diff_contacts(self.contacts, contacts) #find what changed since the snapshot
+        if added or removed or changed:
+            self.contacts = contacts #set contacts
+        if added or removed: #if the names shown have changed
+            self.contact_model.set_names(contact_index.names) #replace contact names
+        self.contact_index = contact_index #set search index
+        self.filter_contacts(self.search_box.text()) #filter contact list, keeping the current search
+
     # function: create contact list
     # parameters: self - App
     # returns: contact_list_group - QGroupBox
@@ -182,17 +317,28 @@ class App(QMainWindow):
         #Contacts Tab
         layout = QVBoxLayout() #create vertical layout for group box
 
-        contact_list = CustomListWidget(None) #create list widget for contact list
+        contact_list = CustomListView(None) #create list view for contact list
         search_box = CustomLineEdit(contact_list) #create line edit for search box
 
+        self.contact_model = ContactListModel(sorted(self.contacts.keys())) #create model of contact names
+        self.contact_proxy = ContactFilterProxy(self) #create proxy showing the contacts matching the search
+        self.contact_proxy.setSourceModel(self.contact_model)
+        contact_list.setModel(self.contact_proxy) #show filtered contacts in contact list
+
+        self.search_timer = QTimer(self) #wait for typing to pause before filtering
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(lambda: self.filter_contacts(search_box.text())) #filter contacts once typing pauses
+
         search_box.setPlaceholderText("Search contacts...") #set placeholder text for search box
-        search_box.textChanged.connect(lambda text: self.filter_contacts(text, contact_list)) #connect text changed signal to filter_contacts
+        search_box.textChanged.connect(self.search_timer.start) #restart the debounce timer on every keystroke
 
-        contact_list.search_box = search_box #set reference to search box in the list widget
-        contact_list.addItems(sorted(self.contacts.keys())) #add contacts to contact list
+        contact_list.search_box = search_box #set reference to search box in the list view
+        self.contact_list = contact_list #keep references so refreshed contacts can be applied
+        self.search_box = search_box
 
-        contact_list.currentRowChanged.connect( #connect current row changed signal to contact_selected
-            lambda row: self.contact_selected(contact_list.item(row)) #call contact_selected in lambda function
+        contact_list.selectionModel().currentRowChanged.connect( #connect current row changed signal to contact_selected
+            lambda current, previous: self.contact_selected(current.data()) #call contact_selected with the selected name
         )
 
         layout.addWidget(search_box) #add search box to layout
@@ -250,19 +396,18 @@ class App(QMainWindow):
             self.contact_info = (self.contact_info[0], phone) #update the phone number in self.contact_info
 
     # function: filter contacts
-    # parameters: self - App, text - string, contact_list - QListWidget
+    # parameters: self - App, text - string
     # returns: nothing
-    def filter_contacts(self, text, contact_list):
-        contact_list.clear() #clear contact list
-        filtered_contacts = [name for name in self.contacts if text.lower() in name.lower()] #get filtered contacts
-        contact_list.addItems(filtered_contacts) #add filtered contacts to contact list
+    def filter_contacts(self, text):
+        if self.contact_index is None: #if contacts are still being indexed, the search is applied once they are
+            return
+        self.contact_proxy.set_rows(self.contact_index.search(text)) #show matching contacts, best first
 
     # function: get selected contact
-    # parameters: self - App, item - QListWidgetItem
+    # parameters: self - App, contact_name - string or None
     # returns: nothing
-    def contact_selected(self, item):
-        if item: #if item is not None
-            contact_name = item.text() #get contact name
+    def contact_selected(self, contact_name):
+        if contact_name: #if a contact is selected
             self.contact_info = (contact_name, self.contacts[contact_name]) #set contact info to contact name and contact number
     
     # function: set up layout
@@ -367,13 +512,31 @@ class App(QMainWindow):
         self.detailed_text_area.hide() #hide detailed info text edit
         self.right_side_layout.addWidget(self.detailed_text_area) #add detailed info text edit to right side layout
 
+        # Stage Timings
+        self.metrics_label = QLabel("Stage Timings (seconds)", self) #create label for stage timings
+        self.metrics_label.hide() #hide stage timings label
+        self.right_side_layout.addWidget(self.metrics_label) #add stage timings label to right side layout
+
+        self.metrics_area = QPlainTextEdit(self) #create text edit for stage timings
+        self.metrics_area.setReadOnly(True) #set stage timings text edit to read only
+        self.metrics_area.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont)) #align the timing table
+        self.metrics_area.setFixedHeight(180) #set fixed height for stage timings text edit
+        self.metrics_area.hide() #hide stage timings text edit
+        self.right_side_layout.addWidget(self.metrics_area) #add stage timings text edit to right side layout
+
+        self.export_metrics_button = QPushButton("Export Metrics") #create export metrics button
+        self.export_metrics_button.clicked.connect(self.export_metrics) #connect export metrics button to export_metrics
+        self.export_metrics_button.hide() #hide export metrics button
+        self.right_side_layout.addWidget(self.export_metrics_button) #add export metrics button to right side layout
+
         # Console Output
         self.console_output_label = QLabel("Console Output", self) #create label for console output
         self.console_output_label.hide() #hide console output label
         self.right_side_layout.addWidget(self.console_output_label) #add console output label to right side layout
 
-        self.console_output_area = QTextEdit(self) #create text edit for console output
+        self.console_output_area = QPlainTextEdit(self) #create text edit for console output
         self.console_output_area.setReadOnly(True) #set console output text edit to read only
+        self.console_output_area.setMaximumBlockCount(OUTPUT_LOG_MAX_LINES) #trim the oldest lines so long conversations stay cheap to show
         self.console_output_area.hide() #hide console output text edit
         self.right_side_layout.addWidget(self.console_output_area) #add console output text edit to right side layout
 
@@ -425,7 +588,7 @@ class App(QMainWindow):
         
         for thread, _, thread_info in self.running_threads: #for each thread in running threads
             if thread.is_alive():
-                if thread_info['recipient_number'] == target_number: #if thread is alive and recipient is target name
+                if canonicalize_handle(thread_info['recipient_number']) == canonicalize_handle(target_number): #if thread is alive and recipient is the same number, however it is formatted
                     QMessageBox.warning(self, "Error", f"A conversation with {thread_info['recipient_number']} is already in progress. Please choose a different contact.") #show error message
                     return
                 
@@ -440,7 +603,7 @@ class App(QMainWindow):
             "conversation_context": self.conversation_context
         }
         stop_flag = threading.Event() #create stop flag
-        output_buffer = [] #create output buffer
+        output_buffer = OutputLog() #create bounded output buffer
         thread = threading.Thread(target=self.ai_conversation, args=(stop_flag, output_buffer)) #create thread
         thread.daemon = True #set thread to daemon
         thread.start() #start thread
@@ -449,7 +612,7 @@ class App(QMainWindow):
         self.update_thread_list() #update thread list
 
     # function: begin AI conversation
-    # parameters: self - App, stop_flag - threading.Event, output_buffer - list
+    # parameters: self - App, stop_flag - threading.Event, output_buffer - OutputLog
     # returns: nothing
     def ai_conversation(self, stop_flag, output_buffer):
         converse_with_AI(self.contact_info[1], self.contact_info[0], self.user_name, self.relation_description, self.words_per_minute, self.conversation_context, self.selected_model, stop_flag, output_buffer) #call converse_with_AI
@@ -490,8 +653,15 @@ class App(QMainWindow):
 
         _, _, thread_info = self.running_threads[thread_index] #get the thread info
         self.current_output_buffer = thread_info['output_buffer'] #set the current output buffer to the thread's output buffer
+        self.console_output_area.clear() #clear output of the previously shown thread
+        self.current_metrics_number = thread_info['recipient_number'] #show the thread's stage timings
+        self.update_metrics_area() #update the stage timings area
+        self.console_sequence = 0 #show the thread's output from its oldest kept line
         self.update_console_output_area() #update the console output area
 
+        self.metrics_label.show() #show the stage timings label
+        self.metrics_area.show() #show the stage timings area
+        self.export_metrics_button.show() #show the export metrics button
         self.console_output_label.show() #show the console output label
         self.console_output_area.show() #show the console output area
 
@@ -503,20 +673,51 @@ class App(QMainWindow):
         scrollbar_position = scrollbar.value() #get the scrollbar position
         scrollbar_at_max = scrollbar_position == scrollbar.maximum() #check if the scrollbar is at its maximum position
         
-        if self.current_output_buffer: #if the current output buffer is not None
-            self.console_output_area.setPlainText('\n'.join(self.current_output_buffer)) #set the console output area to the current output buffer
+        if self.current_output_buffer is not None: #if the current output buffer is not None
+            lines, self.console_sequence, dropped = self.current_output_buffer.read_since(self.console_sequence) #get lines added since the last update
+            if dropped: #if lines were dropped from the buffer before they were shown
+                self.console_output_area.appendPlainText(f"... {dropped} earlier lines not kept ...")
+            if lines:
+                self.console_output_area.appendPlainText('\n'.join(lines)) #append only the new lines
 
         if scrollbar_at_max: #if the scrollbar was at its maximum position
             scrollbar.setValue(scrollbar.maximum()) #set the scrollbar to its new maximum position
         else: #if the scrollbar was not at its maximum position
             scrollbar.setValue(scrollbar_position) #set the scrollbar to its previous position
             
+    # function: update the stage timings of the shown conversation
+    # parameters: self - App
+    # returns: nothing
+    def update_metrics_area(self):
+        if self.current_metrics_number is None: #if no conversation is shown
+            return
+        summary = get_pipeline_metrics().format_summary(self.current_metrics_number) #get the conversation's stage timings
+        if summary != self.metrics_area.toPlainText(): #repaint only when the timings changed
+            self.metrics_area.setPlainText(summary)
+
+    # function: write stage timings of every conversation to the metrics files
+    # parameters: self - App
+    # returns: nothing
+    def export_metrics(self):
+        metrics = get_pipeline_metrics() #get shared pipeline metrics
+        try:
+            metrics.export_prometheus() #write histograms in prometheus text format
+            span_count = metrics.export_jsonl() #write recent spans as json lines
+        except OSError as e: #if the files could not be written
+            QMessageBox.warning(self, "Error", f"Could not export metrics: {e}") #show error message
+            return
+        QMessageBox.information(self, "Metrics Exported", f"Wrote {METRICS_PROMETHEUS_PATH} and {span_count} spans to {METRICS_JSONL_PATH}.") #show where the metrics were written
+
     # function: return to thread list
     # parameters: self - App
     # returns: nothing
     def return_to_thread_list(self):
         self.return_to_thread_list_button.hide() #hide the return to thread list button
         self.detailed_text_area.hide() #hide the detailed text area
+        self.metrics_label.hide() #hide the stage timings label
+        self.metrics_area.hide() #hide the stage timings area
+        self.export_metrics_button.hide() #hide the export metrics button
+        self.current_metrics_number = None #stop refreshing stage timings
         self.console_output_label.hide() #hide the console output label
         self.console_output_area.hide() #hide the console output area
 
@@ -0,0 +1,102 @@
+import asyncio
+import random
+import threading
+import time
+import os
+import httpx
+from openai import AsyncOpenAI
+
+API_BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1") #set OPENAI_BASE_URL to point every request at a local stub
+CONNECT_TIMEOUT = 10 #seconds to open a connection
+REQUEST_TIMEOUT = 60 #seconds for a single request before it is abandoned
+CALL_DEADLINE = 120 #seconds for a call including its retries
+MAX_RETRIES = 3 #retries after a 429, a 5xx or a connection error
+RETRY_BASE_DELAY = 0.5 #seconds before the first retry, doubled for each retry after
+RETRY_MAX_DELAY = 8 #longest backoff between retries
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504} #statuses worth retrying
+MAX_CONNECTIONS = 20 #connections kept open to the API
+MAX_KEEPALIVE_CONNECTIONS = 10 #idle connections kept alive for reuse
+
+HTTP_TIMEOUT = httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT) #timeout of each request
+HTTP_LIMITS = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS) #connection pool size
+
+_async_openai_client = None #async OpenAI client shared by every conversation
+_async_http_client = None #async HTTP client shared by every conversation
+_clients_lock = threading.Lock()
+
+# function: get the url of an API endpoint
+# parameters: path - string
+# returns: url - string
+def get_api_url(path):
+    return f"{API_BASE_URL}/{path}"
+
+# function: get the headers for a raw request to the API
+# parameters: none
+# returns: headers - dictionary
+def get_openai_headers():
+    api_key = os.getenv('OPENAI_API_KEY') #get OpenAI API key
+    return {
+        "Content-Type": "application/json", #set content type to json
+        "Authorization": f"Bearer {api_key}" #set authorization to api key
+    }
+
+# function: get the shared async OpenAI client, called on the engine's loop
+# parameters: none
+# returns: client - AsyncOpenAI
+def get_async_openai_client():
+    global _async_openai_client
+    with _clients_lock:
+        if _async_openai_client is None:
+            http_client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS) #pooled keep-alive connections
+            _async_openai_client = AsyncOpenAI(base_url=API_BASE_URL, timeout=HTTP_TIMEOUT, max_retries=MAX_RETRIES, http_client=http_client) #the client backs off with jitter on 429 and 5xx
+        return _async_openai_client
+
+# function: get the shared async HTTP client, called on the engine's loop
+# parameters: none
+# returns: client - httpx.AsyncClient
+def get_async_http_client():
+    global _async_http_client
+    with _clients_lock:
+        if _async_http_client is None:
+            _async_http_client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS) #pooled keep-alive connections
+        return _async_http_client
+
+# function: get how long to wait before a retry, with full jitter so conversations do not retry in step
+# parameters: attempt - int, response - httpx.Response or None
+# returns: delay in seconds
+def get_retry_delay(attempt, response=None):
+    if response is not None:
+        try:
+            return min(float(response.headers["retry-after"]), RETRY_MAX_DELAY) #honor the server's retry-after
+        except (KeyError, ValueError):
+            pass
+    return random.uniform(0, min(RETRY_BASE_DELAY * 2 ** attempt, RETRY_MAX_DELAY))
+
+# function: check whether a failed request should be retried
+# parameters: attempt - int, deadline - float, delay - float
+# returns: should retry - boolean
+def should_retry(attempt, deadline, delay):
+    return attempt < MAX_RETRIES and time.monotonic() + delay < deadline
+
+# function: post a json request to the API, retrying 429, 5xx and connection errors
+# parameters: path - string, payload - dictionary
+# returns: response data - dictionary
+async def post_json_async(path, payload):
+    deadline = time.monotonic() + CALL_DEADLINE #give up once the call deadline has passed
+    attempt = 0
+    while True:
+        response = None
+        try:
+            response = await get_async_http_client().post(get_api_url(path), headers=get_openai_headers(), json=payload) #send request
+            if response.status_code not in RETRY_STATUSES:
+                response.raise_for_status() #raise on other errors
+                return response.json()
+        except httpx.TransportError: #if the connection failed or timed out
+            pass
+        delay = get_retry_delay(attempt, response)
+        if not should_retry(attempt, deadline, delay): #if out of retries
+            if response is not None:
+                response.raise_for_status() #raise the last error status
+            raise httpx.TimeoutException(f"request to {path} failed after {attempt + 1} attempts")
+        await asyncio.sleep(delay) #back off before retrying
+        attempt += 1
@@ -0,0 +1,431 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import openai
+from automateAIResponse import DB_PATH, ENRICHMENT_WORKERS, PERSONA_LEAK_MARKER, RESPONSE_CANDIDATES, STREAM_RESPONSES, VIDEO_EXCUSE, StreamingResponse, TypingSchedule, build_described_message, build_image_batch_payload, build_image_description_payload, build_rephrase_message, build_response_messages, check_for_images, choose_candidate, classify_message, encode_image_safely, encode_image_to_base64, feed_candidate_chunk, format_description_prompt, format_image_description, get_batched_image_indexes, parse_image_batch_descriptions, plan_image_batches, record_response_path
+from mediaCache import get_media_cache
+from apiClients import get_async_openai_client, post_json_async
+from audioPipeline import transcode_audio
+from conversationHistory import ConversationHistory, count_message_tokens, count_tokens, load_encoding, summarize_history_async
+from pipelineMetrics import current_conversation, get_pipeline_metrics
+from messageWatcher import ConversationCursor, get_message_watcher
+from messageSender import get_message_sender
+from checkpointStore import get_checkpoint_store, get_resume_id
+from canonicalHandle import canonicalize_handle
+
+EXECUTOR_WORKERS = 16 #threads used for sqlite, Pillow and pydub work
+STOP_CHECK_INTERVAL = 0.25 #seconds between stop flag checks in the thread adapter
+CONVERSATION_RULE_SET = "converse_with_AI" #checkpoint rule set of AI conversations
+
+# class - one event loop thread that runs every conversation
+class ConversationEngine:
+    # function: constructor
+    # parameters: self - ConversationEngine, executor_workers - int
+    # returns: nothing
+    def __init__(self, executor_workers=EXECUTOR_WORKERS):
+        self.loop = asyncio.new_event_loop() #create event loop
+        executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="conversation-io")
+        self.loop.set_default_executor(executor) #bound blocking work
+        executor.submit(load_encoding) #load the token encoding off the loop, token counts are estimated until it is ready
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True) #create event loop thread
+        self.thread.start() #start event loop thread
+
+    # function: schedule a coroutine on the engine's loop from any thread
+    # parameters: self - ConversationEngine, coroutine - coroutine
+    # returns: future - concurrent.futures.Future
+    def run_coroutine(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    # function: run a coroutine from a blocking thread, cancelling it when the stop flag is set
+    # parameters: self - ConversationEngine, coroutine - coroutine, stop_flag - threading.Event
+    # returns: result of the coroutine, or None if it was stopped
+    def run_until_stopped(self, coroutine, stop_flag):
+        future = self.run_coroutine(coroutine) #schedule coroutine
+        while not future.done(): #loop until the coroutine finishes
+            if stop_flag.wait(STOP_CHECK_INTERVAL): #if stop flag is set
+                future.cancel() #cancel the task at its current await
+                return None
+        return future.result() #return result or raise the coroutine's exception
+
+_engine = None #shared conversation engine
+_engine_lock = threading.Lock()
+
+# function: get the shared conversation engine, starting it on first use
+# parameters: none
+# returns: engine - ConversationEngine
+def get_conversation_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = ConversationEngine() #start engine
+        return _engine
+
+# function: wait until the watcher routes rows to a subscription
+# parameters: subscription - Subscription
+# returns: nothing
+async def wait_for_rows_async(subscription):
+    loop = asyncio.get_running_loop() #get event loop
+    event = asyncio.Event() #create event set from the watcher thread
+    listener = lambda: loop.call_soon_threadsafe(event.set) #wake this loop from the watcher thread
+    subscription.listeners.append(listener) #register before checking so no row is missed
+    try:
+        if not subscription.ready.is_set(): #if no rows are waiting
+            await event.wait() #sleep until rows are routed
+    finally:
+        subscription.listeners.remove(listener) #unregister listener
+
+# function: describe, transcribe or clean a single message
+# parameters: message - message row, output_buffer - list
+# returns: message, or None for reactions and unsupported attachments
+async def enrich_message_async(message, output_buffer):
+    kind, message_id, text, is_media, file_type, filepath, attachment_id = classify_message(message)
+    if kind == "image": #if message is an image
+        text = await get_media_cache().get_or_compute_async("image", attachment_id, filepath, lambda: generate_image_description_async(filepath, output_buffer)) #describe each image once
+    elif kind == "video":
+        text = VIDEO_EXCUSE #use excuse for video
+    elif kind == "audio":
+        text = await get_media_cache().get_or_compute_async("audio", attachment_id, filepath, lambda: generate_audio_transcript_async(filepath, output_buffer)) #transcribe each voice memo once
+    elif kind is None: #if message is a reaction or an unsupported attachment
+        return None
+    return (message_id, text, is_media, file_type, filepath)
+
+_enrichment_semaphore = None #bounds media requests across every conversation, created on the engine's loop
+
+# function: get the shared enrichment semaphore, called on the engine's loop
+# parameters: none
+# returns: semaphore - asyncio.Semaphore
+def get_enrichment_semaphore():
+    global _enrichment_semaphore
+    if _enrichment_semaphore is None:
+        _enrichment_semaphore = asyncio.Semaphore(ENRICHMENT_WORKERS) #create semaphore on first use
+    return _enrichment_semaphore
+
+# function: enrich a message, isolating failures so one bad attachment does not block the reply
+# parameters: message - message row, output_buffer - list
+# returns: message, or None if it was skipped or failed
+async def enrich_message_safely_async(message, output_buffer):
+    try:
+        processed_message = await enrich_message_async(message, output_buffer) #the vision and whisper requests take their own slots
+    except Exception as e:
+        output_buffer.append(f"attachment error: {e}\n")
+        return None
+    if processed_message is not None and processed_message[1] is None: #if the description or transcript failed
+        output_buffer.append(f"skipping attachment {processed_message[4]}\n")
+        return None
+    return processed_message
+
+# function: deal with attachments and reactions, enriching every message of a burst concurrently
+# parameters: messages - list of message rows, output_buffer - list
+# returns: list of messages, in the original order
+async def postprocess_messages_async(messages, output_buffer):
+    batched = get_batched_image_indexes(messages) #images described together in as few requests as possible
+    others = [index for index in range(len(messages)) if index not in batched]
+    enriched, described = await asyncio.gather(
+        asyncio.gather(*(enrich_message_safely_async(messages[index], output_buffer) for index in others)), #gather keeps the original order
+        describe_image_rows_async([messages[index] for index in batched], output_buffer)) #describe images alongside the rest
+    processed_messages = dict(zip(others, enriched))
+    processed_messages.update(zip(batched, described)) #add image descriptions in place
+    processed_messages = [processed_messages[index] for index in range(len(messages))]
+    return [message for message in processed_messages if message is not None] #return messages
+
+# function: get the unanswered messages of a conversation, normalizing only rows that arrived since the last call
+# parameters: cursor - ConversationCursor, output_buffer - list
+# returns: list of messages
+async def get_cursor_messages_async(cursor, output_buffer):
+    new_rows = cursor.fetch_new_rows() #get rows routed since the last call
+    if new_rows:
+        with get_pipeline_metrics().span("normalize", messages=len(new_rows)): #time normalization, including image descriptions and transcripts
+            cursor.add_pending(await postprocess_messages_async(new_rows[::-1], output_buffer)) #postprocess new rows, newest first
+    return cursor.pending #return unanswered messages
+
+# function: generate a response, streaming it so a broken persona is caught mid-response
+# parameters: client - AsyncOpenAI, gpt_model - string, messages - list of prompt messages, response - StreamingResponse, check_persona - boolean, stream - boolean
+# returns: response - StreamingResponse
+async def stream_completion_async(client, gpt_model, messages, response, check_persona=True, stream=STREAM_RESPONSES):
+    if not stream: #if streaming is disabled
+        completion = await client.chat.completions.create(model=gpt_model, messages=messages) #generate response from GPT
+        response.feed(completion.choices[0].message.content) #add full response
+        return response
+    chunks = await client.chat.completions.create(model=gpt_model, messages=messages, stream=True) #stream response from GPT
+    async for chunk in chunks: #for each streamed chunk
+        delta = chunk.choices[0].delta.content if chunk.choices else None #get chunk text
+        if delta and response.feed(delta) and check_persona: #if the response refers to AI
+            await chunks.response.aclose() #stop paying for a response that will be rephrased
+            break
+    return response
+
+# function: generate several candidates in one request, stopping at the first that finishes in persona
+# parameters: client - AsyncOpenAI, gpt_model - string, messages - list of prompt messages, count - int, stream - boolean
+# returns: (candidates - list of StreamingResponse, chosen - index of the chosen candidate or None if every candidate refers to AI)
+async def generate_candidates_async(client, gpt_model, messages, count=RESPONSE_CANDIDATES, stream=STREAM_RESPONSES):
+    candidates = [StreamingResponse() for _ in range(count)]
+    if not stream: #if streaming is disabled
+        completion = await client.chat.completions.create(model=gpt_model, messages=messages, n=count) #generate candidates from GPT
+        for choice in completion.choices:
+            candidates[choice.index].feed(choice.message.content) #add full candidate
+        return candidates, next((index for index, candidate in enumerate(candidates) if not candidate.leaked), None)
+    chunks = await client.chat.completions.create(model=gpt_model, messages=messages, n=count, stream=True) #stream candidates from GPT
+    async for chunk in chunks: #for each streamed chunk
+        chosen = feed_candidate_chunk(candidates, chunk)
+        if chosen is not None: #if a candidate is ready
+            await chunks.response.aclose() #stop paying for the other candidates
+            return candidates, chosen
+    return candidates, None
+
+# function: generate a response from GPT, rephrasing it if it refers to AI
+# parameters: incoming_message - string, conversation_history - ConversationHistory or list of messages, user_name - string, recipient_name - string, recipient_description - string, conversation_context - string, gpt_model - string, contains_images - boolean, output_buffer - list, schedule - TypingSchedule or None
+# returns: response message
+async def generate_response_async(incoming_message, conversation_history, user_name, recipient_name, recipient_description, conversation_context, gpt_model, contains_images, output_buffer, schedule=None):
+    client = get_async_openai_client() #get shared OpenAI client
+
+    messages, incoming_message = build_response_messages(incoming_message, conversation_history, user_name, recipient_name, recipient_description, conversation_context, contains_images, output_buffer) #build prompt
+
+    with get_pipeline_metrics().span("completion", prompt_tokens=count_message_tokens(messages)) as span: #time the model call, with estimated token counts
+        try:
+            if RESPONSE_CANDIDATES > 1: #if several candidates are requested at once
+                response, path = choose_candidate(*await generate_candidates_async(client, gpt_model, messages)) #generate candidates from GPT
+            else:
+                response = (await stream_completion_async(client, gpt_model, messages, StreamingResponse())).text #generate response from GPT
+                path = None if PERSONA_LEAK_MARKER in response else "first_candidate"
+        except openai.APIError as e:
+            output_buffer.append(f"OpenAI API error: {e}\n")
+            span.fields["error"] = type(e).__name__ #mark the span as failed
+            return None
+
+        if path is None: #if response contains AI
+            output_buffer.append(f"AI detected in response...\n\n {response}\n\n Rephrasing...\n")
+            messages.append(build_rephrase_message(response)) #add rephrased response to messages
+            try:
+                response = (await stream_completion_async(client, gpt_model, messages, StreamingResponse(), check_persona=False)).text #generate response from GPT
+            except openai.APIError as e:
+                output_buffer.append(f"OpenAI API error: {e}\n")
+                span.fields["error"] = type(e).__name__ #mark the span as failed
+                return None
+            path = "repair"
+        span.fields["completion_tokens"] = count_tokens(response)
+        span.fields["path"] = path
+    record_response_path(path, output_buffer) #log which path produced the reply
+    if schedule is not None:
+        schedule.update(response) #count words once, for the finished response
+
+    conversation_history.append({"role": "user", "content": incoming_message}) #add incoming message to conversation history
+    conversation_history.append({"role": "assistant", "content": response}) #add response to conversation history
+
+    return response #return response
+
+# function: describe an image with the vision model
+# parameters: filepath - string, output_buffer - list
+# returns: formatted image description
+async def generate_image_description_async(filepath, output_buffer):
+    loop = asyncio.get_running_loop() #get event loop
+    base64_image = await loop.run_in_executor(None, encode_image_to_base64, filepath) #encode image off the loop
+    payload = build_image_description_payload(base64_image) #build vision request
+    try:
+        async with get_enrichment_semaphore(): #wait for a free slot around the request only, never across a cache claim
+            with get_pipeline_metrics().span("image_description", images=1): #time the vision request
+                response_data = await post_json_async("chat/completions", payload) #generate response from GPT
+    except Exception as e:
+        output_buffer.append(f"OpenAI API error: {e}\n")
+        return None
+
+    return format_image_description(response_data, output_buffer) #return formatted image description
+
+# function: describe a batch of images with one vision request under the enrichment semaphore, falling back to one request per image
+# parameters: base64_images - list of strings, output_buffer - list
+# returns: list of formatted image descriptions or None, in order
+async def describe_image_batch_async(base64_images, output_buffer):
+    async with get_enrichment_semaphore(): #wait for a free slot
+        if len(base64_images) > 1: #if the batch needs a multi-image request
+            try:
+                with get_pipeline_metrics().span("image_description", images=len(base64_images)): #time the batched vision request
+                    descriptions = parse_image_batch_descriptions(await post_json_async("chat/completions", build_image_batch_payload(base64_images)), len(base64_images)) #generate descriptions from GPT
+            except Exception as e:
+                output_buffer.append(f"OpenAI API error: {e}\n")
+                descriptions = None
+            if descriptions is not None:
+                return [format_description_prompt(description, output_buffer) for description in descriptions]
+            output_buffer.append("batched image descriptions could not be read, describing images one at a time\n")
+    # function: describe one image with its own request
+    # parameters: base64_image - string
+    # returns: formatted image description or None
+    async def describe_image(base64_image):
+        async with get_enrichment_semaphore(): #wait for a free slot
+            try:
+                with get_pipeline_metrics().span("image_description", images=1): #time the vision request
+                    return format_image_description(await post_json_async("chat/completions", build_image_description_payload(base64_image)), output_buffer)
+            except Exception as e:
+                output_buffer.append(f"OpenAI API error: {e}\n")
+                return None
+    return list(await asyncio.gather(*(describe_image(base64_image) for base64_image in base64_images))) #describe each image with its own request
+
+# function: describe images in as few vision requests as possible, sending batches concurrently
+# parameters: filepaths - list of strings, output_buffer - list
+# returns: list of formatted image descriptions or None, in the order of filepaths
+async def generate_image_descriptions_async(filepaths, output_buffer):
+    loop = asyncio.get_running_loop() #get event loop
+    base64_images = await asyncio.gather(*(loop.run_in_executor(None, encode_image_safely, filepath, output_buffer) for filepath in filepaths)) #encode images off the loop
+    encoded = [index for index, base64_image in enumerate(base64_images) if base64_image is not None] #images that could be encoded
+    batches = [[encoded[position] for position in batch] for batch in plan_image_batches([base64_images[index] for index in encoded])]
+    formatted_descriptions = [None] * len(filepaths)
+    batch_descriptions = await asyncio.gather(*(describe_image_batch_async([base64_images[index] for index in batch], output_buffer) for batch in batches)) #send batches concurrently
+    for batch, descriptions in zip(batches, batch_descriptions):
+        for index, formatted_description in zip(batch, descriptions):
+            formatted_descriptions[index] = formatted_description
+    return formatted_descriptions
+
+# function: describe the image rows of a burst, each image once
+# parameters: rows - list of image message rows, output_buffer - list
+# returns: list of messages or None for images that could not be described, in order
+async def describe_image_rows_async(rows, output_buffer):
+    if not rows:
+        return []
+    classified = [classify_message(row) for row in rows]
+    items = [(attachment_id, filepath) for _, _, _, _, _, filepath, attachment_id in classified]
+    try:
+        descriptions = await get_media_cache().get_or_compute_batch_async("image", items, lambda filepaths: generate_image_descriptions_async(filepaths, output_buffer)) #describe each image once
+    except Exception as e:
+        output_buffer.append(f"attachment error: {e}\n")
+        return [None] * len(rows)
+    return [build_described_message(message, description, output_buffer) for message, description in zip(classified, descriptions)]
+
+# function: transcribe a voice memo, sending each chunk as soon as it is transcoded
+# parameters: filepath - string, output_buffer - list
+# returns: transcript text
+async def generate_audio_transcript_async(filepath, output_buffer):
+    loop = asyncio.get_running_loop() #get event loop
+    chunks = await loop.run_in_executor(None, transcode_audio, filepath) #transcode voice memo in chunks in the process pool
+
+    # function: transcribe one chunk as soon as it is transcoded
+    # parameters: index - int, chunk - future of mp3 bytes
+    # returns: transcript text
+    async def transcribe_chunk(index, chunk):
+        audio = await asyncio.wrap_future(chunk) #wait for the chunk before taking a slot
+        async with get_enrichment_semaphore(): #wait for a free slot
+            transcript = await get_async_openai_client().audio.transcriptions.create(model="whisper-1", file=(f"memo{index}.mp3", audio))
+        return transcript.text
+
+    try:
+        with get_pipeline_metrics().span("transcription", chunks=len(chunks)): #time transcoding and transcription together
+            transcript_text = ' '.join(await asyncio.gather(*(transcribe_chunk(index, chunk) for index, chunk in enumerate(chunks)))) #transcribe chunks concurrently, in order
+        output_buffer.append(f"transcript_text: {transcript_text}\n")
+        return transcript_text
+    except openai.APIError as e:
+        output_buffer.append(f"OpenAI API error: {e}\n")
+        return None
+    finally:
+        for chunk in chunks:
+            chunk.cancel() #stop transcoding chunks that are no longer needed
+
+# function: send a message through the shared sender without blocking the loop
+# parameters: target_number - string, message - string
+# returns: result - dictionary from MessageSender.send
+async def send_message_async(target_number, message):
+    return await asyncio.wrap_future(get_message_sender().send(target_number, message)) #the sender times the send
+
+# function: subscribe to a target's messages, resuming after its checkpoint
+# parameters: watcher - MessageWatcher, target_number - string, checkpoint - int or None
+# returns: (subscription - Subscription, resume id - int)
+def subscribe_from_checkpoint(watcher, target_number, checkpoint):
+    resume_id = get_resume_id(watcher.database, sorted(watcher.handle_index.get_handle_rowids(target_number)), checkpoint) #skip what is older than the catch-up window
+    return watcher.subscribe(target_number, resume_id), resume_id
+
+# function: async version of converse_with_AI, stopped by cancelling its task
+# parameters: target_number - string, target_name - string, user_name - string, target_description - string, words_per_minute - int, conversation_context - string, gpt_model - string, output_buffer - list
+# returns: nothing
+async def converse_with_AI_async(target_number, target_name, user_name, target_description, words_per_minute, conversation_context, gpt_model, output_buffer):
+    CONVERSATION_HISTORY = ConversationHistory() #create conversation history, bounded by its token budget
+    current_conversation.set(target_number) #attribute this conversation's timings, including those of tasks it starts, to its number
+    metrics = get_pipeline_metrics() #get shared pipeline metrics
+    output_buffer.append(f"listening for messages from {target_number}\n")
+    loop = asyncio.get_running_loop() #get event loop
+    watcher = get_message_watcher(DB_PATH) #get the watcher shared by every conversation
+    checkpoints = get_checkpoint_store() #get shared checkpoint store
+    conversation_key = canonicalize_handle(target_number) #checkpoint the conversation however its number is formatted
+    checkpoint = checkpoints.get(conversation_key, CONVERSATION_RULE_SET) #get where the conversation stopped last time
+    subscription, resume_id = await loop.run_in_executor(None, subscribe_from_checkpoint, watcher, target_number, checkpoint) #subscribe off the loop, since it queries chat.db and waits for the watcher
+    checkpoints.advance(conversation_key, CONVERSATION_RULE_SET, resume_id) #a restart before the first reply resumes from here
+    if checkpoint is not None:
+        output_buffer.append(f"resuming after message {resume_id}\n")
+    cursor = ConversationCursor(subscription, resume_id) #create cursor over the subscription
+    try:
+        while True: #loop until cancelled
+            start_time = time.time() #get start time
+            burst_start_time = time.perf_counter() #start of the reply, for the reply span
+            messages = await get_cursor_messages_async(cursor, output_buffer) #get recent messages
+            contains_images = check_for_images(messages)
+            if len(messages) > 0: #if there are new messages
+                concatenated_text = ' '.join([row[1] for row in messages[::-1]]) #concatenate messages
+                output_buffer.append(f"concatenated_text: {concatenated_text}\n")
+
+                output_buffer.append("generating ai response...\n")
+                schedule = TypingSchedule(start_time, words_per_minute) #time spent generating counts towards the typing delay
+                response_message = await generate_response_async(concatenated_text, CONVERSATION_HISTORY, user_name, target_name, target_description, conversation_context, gpt_model, contains_images, output_buffer, schedule) #generate response
+                output_buffer.append(f"response_message: {response_message}\n")
+                if response_message is None: #if the model call failed, keep the messages unanswered
+                    output_buffer.append("no response generated, retrying on the next message\n")
+                    await wait_for_rows_async(subscription) #retry once the watcher routes a new message
+                    continue
+
+                response_generation_time = time.time() - start_time #calculate response generation time
+                output_buffer.append(f"response_generation_time: {response_generation_time}")
+                response_time = schedule.send_time - schedule.start_time #get response time, counted once by the schedule
+                output_buffer.append(f"response_time: {response_time}")
+                wait_time = schedule.get_wait_time() #get wait time left after generating the response
+                total_time_waited = wait_time + response_generation_time #set total time waited
+                output_buffer.append(f"Sleeping for {wait_time} seconds\n")
+                with metrics.span("humanized_delay"): #time the typing delay
+                    await asyncio.sleep(wait_time) #sleep for response time
+
+                output_buffer.append("checking for new messages...\n")
+                start_time = time.time() #get start time
+                new_messages = await get_cursor_messages_async(cursor, output_buffer) #get recent messages
+                while len(new_messages) > len(messages): #while there are new messages
+                    output_buffer.append("new message received\n")
+                    messages = new_messages #update messages
+                    contains_images = check_for_images(messages)
+                    concatenated_text = ' '.join([row[1] for row in messages[::-1]]) #concatenate messages
+                    output_buffer.append(f"new concatenated_text: {concatenated_text}\n")
+
+                    output_buffer.append("generating new ai response...\n")
+                    schedule = TypingSchedule(start_time, words_per_minute) #time spent generating counts towards the typing delay
+                    response_message = await generate_response_async(concatenated_text, CONVERSATION_HISTORY, user_name, target_name, target_description, conversation_context, gpt_model, contains_images, output_buffer, schedule) #generate response
+                    output_buffer.append(f"new response_message: {response_message}\n")
+                    if response_message is None: #if the model call failed, stop before sleeping
+                        break
+
+                    response_generation_time = time.time() - start_time #calculate response generation time
+                    output_buffer.append(f"response_generation_time: {response_generation_time}")
+                    response_time = schedule.send_time - schedule.start_time #get response time, counted once by the schedule
+                    output_buffer.append(f"response_time: {response_time}")
+                    wait_time = schedule.get_wait_time() #get wait time left after generating the response
+                    output_buffer.append(f"already waited {total_time_waited} seconds")
+                    remaining_wait_time = max(wait_time - total_time_waited, 0) #calculate wait time
+                    total_time_waited += remaining_wait_time + response_generation_time #update total time waited
+                    output_buffer.append(f"Sleeping for {remaining_wait_time} seconds\n")
+                    with metrics.span("humanized_delay"): #time the typing delay
+                        await asyncio.sleep(remaining_wait_time) #sleep for response time
+
+                    output_buffer.append("checking for new messages...\n")
+                    start_time = time.time() #get start time
+                    new_messages = await get_cursor_messages_async(cursor, output_buffer) #get recent messages
+                if response_message is None: #if the model call failed, keep the messages unanswered
+                    output_buffer.append("no response generated, retrying on the next message\n")
+                    await wait_for_rows_async(subscription) #retry once the watcher routes a new message
+                    continue
+                output_buffer.append(f"sending message\n")
+                send_result = await send_message_async(target_number, response_message) #send response
+                if not send_result["ok"]: #if the transport could not send it
+                    output_buffer.append(f"send failed: {send_result['error']}\n")
+                metrics.record("reply", time.perf_counter() - burst_start_time, target_number) #time the whole reply, from the burst arriving to sending
+                cursor.acknowledge() #clear answered messages
+                checkpoints.advance(conversation_key, CONVERSATION_RULE_SET, cursor.last_id_answered) #answered messages are not answered again after a restart
+                if CONVERSATION_HISTORY.needs_summary(): #if older turns left the window
+                    try:
+                        await summarize_history_async(CONVERSATION_HISTORY, get_async_openai_client(), gpt_model) #fold them into the summary after replying, so the reply is not delayed
+                    except openai.OpenAIError as e: #the turns stay waiting and are summarized next time
+                        output_buffer.append(f"OpenAI API error: {e}\n")
+
+            await wait_for_rows_async(subscription) #sleep until the watcher routes a new message
+    finally:
+        watcher.unsubscribe(subscription) #stop routing messages to this conversation
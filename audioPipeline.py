@@ -0,0 +1,53 @@
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pydub import AudioSegment
+from pydub.utils import mediainfo
+
+SAMPLE_RATE = 16000 #whisper resamples to 16 kHz, so higher rates only cost upload time
+CHANNELS = 1 #speech is transcribed in mono
+BITRATE = "32k" #bitrate of the compact speech encoding
+CHUNK_SECONDS = 120 #length of each chunk, so transcription can start before a long memo is transcoded
+TRANSCODE_WORKERS = 2 #processes used for transcoding
+
+# function: get the length of an audio file
+# parameters: filepath - string
+# returns: duration in seconds - float, or None if it cannot be read
+def get_duration(filepath):
+    try:
+        return float(mediainfo(filepath)['duration']) #read duration with ffprobe
+    except (KeyError, ValueError, OSError): #if ffprobe is missing or the duration is unknown, the memo is sent as one chunk
+        return None
+
+# function: transcode part of a voice memo into compact mono mp3 bytes, run in a worker process
+# parameters: filepath - string, start_second - float, duration - float or None
+# returns: mp3 bytes
+def transcode_chunk(filepath, start_second=0, duration=None):
+    audio = AudioSegment.from_file(filepath, format="caf", start_second=start_second, duration=duration) #decode only this chunk
+    audio = audio.set_channels(CHANNELS).set_frame_rate(SAMPLE_RATE) #downmix and resample for speech
+    buffer = io.BytesIO()
+    audio.export(buffer, format="mp3", bitrate=BITRATE) #encode into memory
+    return buffer.getvalue()
+
+_process_pool = None #shared transcoding processes
+_process_pool_lock = threading.Lock()
+
+# function: get the shared transcoding process pool, starting it on first use
+# parameters: none
+# returns: pool - ProcessPoolExecutor
+def get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=TRANSCODE_WORKERS) #decoding holds the GIL, so it runs in other processes
+        return _process_pool
+
+# function: start transcoding a voice memo in chunks
+# parameters: filepath - string
+# returns: list of futures of mp3 bytes, in order
+def transcode_audio(filepath):
+    duration = get_duration(filepath) #get memo length
+    if duration is None or duration <= CHUNK_SECONDS: #if the memo fits in one chunk
+        return [get_process_pool().submit(transcode_chunk, filepath)]
+    starts = range(0, int(duration) + 1, CHUNK_SECONDS) #chunk start times
+    return [get_process_pool().submit(transcode_chunk, filepath, start, CHUNK_SECONDS) for start in starts if start < duration]
@@ -1,104 +1,66 @@
-import sqlite3
-import subprocess
 import time
-import os
 import re
-from openai import OpenAI
-import openai
+import json
 import base64
-import requests
 import getpass
-from PIL import Image
-from pydub import AudioSegment
-import tempfile
-
-DB_PATH = f"/Users/{getpass.getuser()}/Library/Messages/chat.db" #path to chat.db file
-
-# function: gets contact number from contact name
-# parameters: name - string
-# returns: phone number
-def get_contact_number(name):
-    script = f'osascript getContactNumber.applescript "{name}"' #define applescript to get contact number
-    process = subprocess.Popen(script, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True) #run applescript
-    output, error = process.communicate() #get output and error from applescript
-
-    if process.returncode == 0: #if applescript ran successfully
-        phone_number = output.decode('utf-8').strip() #get phone number from output
-        filtered_number = re.sub(r"[^\d+]", "", phone_number) #filter out non-numeric characters
-        return filtered_number #return filtered number
-    else:
-        raise Exception("Error: " + error.decode('utf-8')) #raise exception if applescript failed
-    
-# function: gets the id of the last message in the database
-# parameters: none
-# returns: id of last message
-def get_last_message_id():
-    conn = sqlite3.connect(DB_PATH) #connect to database
-    cursor = conn.cursor() #create cursor
-    cursor.execute("SELECT ROWID FROM message ORDER BY ROWID DESC LIMIT 1") #get id of last message
-    last_row_id = cursor.fetchone()[0] #get id from cursor
-    conn.close() #close connection
-    return last_row_id #return id
-
-# function: get recent messages from a specific contact
-# parameters: target_number - string, last_id_checked - int
-# returns: list of messages
-def get_recent_messages(target_number, last_id_checked, output_buffer):
-    conn = sqlite3.connect(DB_PATH) #connect to database
-    cursor = conn.cursor() #create cursor
-
-    cursor.execute(""" 
-        SELECT m.ROWID, m.text, CASE WHEN a.filename IS NOT NULL THEN 1 ELSE 0 END as is_media, a.mime_type, a.filename
-        FROM message m
-        LEFT JOIN message_attachment_join maj ON m.ROWID = maj.message_id
-        LEFT JOIN attachment a ON maj.attachment_id = a.ROWID
-        INNER JOIN handle h ON m.handle_id = h.ROWID
-        WHERE m.ROWID > ? AND h.id = ? AND m.is_from_me = 0
-        ORDER BY m.ROWID DESC
-        """, (last_id_checked, target_number))  # Get recent messages from target number
-
-    messages = cursor.fetchall() #get messages from cursor
-    conn.close() #close connection
-
-    processed_messages = postprocess_messages(messages, output_buffer) #postprocess messages
-    return processed_messages #return messages
-
-# function: deal with attatchments and reactions
-# parameters: target_number - string, last_id_checked - int, pattern - string
-# returns: list of messages
-def postprocess_messages(messages, output_buffer):
-    pattern = r'^(Loved|Liked|Disliked|Laughed at|Emphasized) “.*”$' #define pattern to check for reactions
-    processed_messages = [] #create messages list
-    for message in messages: #for each message in recent messages
-        message_id, text, is_media, file_type, filepath = message
-        text = text.replace('[', '').replace(']', '').replace('<', '').replace('>', '') #replace brackets and angle brackets
-        is_media = bool(is_media)
-        if not re.match(pattern, text): #if message is not a reaction
-            if is_media: #if message is media
-                filepath = filepath.replace('~', f'/Users/{getpass.getuser()}') #replace ~ with user directory
-                if file_type:
-                    if file_type.startswith("image"): #if message is an image
-                        processed_messages.append((message_id, generate_image_description(filepath, output_buffer), is_media, file_type, filepath)) #add image description to messages
-                    elif file_type.startswith("video"):
-                        processed_messages.append((message_id, "Imagine you've received a video message from a friend, but you're currently unable to watch it. Craft a polite and believable excuse explaining why you can't watch the video right now.", is_media, file_type, filepath)) #add excuse for video to messages
-                elif filepath.endswith(".caf"):
-                    processed_messages.append((message_id, generate_audio_transcript(filepath, output_buffer), is_media, file_type, filepath)) #add audio description to messages
-            else: #if message is not media
-                processed_messages.append((message_id, text, is_media, file_type, filepath)) #add message to messages
-    return processed_messages #return messages
-
-# function: generate a response from GPT
-# parameters: incoming_message - string, conversation_history - list of messages, recipient_name - string, recipient_description - string
-# returns: response message
-def generate_response(incoming_message, conversation_history, user_name, recipient_name, recipient_description, conversation_context, gpt_model, contains_images, output_buffer):
-    client = OpenAI() #create OpenAI client
-
+from chatDatabase import DB_PATH
+from imagePipeline import prepare_image
+from functools import lru_cache
+
+PERSONA_LEAK_MARKER = "AI" #text that means the response broke persona
+STREAM_RESPONSES = True #stream completions so a broken persona is caught mid-response
+RESPONSE_CANDIDATES = 1 #candidates requested per reply; more make a broken persona rarely need a second call, but every candidate's tokens are billed
+REACTION_PATTERN = r'^(Loved|Liked|Disliked|Laughed at|Emphasized) “.*”$' #define pattern to check for reactions
+ENRICHMENT_WORKERS = 4 #attachments described or transcribed at once
+BATCH_IMAGE_DESCRIPTIONS = True #describe the images of a burst with one vision request per batch
+VISION_TOKENS_PER_IMAGE = 500 #description tokens budgeted per image in a batch
+VISION_MAX_TOKENS = 4096 #most tokens the vision model can return
+VISION_BATCH_MAX_IMAGES = VISION_MAX_TOKENS // VISION_TOKENS_PER_IMAGE #most images in one batch
+VISION_BATCH_MAX_BYTES = 4 * 1024 * 1024 #most base64 image data in one batch, so large photos get smaller batches
+VIDEO_EXCUSE = "Imagine you've received a video message from a friend, but you're currently unable to watch it. Craft a polite and believable excuse explaining why you can't watch the video right now." #prompt used in place of a video
+
+# function: clean a message row and decide how it should be described
+# parameters: message - tuple
+# returns: (kind, message_id, text, is_media, file_type, filepath, attachment_id), kind is None for reactions and unsupported media
+def classify_message(message):
+    message_id, text, is_media, file_type, filepath, attachment_id = message
+    text = text.replace('[', '').replace(']', '').replace('<', '').replace('>', '') #replace brackets and angle brackets
+    is_media = bool(is_media)
+    kind = None
+    if not re.match(REACTION_PATTERN, text): #if message is not a reaction
+        if is_media: #if message is media
+            filepath = filepath.replace('~', f'/Users/{getpass.getuser()}') #replace ~ with user directory
+            if file_type:
+                if file_type.startswith("image"): #if message is an image
+                    kind = "image"
+                elif file_type.startswith("video"):
+                    kind = "video"
+            elif filepath.endswith(".caf"):
+                kind = "audio"
+        else: #if message is not media
+            kind = "text"
+    return kind, message_id, text, is_media, file_type, filepath, attachment_id
+
+# function: get the indexes of the images in a burst that should be described in batches
+# parameters: messages - list of message rows
+# returns: list of indexes
+def get_batched_image_indexes(messages):
+    if not BATCH_IMAGE_DESCRIPTIONS:
+        return []
+    indexes = [index for index, message in enumerate(messages) if classify_message(message)[0] == "image"]
+    return indexes if len(indexes) > 1 else [] #a single image is described the usual way
+
+# function: build the instruction prompt sent before the conversation, cached since it only changes with its arguments
+# parameters: user_name - string, recipient_name - string, recipient_description - string, conversation_context - string, contains_images - boolean
+# returns: instruction prompt - string
+@lru_cache(maxsize=64)
+def build_system_prompt(user_name, recipient_name, recipient_description, conversation_context, contains_images):
     # Construct the initial part of the content
     if conversation_context:
         context_part = f"Additional context for this situation is provided as: {conversation_context}."
     else:
         context_part = "No additional context is provided for this situation."
-    
+
     # Check if the message contains images
     if contains_images:
         image_response_part = "Since the message contains an image, provide a brief and concise reaction to the image as if you were seeing it yourself."
@@ -116,7 +78,13 @@ def generate_response(incoming_message, conversation_history, user_name, recipie
         "However, if the task is doable through text, respond appropriately without creating an excuse. "
         "Consistently maintain the persona of a real individual, adapting your responses to the unique situation and the given context."
     )
-        
+    return content
+
+# function: build the prompt sent to GPT for an incoming message
+# parameters: incoming_message - string, conversation_history - ConversationHistory or list of messages, user_name - string, recipient_name - string, recipient_description - string, conversation_context - string, contains_images - boolean, output_buffer - list
+# returns: (messages - list of prompt messages, incoming_message - string after rephrasing questioned text)
+def build_response_messages(incoming_message, conversation_history, user_name, recipient_name, recipient_description, conversation_context, contains_images, output_buffer):
+    content = build_system_prompt(user_name, recipient_name, recipient_description, conversation_context, contains_images) #get instruction prompt
     messages = [{ #give GPT inital instruction prompt
         "role": "assistant", 
         "content": content}]
@@ -130,36 +98,81 @@ def generate_response(incoming_message, conversation_history, user_name, recipie
         incoming_message = re.sub(pattern, f"I don't understand your previous text... {questioned_text}. Can you please provide more information?", incoming_message) #rephrase incoming message
     
     messages.append({"role": "user", "content": incoming_message}) #add incoming message
-
-    try:
-        completion = client.chat.completions.create( #generate response from GPT
-            model=gpt_model, #use gpt_model
-            messages=messages #use compiled messages as prompt
-        )
-    except openai.BadRequestError as e:
-        output_buffer.append(f"OpenAI API error: {e}\n")
-        return None
-
-    response = completion.choices[0].message.content #get response from GPT
-
-    if "AI" in response: #if response contains AI
-        output_buffer.append(f"AI detected in response...\n\n {response}\n\n Rephrasing...\n")
-        new_message = f"Your message ({response}) refers to AI. Please remember to maintain the persona of a human responder in our conversation. If you're indicating that you are an AI, kindly rephrase your message to exclude this information." #rephrase response
-        messages.append({"role": "assistant", "content": new_message}) #add rephrased response to messages
-        try:
-            completion = client.chat.completions.create( #generate response from GPT
-                model=gpt_model, #use gpt_model
-                messages=messages #use compiled messages as prompt
-            )
-        except openai.BadRequestError as e:
-            output_buffer.append(f"OpenAI API error: {e}\n")
-            return None
-        response = completion.choices[0].message.content #get response from GPT
-
-    conversation_history.append({"role": "user", "content": incoming_message}) #add incoming message to conversation history
-    conversation_history.append({"role": "assistant", "content": response}) #add response to conversation history
-
-    return response #return response
+    return messages, incoming_message
+
+# function: build the follow-up message asking GPT to rephrase a response that refers to AI
+# parameters: response - string
+# returns: rephrase message - dictionary
+def build_rephrase_message(response):
+    new_message = f"Your message ({response}) refers to AI. Please remember to maintain the persona of a human responder in our conversation. If you're indicating that you are an AI, kindly rephrase your message to exclude this information." #rephrase response
+    return {"role": "assistant", "content": new_message}
+
+# class - earliest humanized send time, counted from when the messages were read so generating the response counts towards it
+class TypingSchedule:
+    # function: constructor
+    # parameters: self - TypingSchedule, start_time - float, words_per_minute - int
+    # returns: nothing
+    def __init__(self, start_time, words_per_minute):
+        self.start_time = start_time #time the messages were read
+        self.words_per_minute = words_per_minute #typing speed
+        self.send_time = start_time #earliest time the response can be sent
+
+    # function: set the send time for the finished response text
+    # parameters: self - TypingSchedule, text - string
+    # returns: nothing
+    def update(self, text):
+        self.send_time = self.start_time + get_response_time(text, self.words_per_minute) #time a person would need to type the text
+
+    # function: get how long to wait before sending
+    # parameters: self - TypingSchedule
+    # returns: wait time in seconds
+    def get_wait_time(self):
+        return max(self.send_time - time.time(), 0)
+
+# class - accumulates a streamed completion, checking for persona leaks as text arrives
+class StreamingResponse:
+    # function: constructor
+    # parameters: self - StreamingResponse
+    # returns: nothing
+    def __init__(self):
+        self.text = "" #response text so far
+        self.leaked = False #whether the response refers to AI
+
+    # function: add a chunk of streamed text
+    # parameters: self - StreamingResponse, delta - string
+    # returns: leaked - boolean
+    def feed(self, delta):
+        overlap = self.text[len(self.text) - len(PERSONA_LEAK_MARKER) + 1:] if self.text else "" #end of previous text, so a marker split across chunks is caught
+        self.text += delta #add chunk
+        if PERSONA_LEAK_MARKER in overlap + delta: #if the response refers to AI
+            self.leaked = True
+        return self.leaked
+
+# function: log the path that produced a reply, which is also recorded on its completion span and counted in the pipeline metrics
+# parameters: path - string, output_buffer - list
+# returns: nothing
+def record_response_path(path, output_buffer):
+    output_buffer.append(f"response path: {path}\n")
+
+# function: add a streamed chunk to its candidates
+# parameters: candidates - list of StreamingResponse, chunk - streamed chunk
+# returns: index of a candidate that finished without referring to AI, or None
+def feed_candidate_chunk(candidates, chunk):
+    for choice in chunk.choices: #for each candidate in the chunk
+        candidate = candidates[choice.index]
+        if choice.delta.content:
+            candidate.feed(choice.delta.content) #add chunk text
+        if choice.finish_reason is not None and not candidate.leaked: #if the candidate finished in persona
+            return choice.index
+    return None
+
+# function: get the reply from generated candidates
+# parameters: candidates - list of StreamingResponse, chosen - int or None
+# returns: (response - string, path - string, or None when every candidate refers to AI)
+def choose_candidate(candidates, chosen):
+    if chosen is None: #if every candidate refers to AI
+        return candidates[0].text, None
+    return candidates[chosen].text, "first_candidate" if chosen == 0 else "other_candidate"
 
 # function: get the wait time for a response
 # parameters: message - string
@@ -170,56 +183,17 @@ def get_response_time(message, words_per_minute):
     return response_time #return response time
     # return 0 #return 0 for testing purposes
 
-# function: convert image using imagemagick
-# parameters: input_path - string, output_path - string
-# returns: output_path
-def convert_image_with_imagemagick(input_path, output_path):
-    subprocess.run(['magick', 'convert', input_path, output_path], check=True) #convert image using imagemagick
-    return output_path #return output path
-
-# function: convert image using Pillow
-# parameters: input_path - string, output_path - string, format - string
-# returns: output_path
-def convert_image(input_path, output_path, format='JPEG'):
-    try: #try to convert image using Pillow
-        with Image.open(input_path) as img: #open image
-            img.convert('RGB').save(output_path, format) #convert image
-        return output_path #return output path
-    except IOError: #if Pillow fails to convert image
-        return convert_image_with_imagemagick(input_path, output_path) #convert image using imagemagick
-    
 # function: encode image to base64
 # parameters: filepath - string
 # returns: base64 image
 def encode_image_to_base64(filepath):
-    supported_formats = ['png', 'jpeg', 'gif', 'webp'] #define supported formats
-
-    file_ext = filepath.split('.')[-1].lower() #get file extension
-    if file_ext not in supported_formats: #if file extension is not supported
-        filepath = convert_image(filepath, 'temp_converted_image.jpeg') #convert image to jpeg
-
-    with open(filepath, "rb") as image_file: #open image file
-        base64_image = base64.b64encode(image_file.read()).decode('utf-8') #encode image to base64
+    return base64.b64encode(prepare_image(filepath)).decode('utf-8') #encode downscaled jpeg to base64
 
-    if filepath == 'temp_converted_image.jpeg': #if image was converted
-        os.remove(filepath) #remove converted image
-
-    return base64_image #return base64 image
-
-# function: generate a description for the inputted image
-# parameters: message - string
-# returns: wait time in seconds
-def generate_image_description(filepath, output_buffer):
-    api_key = os.getenv('OPENAI_API_KEY') #get OpenAI API key
-
-    base64_image = encode_image_to_base64(filepath) #encode image to base64
-
-    headers = {
-        "Content-Type": "application/json", #set content type to json
-        "Authorization": f"Bearer {api_key}" #set authorization to api key
-    }
-
-    payload = {
+# function: build the vision request for an image
+# parameters: base64_image - string
+# returns: payload - dictionary
+def build_image_description_payload(base64_image):
+    return {
         "model": "gpt-4-vision-preview", #use gpt-4-vision-preview model
         "messages": [{
             "role": "user",
@@ -235,57 +209,86 @@ def generate_image_description(filepath, output_buffer):
         }],
         "max_tokens": 1200 #set max tokens
     }
-    try:
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload) #generate response from GPT
-    except Exception as e:
-        output_buffer.append(f"OpenAI API error: {e}\n")
-        return None
 
-    response_data = response.json() #get json response data
+# function: turn a vision response into the prompt used in place of the image
+# parameters: response_data - dictionary, output_buffer - list
+# returns: formatted image description - string
+def format_image_description(response_data, output_buffer):
     image_desciption = response_data['choices'][0]['message']['content'] #get message content from response data
+    return format_description_prompt(image_desciption, output_buffer)
+
+# function: turn an image description into the prompt used in place of the image
+# parameters: image_desciption - string, output_buffer - list
+# returns: formatted image description - string
+def format_description_prompt(image_desciption, output_buffer):
     output_buffer.append(f"image_desciption: {image_desciption}\n")
     formatted_image_description = "Imagine you are directly looking at an image described as follows: '" + image_desciption.replace('\n', ' ') + "'. Please provide a brief and concise reaction to the image as if you were seeing it yourself, keeping your response short."
+    return formatted_image_description
+
+# function: build one vision request describing several images
+# parameters: base64_images - list of strings
+# returns: payload - dictionary
+def build_image_batch_payload(base64_images):
+    content = [{
+        "type": "text",
+        "text": f"You are given {len(base64_images)} images. For each image, provide a detailed description including its setting, main subjects, notable objects, mood, and other key elements. "
+                f"Reply with only a JSON array of {len(base64_images)} strings, one description per image, in the order the images were given."}]
+    content.extend({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}} for base64_image in base64_images) #add images in order
+    return {
+        "model": "gpt-4-vision-preview", #use gpt-4-vision-preview model
+        "messages": [{"role": "user", "content": content}],
+        "max_tokens": min(VISION_TOKENS_PER_IMAGE * len(base64_images), VISION_MAX_TOKENS) #budget tokens per image
+    }
 
-    return formatted_image_description #return formatted image description
-
-# function: generate a transcript for the inputted audio
+# function: read the per-image descriptions from a batched vision response
+# parameters: response_data - dictionary, count - int
+# returns: list of descriptions, or None if the response is not a JSON array of count strings
+def parse_image_batch_descriptions(response_data, count):
+    content = response_data['choices'][0]['message']['content'].strip() #get message content from response data
+    content = re.sub(r'^```(?:json)?\s*|\s*```$', '', content) #strip a code fence around the array
+    try:
+        descriptions = json.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(descriptions, list) or len(descriptions) != count or not all(isinstance(description, str) for description in descriptions):
+        return None
+    return descriptions
+
+# function: split encoded images into batches that fit the request size and token limits
+# parameters: base64_images - list of strings
+# returns: list of batches, each a list of indexes into base64_images
+def plan_image_batches(base64_images):
+    batches = []
+    batch, batch_bytes = [], 0
+    for index, base64_image in enumerate(base64_images): #pack images in order
+        if batch and (len(batch) == VISION_BATCH_MAX_IMAGES or batch_bytes + len(base64_image) > VISION_BATCH_MAX_BYTES): #if the image does not fit
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(index)
+        batch_bytes += len(base64_image)
+    if batch:
+        batches.append(batch)
+    return batches
+
+# function: encode an image, returning None instead of raising so one bad image does not fail its batch
 # parameters: filepath - string, output_buffer - list
-# returns: transcript text
-def generate_audio_transcript(filepath, output_buffer):
-    client = openai.Client()  # Initialize the OpenAI client
-
-    # Convert the CAF file to MP3 and save it to a temporary file
-    with open(filepath, "rb") as audio_file:
-        caf_audio = AudioSegment.from_file(audio_file, format="caf")
-        
-        # Use a temporary file to store the MP3 data
-        temp_mp3_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        caf_audio.export(temp_mp3_file.name, format="mp3")
-        temp_mp3_file.close()
-
-    # Call the OpenAI API with the path to the temporary MP3 file
+# returns: base64 image or None
+def encode_image_safely(filepath, output_buffer):
     try:
-        transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=open(temp_mp3_file.name, "rb")
-        )
-        transcript_text = transcript.text
-        output_buffer.append(f"transcript_text: {transcript_text}\n")
-        return transcript_text
-    except openai.BadRequestError as e:
-        output_buffer.append(f"OpenAI API error: {e}\n")
+        return encode_image_to_base64(filepath)
+    except Exception as e:
+        output_buffer.append(f"attachment error: {e}\n")
         return None
-    finally:
-        os.remove(temp_mp3_file.name)
-    
-# function: sleep for a given amount of time or until a stop flag is set
-# parameters: sleep_time - int, stop_flag - threading.Event
-# returns: nothing
-def sleep_with_check(sleep_time, stop_flag):
-    elapsed_time = 0 #set elapsed time to 0
-    while elapsed_time < sleep_time and not stop_flag.is_set(): #while elapsed time is less than sleep time and stop flag is not set
-        time.sleep(min(1, sleep_time - elapsed_time)) #sleep for 1 second or until sleep time is reached
-        elapsed_time += 1 #increment elapsed time
+
+# function: build the message for a described image row
+# parameters: classified_message - tuple from classify_message, description - string or None, output_buffer - list
+# returns: message or None if the description failed
+def build_described_message(classified_message, description, output_buffer):
+    _, message_id, _, is_media, file_type, filepath, _ = classified_message
+    if description is None: #if the description failed
+        output_buffer.append(f"skipping attachment {filepath}\n")
+        return None
+    return (message_id, description, is_media, file_type, filepath)
 
 def check_for_images(messages):
     for message in messages:
@@ -293,82 +296,12 @@ def check_for_images(messages):
             return True
     return False
 
-# function: have a conversation with AI using a target name
-# parameters: target_name - string, target_description - string
+# function: have a conversation with AI using a target name, running it on the shared conversation engine
+# parameters: target_number - string, target_name - string, user_name - string, target_description - string, words_per_minute - int, conversation_context - string, gpt_model - string, stop_flag - threading.Event, output_buffer - list
 # returns: nothing
 def converse_with_AI(target_number, target_name, user_name, target_description, words_per_minute, conversation_context, gpt_model, stop_flag, output_buffer):
-    CONVERSATION_HISTORY = [] #create conversation history
-    output_buffer.append(f"listening for messages from {target_number}\n")
-    last_id_checked = get_last_message_id() #get id of last message
-    check_interval = 5 #set check interval
-    while not stop_flag.is_set(): #loop until stop flag is set
-        start_time = time.time() #get start time
-        messages = get_recent_messages(target_number, last_id_checked, output_buffer) #get recent messages
-        contains_images = check_for_images(messages)
-        if len(messages) > 0: #if there are new messages
-            concatenated_text = ' '.join([row[1] for row in messages[::-1]]) #concatenate messages
-            output_buffer.append(f"concatenated_text: {concatenated_text}\n")
-
-            output_buffer.append("generating ai response...\n")
-            response_message = generate_response(concatenated_text, CONVERSATION_HISTORY, user_name, target_name, target_description, conversation_context, gpt_model, contains_images, output_buffer) #generate response
-            output_buffer.append(f"response_message: {response_message}\n")
-
-            response_generation_time = time.time() - start_time #calculate response generation time
-            output_buffer.append(f"response_generation_time: {response_generation_time}")
-            response_time = get_response_time(response_message, words_per_minute) #get response time
-            output_buffer.append(f"response_time: {response_time}")
-            wait_time = response_time - response_generation_time #get wait time
-            if wait_time < 0: #if response time is negative
-                wait_time = 0
-            total_time_waited = wait_time + response_generation_time#set total time waited
-            output_buffer.append(f"Sleeping for {wait_time} seconds\n")
-            sleep_with_check(wait_time, stop_flag) #sleep for response time if stop flag is not set
-
-            if stop_flag.is_set():
-                break
-            output_buffer.append("checking for new messages...\n")
-            start_time = time.time() #get start time
-            new_messages = get_recent_messages(target_number, last_id_checked, output_buffer) #get recent messages
-            contains_images = check_for_images(messages)
-            while len(new_messages) > len(messages): #while there are new messages
-                output_buffer.append("new message received\n")
-                messages = new_messages #update messages
-                concatenated_text = ' '.join([row[1] for row in messages[::-1]]) #concatenate messages
-                output_buffer.append(f"new concatenated_text: {concatenated_text}\n")
-
-                output_buffer.append("generating new ai response...\n")
-                response_message = generate_response(concatenated_text, CONVERSATION_HISTORY, user_name, target_name, target_description, conversation_context, gpt_model, contains_images, output_buffer) #generate response
-                output_buffer.append(f"new response_message: {response_message}\n")
-                
-                if stop_flag.is_set(): #if stop flag is set
-                    break #break out of loop
-
-                response_generation_time = time.time() - start_time #calculate response generation time
-                output_buffer.append(f"response_generation_time: {response_generation_time}")
-                response_time = get_response_time(response_message, words_per_minute) #get response time
-                output_buffer.append(f"response_time: {response_time}")
-                wait_time = response_time - response_generation_time #get response time
-                if wait_time < 0: #if response time is negative
-                    wait_time = 0 #wait for 0 seconds
-                output_buffer.append(f"already waited {total_time_waited} seconds")
-                remaining_wait_time = wait_time - total_time_waited #calculate wait time
-                if remaining_wait_time < 0: #if wait time is negative
-                    remaining_wait_time = 0 #wait for 0 seconds
-                total_time_waited += remaining_wait_time + response_generation_time #update total time waited
-                output_buffer.append(f"Sleeping for {remaining_wait_time} seconds\n")
-                sleep_with_check(remaining_wait_time, stop_flag) #sleep for response time if stop flag is not set
-
-                if stop_flag.is_set():
-                    break
-                output_buffer.append("checking for new messages...\n")
-                start_time = time.time() #get start time
-                new_messages = get_recent_messages(target_number, last_id_checked, output_buffer) #get recent messages
-                contains_images = check_for_images(messages)
-            output_buffer.append(f"sending message\n")
-            escaped_response_message = response_message.replace('"', '\\"')
-            os.system(f'osascript sendMessage.applescript "{target_number}" "{escaped_response_message}"')            
-            last_id_checked = messages[0][0] #update last id checked
-
-        sleep_with_check(check_interval, stop_flag) #sleep for check interval if stop flag is not set
+    from asyncConversation import converse_with_AI_async, get_conversation_engine #imported here because asyncConversation builds on this module
+    conversation = converse_with_AI_async(target_number, target_name, user_name, target_description, words_per_minute, conversation_context, gpt_model, output_buffer) #create conversation coroutine
+    get_conversation_engine().run_until_stopped(conversation, stop_flag) #run conversation until stop flag is set
 
 # if __name__ == "__main__":
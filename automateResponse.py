@@ -1,79 +1,88 @@
-import sqlite3
-import subprocess
-import time
-import os
-import re
+from chatDatabase import DB_PATH, get_chat_database
+from databaseNotifier import create_change_notifier
+from handleIndex import get_handle_index
+from messageSender import get_message_sender
+from contactResolver import get_contact_numbers
+from responseRules import ResponseRule, RuleEngine
+from checkpointStore import CATCH_UP_WINDOW, get_checkpoint_store, get_resume_id
+from canonicalHandle import canonicalize_handle
 
-DB_PATH = "/Users/joshrizika/Library/Messages/chat.db"
-CHECK_INTERVAL = 5
+CHECK_INTERVAL = 5 #check for new messages at least every 5 seconds
 
-# function: gets contact number from contact name
-# parameters: name - string
-# returns: phone number
-def get_contact_number(name):
-    script = f'osascript getContactNumber.applescript "{name}"' #define applescript to get contact number
-    process = subprocess.Popen(script, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True) #run applescript
-    output, error = process.communicate() #get output and error from applescript
-
-    if process.returncode == 0: #if applescript ran successfully
-        phone_number = output.decode('utf-8').strip() #get phone number from output
-        filtered_number = re.sub(r"[^\d+]", "", phone_number) #filter out non-numeric characters
-        return filtered_number #return filtered number
+# function: print the outcome of a send
+# parameters: future - future of a MessageSender result
+# returns: nothing
+def report_send(future):
+    result = future.result()
+    if result["ok"]:
+        print(f"sent to {result['target_number']} in {result['seconds']:.3f}s")
     else:
-        raise Exception("Error: " + error.decode('utf-8')) #raise exception if applescript failed
-    
-# function: gets the id of the last message in the database
-# parameters: none
-# returns: id of last message
-def get_last_message_id():
-    conn = sqlite3.connect(DB_PATH) #connect to database
-    cursor = conn.cursor() #create cursor
-    cursor.execute("SELECT ROWID FROM message ORDER BY ROWID DESC LIMIT 1") #get id of last message
-    last_row_id = cursor.fetchone()[0] #get id from cursor
-    conn.close() #close connection
-    return last_row_id #return id
+        print(f"send to {result['target_number']} failed: {result['error']}")
 
 # function: listen for messages from a specific contact and respond
-# parameters: target_names - list of strings, phrase_and_response - list of tuples
+# parameters: target_names - list of strings, phrase_and_response - list of (phrase, response) tuples or ResponseRule, or a RuleEngine, catch_up_window - float seconds or None
 # returns: nothing
-def listen_and_respond(target_names, phrase_and_response):
-    check_interval = 5 #check for new messages every 5 seconds
-    target_numbers = [get_contact_number(name) for name in target_names] #get target numbers from names
+def listen_and_respond(target_names, phrase_and_response, catch_up_window=CATCH_UP_WINDOW):
+    rules = phrase_and_response if isinstance(phrase_and_response, RuleEngine) else RuleEngine(phrase_and_response) #compile every phrase once
+    rule_set = f"rules:{rules.fingerprint}" #checkpoints belong to this set of rules
+    target_numbers = get_contact_numbers(target_names) #get target numbers from names in one batch
     print("listening for messages from {}".format(target_numbers))
-    last_id_checked = get_last_message_id() #get id of last message
+    database = get_chat_database(DB_PATH) #get persistent read-only database
+    notifier = create_change_notifier(DB_PATH, database) #wake as soon as chat.db changes
+    handle_index = get_handle_index(DB_PATH) #get shared handle index
+    sender = get_message_sender() #get shared sender
+    checkpoints = get_checkpoint_store() #get shared checkpoint store
+    conversation_keys = {number: canonicalize_handle(number) for number in target_numbers} #checkpoint each target however its number is formatted
+    last_ids = {number: get_resume_id(database, sorted(handle_index.get_handle_rowids(number)), checkpoints.get(conversation_keys[number], rule_set), catch_up_window) for number in target_numbers} #resume each target after its checkpoint
+    for number, last_id in last_ids.items():
+        checkpoints.advance(conversation_keys[number], rule_set, last_id) #a restart before the first poll resumes from here
+    query = None #query for the current set of handles
+    last_send = None #future of the last reply queued, which the sender resolves after every reply queued before it
 
     while True: #loop forever
-        conn = sqlite3.connect(DB_PATH) #connect to database
-        cursor = conn.cursor() #create cursor
-
-        cursor.execute("""
-            SELECT message.ROWID, message.text, handle.id 
-            FROM message 
-            INNER JOIN handle ON message.handle_id = handle.ROWID 
-            WHERE message.ROWID > ? AND handle.id IN ({}) AND message.is_from_me = 0
-            ORDER BY message.ROWID DESC
-            """.format(','.join('?' * len(target_numbers))), [last_id_checked] + target_numbers) #get recent messages from target number
-
-        messages = cursor.fetchall() #get messages from cursor
-        conn.close() #close connection
-
-        if len(messages) > 0: #if there are new messages
-            print(messages)
+        last_message_id = database.get_last_message_id() #read the end of the message table before scanning up to it
+        if handle_index.refresh() or query is None: #if new handles appeared
+            targets_by_handle = {rowid: number for number in target_numbers for rowid in handle_index.get_handle_rowids(number)} #map every handle of every target to the target
+            handle_rowids = sorted(targets_by_handle)
+            query = """
+                SELECT message.ROWID, message.text, message.handle_id
+                FROM message
+                WHERE message.handle_id IN ({}) AND message.ROWID > ? AND message.ROWID <= ? AND message.is_from_me = 0
+                ORDER BY message.ROWID ASC
+                """.format(','.join('?' * len(handle_rowids))) #build query once per handle set so its prepared statement is reused
+        first_id = min(last_ids.values()) #scan from the target that is furthest behind
+        if last_message_id > first_id: #if anything was written since the last scan
+            messages = database.execute(query, handle_rowids + [first_id, last_message_id]) if handle_rowids else [] #get new messages from target numbers, oldest first
             for row in messages: #for each message
-                row_id, text, receiving_number = row #get row id, text, and receiving number
+                row_id, text, handle_rowid = row #get row id, text, and handle
+                if row_id <= last_ids[targets_by_handle[handle_rowid]]: #if this target already processed it before a restart
+                    continue
+                receiving_number = handle_index.get_handle_id(handle_rowid) #get receiving number
                 print(row_id, text, receiving_number)
 
-                for phrase, response_message in phrase_and_response: #for each phrase and response
-                    if phrase.lower() in text.lower(): #if phrase is in text
-                        escaped_response_message = response_message.replace('"', '\\"') #escape quotes in response message
-                        os.system(f'osascript sendMessage.applescript "{receiving_number}" "{escaped_response_message}"') #send response message
-                        last_id_checked = row_id #update last id checked
-                        break  
+                rule = rules.match(text, handle_index.get_canonical_handle(handle_rowid)) #find the best rule in one pass over the text
+                if rule is not None: #if a rule matched
+                    last_send = sender.send(receiving_number, rule.response) #queue response message, sent in order by the sender thread
+                    last_send.add_done_callback(report_send)
+            for number in target_numbers: #every row up to the end of the table is processed, matched or not
+                last_ids[number] = max(last_ids[number], last_message_id)
+            positions = {conversation_keys[number]: last_id for number, last_id in last_ids.items()}
+
+            # function: save the scanned positions
+            # parameters: future - future of the last queued send, or None
+            # returns: nothing
+            def save_positions(future=None, positions=positions):
+                for conversation_key, last_id in positions.items():
+                    checkpoints.advance(conversation_key, rule_set, last_id)
+            if last_send is not None:
+                last_send.add_done_callback(save_positions) #checkpoint once every reply queued so far is sent, even by an earlier scan, so a crash before then answers again; runs at once if they are
+            else:
+                save_positions()
 
-        time.sleep(check_interval) #sleep for check interval
+        notifier.wait_for_change(CHECK_INTERVAL) #sleep until chat.db changes or check interval passes
 
 if __name__ == "__main__":
     recipients = ["Adam Rizika", "Billy Hunt"]
-    phrase_and_response = [("Hey", "Hey There!"), ("How are you", "I'm good, how are you?")]
+    phrase_and_response = [("Hey", "Hey There!"), ("How are you", "I'm good, how are you?"), ResponseRule("urgent", "On it, calling you now", priority=1, whole_word=True)]
     listen_and_respond(recipients, phrase_and_response)
     
\ No newline at end of file
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #import modules from the project root
+from chatDatabase import ChatDatabase
+from syntheticChatDB import create_chat_db, synthetic_number
+
+POLL_QUERY = """
+    SELECT m.ROWID, m.text, CASE WHEN a.filename IS NOT NULL THEN 1 ELSE 0 END as is_media, a.mime_type, a.filename
+    FROM message m
+    LEFT JOIN message_attachment_join maj ON m.ROWID = maj.message_id
+    LEFT JOIN attachment a ON maj.attachment_id = a.ROWID
+    INNER JOIN handle h ON m.handle_id = h.ROWID
+    WHERE m.ROWID > ? AND h.id = ? AND m.is_from_me = 0
+    ORDER BY m.ROWID DESC
+    """ #query each conversation runs per poll
+
+# function: poll the way the scripts used to, with a fresh connection per poll
+# parameters: db_path - string, last_id_checked - int, target_number - string
+# returns: rows - list of tuples
+def poll_with_fresh_connection(db_path, last_id_checked, target_number):
+    conn = sqlite3.connect(db_path) #connect to database
+    rows = conn.execute(POLL_QUERY, (last_id_checked, target_number)).fetchall() #get recent messages
+    conn.close() #close connection
+    return rows
+
+# function: time a poll function
+# parameters: poll - function, iterations - int
+# returns: microseconds per poll - float
+def time_polls(poll, iterations):
+    start_time = time.perf_counter() #get start time
+    for _ in range(iterations):
+        poll()
+    return (time.perf_counter() - start_time) / iterations * 1e6
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000 #number of polls per approach
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "chat.db") #path to synthetic chat.db
+        create_chat_db(db_path) #build synthetic database
+        database = ChatDatabase(db_path) #create persistent read-only database
+        last_id_checked = database.get_last_message_id() - 10 #poll the tail of the database like a live conversation
+        target_number = synthetic_number(7) #poll a single handle
+
+        fresh = time_polls(lambda: poll_with_fresh_connection(db_path, last_id_checked, target_number), iterations) #time fresh connections
+        persistent = time_polls(lambda: database.execute(POLL_QUERY, (last_id_checked, target_number)), iterations) #time persistent connection
+        print(f"fresh connection per poll: {fresh:8.1f} us/poll")
+        print(f"persistent read-only:      {persistent:8.1f} us/poll")
+        print(f"speedup:                   {fresh / persistent:8.1f}x")
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #import modules from the project root
+from contactIndex import ContactIndex
+
+FRAME_BUDGET = 16.7 #milliseconds per frame at 60 Hz
+FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Christopher", "Lisa", "Daniel", "Nancy", "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson"]
+
+# function: build synthetic contact names
+# parameters: count - int
+# returns: names - sorted list of strings
+def create_names(count):
+    random.seed(0)
+    return sorted({f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)} {i}" for i in range(count)})
+
+# function: time the linear filter the contact list used to run on every keystroke
+# parameters: names - list of strings, text - string
+# returns: names - list of strings
+def linear_filter(names, text):
+    return [name for name in names if text.lower() in name.lower()]
+
+# function: time a search function over every prefix of a typed query
+# parameters: search - function, typed - string
+# returns: worst milliseconds per keystroke - float
+def time_typing(search, typed):
+    worst = 0
+    for length in range(1, len(typed) + 1): #for each keystroke
+        start_time = time.perf_counter()
+        search(typed[:length])
+        worst = max(worst, (time.perf_counter() - start_time) * 1e3)
+    return worst
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000 #number of contacts
+    names = create_names(count)
+    start_time = time.perf_counter()
+    index = ContactIndex(names) #build index
+    print(f"index build for {len(names)} contacts: {(time.perf_counter() - start_time) * 1e3:8.1f} ms")
+    for typed in ("jennifer", "rodriguez 12", "smtih"): #a first name, a full name and a typo
+        linear = time_typing(lambda text: linear_filter(names, text), typed)
+        indexed = time_typing(index.search, typed)
+        print(f"'{typed}': linear {linear:6.1f} ms, indexed {indexed:6.1f} ms worst keystroke (budget {FRAME_BUDGET} ms)")
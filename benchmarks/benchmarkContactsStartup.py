@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #import modules from the project root
+from contactResolver import ContactResolver
+from contactsSnapshot import FETCHER_SOURCE, fetch_contacts, get_fetcher_binary, load_contacts_snapshot, save_contacts_snapshot
+from syntheticChatDB import synthetic_number
+
+RECIPIENT_COUNT = 20 #names resolved at once, like a long listen_and_respond recipient list
+
+# function: time a function once
+# parameters: function - function
+# returns: (milliseconds - float, result)
+def time_once(function):
+    start_time = time.perf_counter() #get start time
+    result = function()
+    return (time.perf_counter() - start_time) * 1e3, result
+
+if __name__ == "__main__":
+    contact_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000 #number of contacts in the synthetic snapshot
+    source = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), FETCHER_SOURCE) #swift fetcher source
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, "contacts_snapshot.json")
+        cache_dir = os.path.join(directory, "fetcher")
+        if shutil.which('swiftc'): #if the fetcher can be built on this machine
+            cold_time, contacts = time_once(lambda: fetch_contacts(source, cache_dir)) #compile and run the fetcher, like every launch used to
+            fetch_time, _ = time_once(lambda: fetch_contacts(source, cache_dir)) #run the cached fetcher
+            print(f"cold launch (compile + fetch): {cold_time:8.1f} ms")
+            print(f"cached fetcher (fetch only):   {fetch_time:8.1f} ms")
+        else:
+            contacts = None
+            print("swiftc not found, skipping the cold launch and fetcher timings")
+        if not contacts: #if contacts could not be fetched, use synthetic ones
+            contacts = {f"Contact {i:05d}": synthetic_number(i) for i in range(contact_count)}
+        save_contacts_snapshot(contacts, snapshot_path) #write snapshot
+        if shutil.which('swiftc'):
+            hash_time, _ = time_once(lambda: get_fetcher_binary(source, cache_dir)) #check the cached fetcher
+            print(f"cached fetcher check:          {hash_time:8.1f} ms")
+        warm_time, (loaded, _) = time_once(lambda: load_contacts_snapshot(snapshot_path)) #open from the snapshot
+        print(f"warm launch (snapshot load):   {warm_time:8.1f} ms for {len(loaded)} contacts")
+        names = sorted(loaded)[::max(len(loaded) // RECIPIENT_COUNT, 1)][:RECIPIENT_COUNT] #recipients spread over the contacts
+        resolver = ContactResolver(snapshot_path)
+        resolve_time, numbers = time_once(lambda: resolver.resolve_many(names)) #resolve recipients from the snapshot in one batch
+        memoized_time, _ = time_once(lambda: resolver.resolve_many(names)) #resolve them again from the cache
+        print(f"resolve {len(numbers)} recipients:          {resolve_time:8.1f} ms, {memoized_time:.3f} ms memoized")
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import base64
+import random
+import tempfile
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #import modules from the project root
+from imagePipeline import prepare_image
+
+CAMERA_SIZE = (4032, 3024) #12MP camera photo
+EXIF_ORIENTATION = 0x0112 #EXIF tag holding the camera orientation
+
+# function: write a synthetic camera photo with noise, so it compresses like a real photo
+# parameters: path - string, format - string
+# returns: nothing
+def create_photo(path, format):
+    random.seed(0)
+    small = Image.frombytes('RGB', (CAMERA_SIZE[0] // 8, CAMERA_SIZE[1] // 8), bytes(random.getrandbits(8) for _ in range(CAMERA_SIZE[0] * CAMERA_SIZE[1] * 3 // 64))) #random detail
+    photo = small.resize(CAMERA_SIZE, Image.BICUBIC) #smooth detail up to full resolution
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6 #rotated like a portrait photo
+    photo.save(path, format, quality=92, exif=exif) if format == 'JPEG' else photo.save(path, format)
+
+# function: encode an image the way the scripts used to, converting unsupported formats through a temporary jpeg
+# parameters: filepath - string, directory - string
+# returns: base64 image - string
+def encode_full_resolution(filepath, directory):
+    if filepath.endswith('.tiff'): #formats the vision model does not accept were converted at full resolution
+        converted_path = os.path.join(directory, 'temp_converted_image.jpeg')
+        with Image.open(filepath) as img:
+            img.convert('RGB').save(converted_path, 'JPEG')
+        filepath = converted_path
+    with open(filepath, "rb") as image_file:
+        return base64.b64encode(image_file.read()).decode('utf-8')
+
+# function: time an encode function
+# parameters: encode - function, iterations - int
+# returns: (milliseconds per image - float, upload bytes - int)
+def time_encodes(encode, iterations):
+    start_time = time.perf_counter() #get start time
+    for _ in range(iterations):
+        encoded = encode()
+    return (time.perf_counter() - start_time) / iterations * 1e3, len(encoded)
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5 #number of encodes per approach
+    with tempfile.TemporaryDirectory() as directory:
+        for format, extension in (('JPEG', 'jpeg'), ('TIFF', 'tiff')): #a camera jpeg and a format that needs converting
+            path = os.path.join(directory, f"photo.{extension}")
+            create_photo(path, format)
+            old_time, old_bytes = time_encodes(lambda: encode_full_resolution(path, directory), iterations) #time full resolution upload
+            new_time, new_bytes = time_encodes(lambda: base64.b64encode(prepare_image(path)).decode('utf-8'), iterations) #time downscaled upload
+            print(f"{format} {CAMERA_SIZE[0]}x{CAMERA_SIZE[1]}")
+            print(f"  full resolution: {old_time:8.1f} ms/image {old_bytes / 1024:8.0f} KiB upload")
+            print(f"  pipeline:        {new_time:8.1f} ms/image {new_bytes / 1024:8.0f} KiB upload")
+            print(f"  upload reduction: {old_bytes / new_bytes:6.1f}x")
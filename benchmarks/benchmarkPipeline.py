@@ -0,0 +1,243 @@
+import os
+import sys
+import time
+import bisect
+import shutil
+import tempfile
+import threading
+import subprocess
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, PROJECT_DIR) #import modules from the project root
+from syntheticChatDB import append_messages, create_chat_db, create_media_files, synthetic_number
+from stubModelServer import StubModelServer
+
+FAKE_SENDER_DIR = os.path.join(BENCHMARK_DIR, "fakeSender") #directory holding the fake osascript
+HANDLE_COUNT = 2000 #handles in the synthetic database, each benchmark conversation uses a fresh one
+POLL_SAMPLES = 50 #writes timed for poll latency
+POLL_SAMPLE_INTERVAL = 0.1 #seconds between poll latency writes
+REPLY_SAMPLES = 20 #messages timed for end-to-end reply latency
+REPLY_SAMPLE_INTERVAL = 2.0 #seconds between end-to-end messages
+REPLY_TIMEOUT = 30 #seconds before a reply is counted as lost
+LATENCY_SLO = 5.0 #p95 reply latency in seconds a concurrency level must meet to be sustainable
+CONCURRENCY_LEVELS = (1, 2, 4, 8, 16, 32, 64) #concurrent conversations tried, stopping at the first level that is not sustainable
+LEVEL_DURATION = 10 #seconds each concurrency level sends messages for
+MESSAGE_INTERVAL = 3.0 #seconds between messages of each conversation
+MEDIA_RATIO = 0.2 #share of messages to converse_with_AI carrying a photo or voice memo
+WORDS_PER_MINUTE = 10 ** 6 #typing speed that makes the humanized delay negligible, so latency measures the pipeline
+GPT_MODEL = "gpt-4" #model named in requests to the stub
+TRIGGER_PHRASE = "ping" #phrase listen_and_respond answers
+TRIGGER_RESPONSE = "pong" #response listen_and_respond sends
+
+# class - reads the sends recorded by the fake transport
+class FakeSendLog:
+    # function: constructor
+    # parameters: self - FakeSendLog, path - string
+    # returns: nothing
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0 #bytes of the log already read
+        self.sends = {} #map of target number to sorted list of send times
+
+    # function: read sends recorded since the last call
+    # parameters: self - FakeSendLog
+    # returns: nothing
+    def refresh(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as log_file:
+            log_file.seek(self.offset)
+            data = log_file.read()
+        complete = data[:data.rfind('\n') + 1] #leave a partly written line for the next call
+        self.offset += len(complete.encode())
+        for line in complete.splitlines():
+            send_time, target_number, _ = line.split('\t', 2)
+            bisect.insort(self.sends.setdefault(target_number, []), float(send_time))
+
+    # function: get the reply latency of every message, the first send to its number after it was written
+    # parameters: self - FakeSendLog, writes - list of (target number, write time)
+    # returns: (latencies - list of floats, lost - int messages with no reply within REPLY_TIMEOUT)
+    def match_replies(self, writes):
+        self.refresh()
+        latencies, lost = [], 0
+        for target_number, write_time in writes:
+            sends = self.sends.get(target_number, [])
+            position = bisect.bisect_left(sends, write_time)
+            if position < len(sends) and sends[position] - write_time <= REPLY_TIMEOUT:
+                latencies.append(sends[position] - write_time)
+            else:
+                lost += 1
+        return latencies, lost
+
+    # function: wait until every message has a reply or REPLY_TIMEOUT passes after the last one
+    # parameters: self - FakeSendLog, writes - list of (target number, write time)
+    # returns: (latencies - list of floats, lost - int)
+    def wait_for_replies(self, writes):
+        deadline = max((write_time for _, write_time in writes), default=time.time()) + REPLY_TIMEOUT
+        while True:
+            latencies, lost = self.match_replies(writes)
+            if not lost or time.time() > deadline:
+                return latencies, lost
+            time.sleep(0.1)
+
+# function: get a percentile of some values
+# parameters: values - list of floats, percentile - float between 0 and 100
+# returns: value - float
+def get_percentile(values, percentile):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))] if ordered else float('nan')
+
+# function: format latencies in milliseconds
+# parameters: latencies - list of floats in seconds
+# returns: summary - string
+def format_latencies(latencies):
+    return f"p50 {get_percentile(latencies, 50) * 1e3:8.1f} ms, p95 {get_percentile(latencies, 95) * 1e3:8.1f} ms, max {max(latencies, default=float('nan')) * 1e3:8.1f} ms"
+
+# class - hands out handles no earlier benchmark used, so replies are never confused between runs
+class HandleAllocator:
+    # function: constructor
+    # parameters: self - HandleAllocator, first_index - int
+    # returns: nothing
+    def __init__(self, first_index=HANDLE_COUNT // 2):
+        self.next_index = first_index
+
+    # function: get unused handles
+    # parameters: self - HandleAllocator, count - int
+    # returns: list of (handle rowid - int, number - string)
+    def take(self, count):
+        if self.next_index + count > HANDLE_COUNT:
+            raise RuntimeError("the synthetic database ran out of handles, raise HANDLE_COUNT")
+        handles = [(index + 1, synthetic_number(index)) for index in range(self.next_index, self.next_index + count)] #handle rowids start at 1
+        self.next_index += count
+        return handles
+
+# function: time how long the watcher takes to route a newly written message
+# parameters: db_path - string, handle - (rowid, number)
+# returns: latencies - list of floats
+def measure_poll_latency(db_path, handle):
+    from messageWatcher import get_message_watcher
+    handle_rowid, number = handle
+    watcher = get_message_watcher(db_path)
+    subscription = watcher.subscribe(number)
+    routed = threading.Event()
+    routed_times = []
+    subscription.listeners.append(lambda: (routed_times.append(time.perf_counter()), routed.set())) #record when rows reach the subscription
+    latencies = []
+    try:
+        for _ in range(POLL_SAMPLES):
+            routed.clear()
+            write_time = time.perf_counter() #timed from before the write, so the latency includes committing it
+            append_messages(db_path, handle_rowid)
+            if routed.wait(REPLY_TIMEOUT):
+                latencies.append(routed_times[-1] - write_time)
+            subscription.get_new_rows() #drain routed rows
+            time.sleep(POLL_SAMPLE_INTERVAL)
+    finally:
+        watcher.unsubscribe(subscription)
+    return latencies
+
+# function: write messages to some conversations at a steady rate
+# parameters: db_path - string, handles - list of (rowid, number), duration - float, interval - float, text - string, media - list of (filename, mime_type)
+# returns: writes - list of (number, write time)
+def send_messages(db_path, handles, duration, interval, text, media=()):
+    writes = []
+    media_step = round(1 / MEDIA_RATIO) #every media_step-th message carries media
+    start_time = time.time()
+    sent = 0
+    while time.time() - start_time < duration:
+        for position, (handle_rowid, number) in enumerate(handles): #stagger conversations across the interval
+            due = start_time + sent * interval + position * interval / len(handles)
+            time.sleep(max(due - time.time(), 0))
+            attachment = media[len(writes) // media_step % len(media)] if media and len(writes) % media_step == 0 else None #attach media to a share of messages
+            writes.append((number, time.time()))
+            append_messages(db_path, handle_rowid, text=f"{text} {sent}", attachment=attachment)
+        sent += 1
+    return writes
+
+# function: start converse_with_AI conversations on the shared engine
+# parameters: handles - list of (rowid, number)
+# returns: futures - list of concurrent.futures.Future
+def start_conversations(handles):
+    from asyncConversation import converse_with_AI_async, get_conversation_engine
+    from outputLog import OutputLog
+    engine = get_conversation_engine()
+    futures = [engine.run_coroutine(converse_with_AI_async(number, f"Contact {number}", "Me", "friend", WORDS_PER_MINUTE, "", GPT_MODEL, OutputLog())) for _, number in handles]
+    time.sleep(0.5) #let the conversations subscribe before messages arrive
+    return futures
+
+# function: start listen_and_respond in its own process, as the script runs
+# parameters: handles - list of (rowid, number)
+# returns: process - subprocess.Popen
+def start_listener(handles):
+    command = f"from automateResponse import listen_and_respond; listen_and_respond({[number for _, number in handles]!r}, {[(TRIGGER_PHRASE, TRIGGER_RESPONSE)]!r})"
+    process = subprocess.Popen([sys.executable, "-c", command], env={**os.environ, "PYTHONPATH": PROJECT_DIR}, stdout=subprocess.DEVNULL) #keep the listener's printing out of the report
+    time.sleep(2) #let the listener look up its contacts and read the end of the database
+    return process
+
+# function: measure reply latency and sustainable concurrency for one responder
+# parameters: name - string, start - function taking handles and returning a stop function, db_path - string, send_log - FakeSendLog, allocator - HandleAllocator, text - string, media - list of (filename, mime_type)
+# returns: nothing
+def benchmark_responder(name, start, db_path, send_log, allocator, text, media=()):
+    handles = allocator.take(1)
+    stop = start(handles)
+    writes = send_messages(db_path, handles, REPLY_SAMPLES * REPLY_SAMPLE_INTERVAL, REPLY_SAMPLE_INTERVAL, text, media)
+    latencies, lost = send_log.wait_for_replies(writes)
+    stop()
+    print(f"{name} reply latency:    {format_latencies(latencies)} ({len(latencies)} replies, {lost} lost)")
+    sustainable = 0
+    for level in CONCURRENCY_LEVELS: #ramp up concurrent conversations
+        handles = allocator.take(level)
+        stop = start(handles)
+        writes = send_messages(db_path, handles, LEVEL_DURATION, MESSAGE_INTERVAL, text, media)
+        latencies, lost = send_log.wait_for_replies(writes)
+        stop()
+        ok = not lost and get_percentile(latencies, 95) <= LATENCY_SLO
+        print(f"{name} {level:3d} concurrent: {format_latencies(latencies)} ({len(latencies)} replies, {lost} lost){'' if ok else ' - not sustainable'}")
+        if not ok:
+            break
+        sustainable = level
+    print(f"{name} max sustainable concurrent conversations: {sustainable}{'+' if sustainable == CONCURRENCY_LEVELS[-1] else ''} (p95 under {LATENCY_SLO} s, no lost replies)")
+
+if __name__ == "__main__":
+    message_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000 #messages in the synthetic database
+    directory = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(directory, "chat.db")
+        media = create_media_files(os.path.join(directory, "media"), audio_count=2 if shutil.which('ffmpeg') else 0) #voice memos need ffmpeg to transcode
+        start_time = time.perf_counter()
+        create_chat_db(db_path, message_count, HANDLE_COUNT, media=media) #build synthetic database
+        print(f"synthetic chat.db: {message_count} messages, {HANDLE_COUNT} handles, built in {time.perf_counter() - start_time:.1f} s")
+
+        server = StubModelServer().start() #serve stub chat, vision and whisper endpoints
+        os.environ.update({"CHAT_DB_PATH": db_path, "OPENAI_BASE_URL": server.url, "OPENAI_API_KEY": "stub", "MESSAGE_TRANSPORT": "fake", "FAKE_SEND_LOG": os.path.join(directory, "sends.log"), "PATH": FAKE_SENDER_DIR + os.pathsep + os.environ["PATH"]}) #read the synthetic database, call the stub, record sends with the fake transport and look up contacts with the fake osascript
+        os.chdir(directory) #keep the media cache out of the project
+        send_log = FakeSendLog(os.environ["FAKE_SEND_LOG"])
+        allocator = HandleAllocator()
+
+        latencies = measure_poll_latency(db_path, allocator.take(1)[0]) #project modules are imported after the environment points them at the synthetic database
+        print(f"poll latency (write to routed):   {format_latencies(latencies)} over {len(latencies)} writes")
+
+        # function: start converse_with_AI conversations
+        # parameters: handles - list of (rowid, number)
+        # returns: stop function
+        def start_converse(handles):
+            futures = start_conversations(handles)
+            return lambda: [future.cancel() for future in futures]
+        benchmark_responder("converse_with_AI", start_converse, db_path, send_log, allocator, "hey are you free tonight", media)
+
+        # function: start a listen_and_respond listener
+        # parameters: handles - list of (rowid, number)
+        # returns: stop function
+        def start_listen(handles):
+            return start_listener(handles).terminate
+        benchmark_responder("listen_and_respond", start_listen, db_path, send_log, allocator, TRIGGER_PHRASE)
+
+        from pipelineMetrics import get_pipeline_metrics
+        print("\nconverse_with_AI stage timings (seconds):")
+        print(get_pipeline_metrics().format_summary())
+        print(f"stub requests: {server.request_counts}")
+        server.stop()
+    finally:
+        os.chdir(BENCHMARK_DIR)
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,59 @@
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #import modules from the project root
+from responseRules import RuleEngine
+
+RULE_COUNTS = (10, 100, 1000, 5000) #rule set sizes timed
+MESSAGE_COUNT = 20000 #messages matched against each rule set
+MATCH_RATIO = 0.1 #share of messages containing a phrase
+WORDS = ["hey", "are", "you", "free", "tonight", "dinner", "running", "late", "call", "me", "when", "home", "what", "time", "meeting", "tomorrow", "sounds", "good", "thanks", "see", "soon", "work", "train", "lunch", "weekend", "plans", "movie", "coffee", "later", "ok"]
+
+# function: build synthetic rules of two to four word phrases
+# parameters: count - int, rng - random.Random
+# returns: list of (phrase, response)
+def create_rules(count, rng):
+    phrases = set()
+    while len(phrases) < count:
+        phrases.add(' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))) + f" {len(phrases)}") #numbered so every phrase is distinct
+    return [(phrase, f"response {index}") for index, phrase in enumerate(sorted(phrases))]
+
+# function: build synthetic messages, some containing a phrase
+# parameters: rules - list of (phrase, response), count - int, rng - random.Random
+# returns: list of strings
+def create_messages(rules, count, rng):
+    messages = []
+    for _ in range(count):
+        text = ' '.join(rng.choice(WORDS).capitalize() if rng.random() < 0.1 else rng.choice(WORDS) for _ in range(rng.randint(3, 25)))
+        if rng.random() < MATCH_RATIO: #if the message should match a rule
+            text += ' ' + rng.choice(rules)[0].upper()
+        messages.append(text)
+    return messages
+
+# function: match a message the way listen_and_respond used to, lowercasing the text for every rule
+# parameters: rules - list of (phrase, response), text - string
+# returns: response - string or None
+def match_linear(rules, text):
+    for phrase, response in rules:
+        if phrase.lower() in text.lower():
+            return response
+    return None
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    for rule_count in RULE_COUNTS:
+        rules = create_rules(rule_count, rng)
+        messages = create_messages(rules, MESSAGE_COUNT, rng)
+        start_time = time.perf_counter()
+        engine = RuleEngine(rules) #compile every phrase
+        build_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        compiled = [engine.match(text) for text in messages]
+        compiled_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        linear = [match_linear(rules, text) for text in messages]
+        linear_time = time.perf_counter() - start_time
+        agree = sum((rule.response if rule else None) == response for rule, response in zip(compiled, linear))
+        print(f"{rule_count:5} rules: linear {MESSAGE_COUNT / linear_time:9.0f} messages/s, compiled {MESSAGE_COUNT / compiled_time:9.0f} messages/s ({build_time * 1e3:.1f} ms to compile), {agree}/{MESSAGE_COUNT} same replies")
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import tempfile
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR)) #import modules from the project root
+os.environ["PATH"] = os.path.join(BENCHMARK_DIR, "fakeSender") + os.pathsep + os.environ["PATH"] #send through the fake osascript
+from messageSender import FakeTransport, MessageSender, OsascriptTransport
+
+TRICKY_MESSAGE = 'she said "hi" \\o/ and it cost $5' #quotes, backslashes and dollars a shell would mangle
+
+# function: send messages the way replies used to be sent, through a shell per message
+# parameters: count - int, message - string
+# returns: nothing
+def send_with_shell(count, message):
+    escaped_message = message.replace('"', '\\"') #the old hand-rolled escaping
+    for _ in range(count):
+        os.system(f'osascript sendMessage.applescript "+15550000000" "{escaped_message}"')
+
+# function: queue messages on a sender and wait for the last one
+# parameters: transport - transport, count - int, message - string
+# returns: list of result dictionaries
+def send_with_sender(transport, count, message):
+    sender = MessageSender(transport)
+    futures = [sender.send("+15550000000", message) for _ in range(count)]
+    results = [future.result() for future in futures]
+    sender.stop()
+    return results
+
+# function: read the messages recorded by the fake osascript or fake transport
+# parameters: path - string
+# returns: list of message strings
+def read_sent_messages(path):
+    with open(path) as log:
+        return [line.rstrip('\n').split('\t', 2)[2] for line in log]
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200 #messages sent per method
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)
+    open("sendMessage.applescript", "w").close() #the fake osascript only looks at the script name
+    for name, send in (("shell per message (os.system)", lambda: send_with_shell(count, TRICKY_MESSAGE)),
+                       ("sender, osascript transport", lambda: send_with_sender(OsascriptTransport(), count, TRICKY_MESSAGE)),
+                       ("sender, fake transport", lambda: send_with_sender(FakeTransport(os.environ["FAKE_SEND_LOG"]), count, TRICKY_MESSAGE))):
+        os.environ["FAKE_SEND_LOG"] = os.path.join(directory, f"{len(os.listdir(directory))}.log") #fresh log per method
+        start_time = time.perf_counter()
+        send()
+        seconds = time.perf_counter() - start_time
+        sent = read_sent_messages(os.environ["FAKE_SEND_LOG"])
+        intact = sum(message == TRICKY_MESSAGE for message in sent)
+        print(f"{name:32} {count / seconds:8.1f} messages/s, {seconds / count * 1e3:7.2f} ms per message, {intact}/{count} sent intact")
@@ -0,0 +1,148 @@
+import sys
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHAT_LATENCY = 0.4 #seconds before the first token of a chat completion
+TOKEN_INTERVAL = 0.01 #seconds between streamed tokens
+VISION_LATENCY = 1.5 #seconds per vision request, plus VISION_IMAGE_LATENCY per image
+VISION_IMAGE_LATENCY = 0.3 #extra seconds per image in a vision request
+WHISPER_LATENCY = 0.8 #seconds per transcription request
+STUB_REPLY = "sounds good, talk to you later" #text of every chat completion
+STUB_DESCRIPTION = "A photo of a kitchen table with two coffee mugs in morning light." #text of every image description
+STUB_TRANSCRIPT = "hey just calling to say I will be a little late" #text of every transcript
+
+# class - request handler mimicking the chat, vision and whisper endpoints
+class StubModelHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" #keep connections alive, like the real API
+
+    # function: silence per-request logging
+    # parameters: self - StubModelHandler, format - string, *args
+    # returns: nothing
+    def log_message(self, format, *args):
+        pass
+
+    # function: send a json response
+    # parameters: self - StubModelHandler, body - dictionary, status - int
+    # returns: nothing
+    def send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # function: send one chunk of a chunked response
+    # parameters: self - StubModelHandler, data - bytes
+    # returns: nothing
+    def send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    # function: handle a POST to an API endpoint
+    # parameters: self - StubModelHandler
+    # returns: nothing
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))) #read request body
+        self.server.request_counts[self.path] = self.server.request_counts.get(self.path, 0) + 1 #count requests per endpoint
+        if self.path.endswith("/audio/transcriptions"): #if this is a whisper request
+            time.sleep(self.server.whisper_latency)
+            self.send_json({"text": STUB_TRANSCRIPT})
+        elif self.path.endswith("/chat/completions"): #if this is a chat or vision request
+            self.complete_chat(json.loads(body))
+        else:
+            self.send_json({"error": {"message": f"unknown endpoint {self.path}"}}, 404)
+
+    # function: answer a chat completion, as a vision description when the prompt has images
+    # parameters: self - StubModelHandler, request - dictionary
+    # returns: nothing
+    def complete_chat(self, request):
+        image_count = sum(1 for message in request["messages"] if isinstance(message["content"], list) for part in message["content"] if part.get("type") == "image_url") #count images in the prompt
+        if image_count: #if this is a vision request
+            time.sleep(self.server.vision_latency + self.server.vision_image_latency * image_count)
+            content = json.dumps([STUB_DESCRIPTION] * image_count) if image_count > 1 else STUB_DESCRIPTION #batched requests ask for a json array
+            self.send_json(build_completion(request, [content]))
+            return
+        time.sleep(self.server.chat_latency)
+        choices = [STUB_REPLY] * request.get("n", 1)
+        if not request.get("stream"): #if the client wants the whole completion at once
+            time.sleep(self.server.token_interval * len(STUB_REPLY.split()))
+            self.send_json(build_completion(request, choices))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for words in zip(*(choice.split(' ') for choice in choices)): #stream one word of every choice at a time
+                for index, word in enumerate(words):
+                    self.send_chunk(f"data: {json.dumps(build_chunk(request, index, {'content': word + ' '}, None))}\n\n".encode())
+                time.sleep(self.server.token_interval)
+            for index in range(len(choices)):
+                self.send_chunk(f"data: {json.dumps(build_chunk(request, index, {}, 'stop'))}\n\n".encode())
+            self.send_chunk(b"data: [DONE]\n\n")
+            self.send_chunk(b"") #end chunked response
+        except (BrokenPipeError, ConnectionResetError): #the client closed the stream early
+            self.close_connection = True
+
+# function: build a chat completion response
+# parameters: request - dictionary, choices - list of strings
+# returns: response - dictionary
+def build_completion(request, choices):
+    return {"id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": request.get("model", "stub"),
+            "choices": [{"index": index, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"} for index, content in enumerate(choices)],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}}
+
+# function: build one streamed chat completion chunk
+# parameters: request - dictionary, index - int, delta - dictionary, finish_reason - string or None
+# returns: chunk - dictionary
+def build_chunk(request, index, delta, finish_reason):
+    return {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": request.get("model", "stub"),
+            "choices": [{"index": index, "delta": delta, "finish_reason": finish_reason}]}
+
+# class - local server standing in for the OpenAI API, with configurable latency
+class StubModelServer(ThreadingHTTPServer):
+    daemon_threads = True #do not wait for open connections on shutdown
+
+    # function: constructor
+    # parameters: self - StubModelServer, port - int, chat_latency - float, token_interval - float, vision_latency - float, vision_image_latency - float, whisper_latency - float
+    # returns: nothing
+    def __init__(self, port=0, chat_latency=CHAT_LATENCY, token_interval=TOKEN_INTERVAL, vision_latency=VISION_LATENCY, vision_image_latency=VISION_IMAGE_LATENCY, whisper_latency=WHISPER_LATENCY):
+        super().__init__(("127.0.0.1", port), StubModelHandler)
+        self.chat_latency = chat_latency
+        self.token_interval = token_interval
+        self.vision_latency = vision_latency
+        self.vision_image_latency = vision_image_latency
+        self.whisper_latency = whisper_latency
+        self.request_counts = {} #map of endpoint to requests served
+        self.thread = None
+
+    # function: get the base url to set as OPENAI_BASE_URL
+    # parameters: self - StubModelServer
+    # returns: url - string
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    # function: serve requests on a background thread
+    # parameters: self - StubModelServer
+    # returns: self - StubModelServer
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    # function: stop serving
+    # parameters: self - StubModelServer
+    # returns: nothing
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8089 #port to serve on
+    server = StubModelServer(port)
+    print(f"stub model server on {server.url}, run Chat Pilot with OPENAI_BASE_URL={server.url}")
+    server.serve_forever()
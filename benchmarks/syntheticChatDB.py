@@ -0,0 +1,99 @@
+import sqlite3
+import random
+import wave
+import time
+import os
+
+SCHEMA = """
+    CREATE TABLE handle (ROWID INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE, id TEXT NOT NULL, country TEXT, service TEXT NOT NULL, uncanonicalized_id TEXT, person_centric_id TEXT, UNIQUE (id, service));
+    CREATE TABLE message (ROWID INTEGER PRIMARY KEY AUTOINCREMENT, guid TEXT UNIQUE NOT NULL, text TEXT, handle_id INTEGER DEFAULT 0, service TEXT, date INTEGER, is_from_me INTEGER DEFAULT 0, cache_has_attachments INTEGER DEFAULT 0);
+    CREATE TABLE attachment (ROWID INTEGER PRIMARY KEY AUTOINCREMENT, guid TEXT UNIQUE NOT NULL, filename TEXT, mime_type TEXT, transfer_name TEXT, total_bytes INTEGER DEFAULT 0);
+    CREATE TABLE message_attachment_join (message_id INTEGER REFERENCES message (ROWID) ON DELETE CASCADE, attachment_id INTEGER REFERENCES attachment (ROWID) ON DELETE CASCADE, UNIQUE(message_id, attachment_id));
+    CREATE INDEX message_idx_handle ON message(handle_id, date);
+    CREATE INDEX message_attachment_join_idx_message_id ON message_attachment_join(message_id);
+    """ #subset of the macOS Messages schema used by Chat Pilot
+INSERT_CHUNK = 100000 #messages inserted per transaction
+MEDIA_IMAGES = 8 #distinct photos attachments point at
+MEDIA_VOICE_MEMOS = 2 #distinct voice memos attachments point at
+IMAGE_SIZES = [(4032, 3024), (3024, 4032), (1170, 2532), (640, 480)] #camera photos, screenshots and small images
+VOICE_MEMO_RATE = 16000 #samples per second of synthetic voice memos
+VOICE_MEMO_MAX_SECONDS = 30 #longest synthetic voice memo
+APPLE_EPOCH = 978307200 #unix time of 2001-01-01, where message.date counts from in nanoseconds
+
+# function: format a synthetic phone number
+# parameters: index - int
+# returns: phone number - string
+def synthetic_number(index):
+    return f"+1555{index:07d}" #return number in E.164 form
+
+# function: write a pool of media files for synthetic attachments
+# parameters: media_dir - string, image_count - int, audio_count - int, seed - int
+# returns: list of (filename, mime_type) - mime_type is None for voice memos, as Messages stores them
+def create_media_files(media_dir, image_count=MEDIA_IMAGES, audio_count=MEDIA_VOICE_MEMOS, seed=0):
+    from PIL import Image #imported here so plain databases do not need Pillow
+    os.makedirs(media_dir, exist_ok=True)
+    rng = random.Random(seed) #create seeded random generator
+    media = [] #create media list
+    for index in range(image_count): #write photos of mixed sizes
+        width, height = rng.choice(IMAGE_SIZES)
+        small = Image.frombytes('RGB', (width // 8, height // 8), rng.randbytes(width * height * 3 // 64)) #random detail
+        path = os.path.join(media_dir, f"IMG_{index:04d}.jpeg")
+        small.resize((width, height), Image.BICUBIC).save(path, 'JPEG', quality=90) #smooth detail up to full resolution
+        media.append((path, "image/jpeg"))
+    for index in range(audio_count): #write voice memos
+        path = os.path.join(media_dir, f"Audio_{index:04d}.caf")
+        with wave.open(path, "wb") as memo: #pcm data, which ffmpeg reads whatever the extension
+            memo.setnchannels(1)
+            memo.setsampwidth(2)
+            memo.setframerate(VOICE_MEMO_RATE)
+            memo.writeframes(rng.randbytes(VOICE_MEMO_RATE * 2 * rng.randint(5, VOICE_MEMO_MAX_SECONDS))) #noise, the length is what transcoding cost follows
+        media.append((path, None))
+    return media
+
+# function: build a synthetic chat.db, streaming rows so millions of messages fit in memory
+# parameters: path - string, message_count - int, handle_count - int, attachment_ratio - float, seed - int, media - list of (filename, mime_type) or None to point attachments at missing files
+# returns: nothing
+def create_chat_db(path, message_count=100000, handle_count=200, attachment_ratio=0.05, seed=0, media=None):
+    if os.path.exists(path): #if a previous database exists
+        os.remove(path) #remove it
+    rng = random.Random(seed) #create seeded random generator
+    conn = sqlite3.connect(path) #connect to database
+    conn.execute("PRAGMA journal_mode = WAL") #match the journal mode Messages.app uses
+    conn.executescript(SCHEMA) #create tables
+    conn.executemany("INSERT INTO handle (id, country, service) VALUES (?, 'us', 'iMessage')", ((synthetic_number(i),) for i in range(handle_count))) #add handles
+
+    attachment_count = 0 #attachments inserted so far
+    for chunk_start in range(1, message_count + 1, INSERT_CHUNK): #insert in chunks
+        messages = [] #create messages list
+        joins = [] #create attachment joins list
+        attachments = [] #create attachments list
+        for message_id in range(chunk_start, min(chunk_start + INSERT_CHUNK, message_count + 1)): #for each message
+            has_attachment = rng.random() < attachment_ratio #decide whether message has an attachment
+            messages.append((f"message-{message_id}", "￼" if has_attachment else f"synthetic message {message_id}", rng.randint(1, handle_count), "iMessage", message_id, int(rng.random() < 0.4), int(has_attachment)))
+            if has_attachment:
+                filename, mime_type = media[message_id % len(media)] if media else (f"~/Library/Messages/Attachments/{message_id}.jpeg", "image/jpeg")
+                attachments.append((f"attachment-{message_id}", filename, mime_type, os.path.basename(filename)))
+                attachment_count += 1
+                joins.append((message_id, attachment_count))
+        conn.executemany("INSERT INTO message (guid, text, handle_id, service, date, is_from_me, cache_has_attachments) VALUES (?, ?, ?, ?, ?, ?, ?)", messages) #add messages
+        conn.executemany("INSERT INTO attachment (guid, filename, mime_type, transfer_name) VALUES (?, ?, ?, ?)", attachments) #add attachments
+        conn.executemany("INSERT INTO message_attachment_join (message_id, attachment_id) VALUES (?, ?)", joins) #add attachment joins
+        conn.commit() #commit chunk
+    conn.close() #close connection
+
+# function: append new incoming messages to a synthetic chat.db
+# parameters: path - string, handle_id - int, count - int, text - string or None for numbered messages, attachment - (filename, mime_type) or None
+# returns: id of last inserted message
+def append_messages(path, handle_id, count=1, text=None, attachment=None):
+    conn = sqlite3.connect(path) #connect to database
+    next_id = conn.execute("SELECT IFNULL(MAX(ROWID), 0) + 1 FROM message").fetchone()[0] #get next message id
+    date = int((time.time() - APPLE_EPOCH) * 1e9) #stamp new messages with the current time, as Messages does
+    conn.executemany("INSERT INTO message (guid, text, handle_id, service, date, is_from_me, cache_has_attachments) VALUES (?, ?, ?, 'iMessage', ?, 0, ?)", ((f"message-{i}", "￼" if attachment else text or f"synthetic message {i}", handle_id, date, int(attachment is not None)) for i in range(next_id, next_id + count))) #add messages
+    if attachment is not None: #if the messages carry an attachment
+        filename, mime_type = attachment
+        for message_id in range(next_id, next_id + count):
+            attachment_id = conn.execute("INSERT INTO attachment (guid, filename, mime_type, transfer_name) VALUES (?, ?, ?, ?)", (f"attachment-{message_id}", filename, mime_type, os.path.basename(filename))).lastrowid #add attachment
+            conn.execute("INSERT INTO message_attachment_join (message_id, attachment_id) VALUES (?, ?)", (message_id, attachment_id)) #add attachment join
+    conn.commit() #commit changes
+    conn.close() #close connection
+    return next_id + count - 1
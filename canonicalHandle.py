@@ -0,0 +1,36 @@
+from functools import lru_cache
+from phonenumbers import NumberParseException, PhoneNumberFormat
+import phonenumbers
+import os
+import re
+
+DEFAULT_REGION = os.environ.get("PHONE_REGION", "US") #region assumed for numbers without a country code, unless the handle names one
+CANONICAL_CACHE_SIZE = 65536 #handle ids and numbers whose parse results are kept
+
+# function: get the canonical form of a handle id or number, E.164 for phone numbers and lowercase for emails
+# parameters: handle_id - string or None, region - string or None for DEFAULT_REGION
+# returns: canonical handle - string, or None if handle_id is None
+@lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def canonicalize_handle(handle_id, region=None):
+    if handle_id is None:
+        return None
+    handle_id = handle_id.strip()
+    if '@' in handle_id: #if this is an email address
+        return handle_id.lower()
+    try:
+        number = phonenumbers.parse(handle_id, (region or DEFAULT_REGION).upper()) #parse phone number
+    except NumberParseException: #if this is a business or alphanumeric sender
+        return handle_id.lower()
+    if phonenumbers.is_possible_number(number):
+        return phonenumbers.format_number(number, PhoneNumberFormat.E164)
+    return re.sub(r"[^\d+]", "", handle_id) or handle_id.lower() #short codes keep their digits
+
+# function: format a handle id or number for display
+# parameters: handle_id - string
+# returns: formatted handle - string, international format for phone numbers and unchanged otherwise
+@lru_cache(maxsize=CANONICAL_CACHE_SIZE)
+def format_handle(handle_id):
+    canonical = canonicalize_handle(handle_id)
+    if canonical is None or not canonical.startswith('+'): #if this is not a phone number
+        return handle_id
+    return phonenumbers.format_number(phonenumbers.parse(canonical, None), PhoneNumberFormat.INTERNATIONAL)
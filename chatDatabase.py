@@ -0,0 +1,94 @@
+import sqlite3
+import threading
+import time
+import getpass
+import os
+from urllib.request import pathname2url
+
+DB_PATH = os.environ.get("CHAT_DB_PATH", f"/Users/{getpass.getuser()}/Library/Messages/chat.db") #path to chat.db file, set CHAT_DB_PATH to read another database such as a synthetic one
+BUSY_RETRIES = 5 #number of retries while Messages.app holds a write lock
+BUSY_RETRY_DELAY = 0.05 #seconds before the first retry, doubled on each attempt
+CACHED_STATEMENTS = 64 #number of prepared statements kept per connection
+
+LAST_MESSAGE_ID_QUERY = "SELECT MAX(ROWID) FROM message" #read straight from the rowid b-tree
+
+# function: check whether a sqlite error means the database is busy
+# parameters: error - sqlite3.OperationalError
+# returns: is_busy - boolean
+def is_busy_error(error):
+    error_code = getattr(error, 'sqlite_errorcode', None) #get error code (python 3.11+)
+    if error_code is not None:
+        return error_code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) #compare primary result code
+    message = str(error).lower() #fall back to the error message
+    return 'locked' in message or 'busy' in message
+
+# class - long-lived read-only access to chat.db
+class ChatDatabase:
+    # function: constructor
+    # parameters: self - ChatDatabase, db_path - string, busy_retries - int, busy_retry_delay - float
+    # returns: nothing
+    def __init__(self, db_path=DB_PATH, busy_retries=BUSY_RETRIES, busy_retry_delay=BUSY_RETRY_DELAY):
+        self.db_path = db_path #set path to chat.db
+        self.busy_retries = busy_retries #set number of busy retries
+        self.busy_retry_delay = busy_retry_delay #set initial busy retry delay
+        self.local = threading.local() #one connection per thread
+
+    # function: get this thread's connection, opening it on first use
+    # parameters: self - ChatDatabase
+    # returns: connection - sqlite3.Connection
+    def get_connection(self):
+        conn = getattr(self.local, 'conn', None) #get this thread's connection
+        if conn is None:
+            uri = f"file:{pathname2url(self.db_path)}?mode=ro" #open read-only so Messages.app is never blocked by a writer
+            conn = sqlite3.connect(uri, uri=True, timeout=0, isolation_level=None, cached_statements=CACHED_STATEMENTS) #busy retries are handled in execute
+            conn.execute("PRAGMA query_only = ON") #refuse any accidental writes
+            self.local.conn = conn #store connection for this thread
+        return conn
+
+    # function: close this thread's connection
+    # parameters: self - ChatDatabase
+    # returns: nothing
+    def close(self):
+        conn = getattr(self.local, 'conn', None) #get this thread's connection
+        if conn is not None:
+            conn.close() #close connection
+            self.local.conn = None
+
+    # function: run a read, retrying while the database is busy
+    # parameters: self - ChatDatabase, read - function taking a connection
+    # returns: result of read
+    def run_with_retry(self, read):
+        delay = self.busy_retry_delay #set initial retry delay
+        for attempt in range(self.busy_retries + 1): #for each attempt
+            try:
+                return read(self.get_connection()) #run read
+            except sqlite3.OperationalError as e:
+                if not is_busy_error(e) or attempt == self.busy_retries: #if error is not busy or retries are used up
+                    raise
+                time.sleep(delay) #wait for Messages.app to finish writing
+                delay *= 2 #back off
+
+    # function: run a query and fetch every row
+    # parameters: self - ChatDatabase, sql - string, params - tuple
+    # returns: rows - list of tuples
+    def execute(self, sql, params=()):
+        return self.run_with_retry(lambda conn: conn.execute(sql, params).fetchall()) #prepared statements are cached per connection by sql text
+
+    # function: gets the id of the last message in the database
+    # parameters: self - ChatDatabase
+    # returns: id of last message
+    def get_last_message_id(self):
+        last_row_id = self.execute(LAST_MESSAGE_ID_QUERY)[0][0] #get id of last message
+        return last_row_id or 0 #return id
+
+_databases = {} #map of database path to shared database
+_databases_lock = threading.Lock()
+
+# function: get the shared data-access layer for a database
+# parameters: db_path - string
+# returns: database - ChatDatabase
+def get_chat_database(db_path=DB_PATH):
+    with _databases_lock:
+        if db_path not in _databases:
+            _databases[db_path] = ChatDatabase(db_path) #create database for path
+        return _databases[db_path]
@@ -0,0 +1,124 @@
+import threading
+import sqlite3
+import atexit
+import time
+import os
+
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", "checkpoints.db") #file the last processed message of each conversation is kept in
+CHECKPOINT_FLUSH_INTERVAL = 1.0 #seconds checkpoint updates are batched before they are written
+CATCH_UP_WINDOW = None if os.environ.get("CATCH_UP_WINDOW", "3600").lower() == "none" else float(os.environ.get("CATCH_UP_WINDOW", "3600")) #seconds of messages missed while stopped that are still answered on restart, or None for every message since the checkpoint
+APPLE_EPOCH = 978307200 #unix time of 2001-01-01, where message.date counts from
+FIRST_MESSAGE_SINCE_QUERY = "SELECT MIN(ROWID) FROM message WHERE handle_id IN ({}) AND date >= ? AND ROWID > ?" #served by the (handle_id, date) index
+
+# class - last processed message ROWID per conversation and rule set, written in batches to sqlite
+class CheckpointStore:
+    # function: constructor, loading every checkpoint
+    # parameters: self - CheckpointStore, path - string, flush_interval - float
+    # returns: nothing
+    def __init__(self, path=CHECKPOINT_PATH, flush_interval=CHECKPOINT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock() #lock guarding the maps below
+        self.write_lock = threading.Lock() #lock guarding the connection, held while a batch is written so advance never waits on the disk
+        self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False) #written by the flush thread, shared with other processes
+        self.conn.execute("PRAGMA journal_mode = WAL") #a crash mid-write leaves the last committed checkpoints intact
+        self.conn.execute("PRAGMA synchronous = NORMAL") #durable across application crashes without syncing every batch
+        self.conn.execute("CREATE TABLE IF NOT EXISTS checkpoint (conversation TEXT NOT NULL, rule_set TEXT NOT NULL, last_rowid INTEGER NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (conversation, rule_set))")
+        self.conn.commit()
+        self.positions = {(conversation, rule_set): last_rowid for conversation, rule_set, last_rowid in self.conn.execute("SELECT conversation, rule_set, last_rowid FROM checkpoint")} #map of (conversation, rule set) to last processed ROWID
+        self.pending = {} #map of (conversation, rule set) to ROWID not written yet
+        self.dirty = threading.Event() #set when updates are waiting to be written
+        self.closed = threading.Event() #set when the store is closed, stopping the flush thread
+        self.thread = threading.Thread(target=self.run, daemon=True) #flush thread
+        self.thread.start()
+        atexit.register(self.close) #write what is pending on a normal exit
+
+    # function: get the last processed message of a conversation
+    # parameters: self - CheckpointStore, conversation - string, rule_set - string
+    # returns: ROWID - int, or None if the conversation has no checkpoint
+    def get(self, conversation, rule_set):
+        with self.lock:
+            return self.positions.get((conversation, rule_set))
+
+    # function: record that a conversation has processed every message up to a ROWID, never moving backwards
+    # parameters: self - CheckpointStore, conversation - string, rule_set - string, rowid - int
+    # returns: nothing
+    def advance(self, conversation, rule_set, rowid):
+        key = (conversation, rule_set)
+        with self.lock:
+            if rowid <= self.positions.get(key, -1):
+                return
+            self.positions[key] = rowid
+            self.pending[key] = rowid
+        self.dirty.set() #wake the flush thread
+
+    # function: write pending checkpoints in one transaction
+    # parameters: self - CheckpointStore
+    # returns: nothing
+    def flush(self):
+        with self.lock: #swap the batch out, so updates keep arriving while it is written
+            pending, self.pending = self.pending, {}
+            self.dirty.clear()
+        if not pending:
+            return
+        now = time.time()
+        try:
+            with self.write_lock, self.conn: #commit the batch atomically
+                self.conn.executemany(
+                    "INSERT INTO checkpoint (conversation, rule_set, last_rowid, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (conversation, rule_set) DO UPDATE SET last_rowid = MAX(last_rowid, excluded.last_rowid), updated_at = excluded.updated_at",
+                    [(conversation, rule_set, rowid, now) for (conversation, rule_set), rowid in pending.items()]) #never move a checkpoint another process advanced further
+        except sqlite3.Error as e: #keep the batch for the next flush
+            print(f"Error saving checkpoints: {e}")
+            with self.lock:
+                for key, rowid in pending.items():
+                    self.pending.setdefault(key, rowid) #a newer update made while writing wins
+            self.dirty.set()
+
+    # function: write checkpoints in batches until closed
+    # parameters: self - CheckpointStore
+    # returns: nothing
+    def run(self):
+        while True:
+            self.dirty.wait() #sleep until something changes or the store is closed
+            if self.closed.wait(self.flush_interval): #gather updates into one write, stopping early once closed
+                return #close writes what is left
+            self.flush()
+
+    # function: write pending checkpoints and close the file
+    # parameters: self - CheckpointStore
+    # returns: nothing
+    def close(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.dirty.set() #wake the flush thread so it sees the store is closed
+        self.thread.join()
+        self.flush()
+        with self.write_lock:
+            self.conn.close()
+
+# function: get the message ROWID a conversation should resume after
+# parameters: database - ChatDatabase, handle_rowids - list of ints, checkpoint - int or None, catch_up_window - float seconds or None
+# returns: ROWID - int, the checkpoint, moved forward past messages older than the catch-up window, or the last message when there is no checkpoint
+def get_resume_id(database, handle_rowids, checkpoint, catch_up_window=CATCH_UP_WINDOW):
+    if checkpoint is None: #first run, start from now like before
+        return database.get_last_message_id()
+    if catch_up_window is None or not handle_rowids:
+        return checkpoint
+    since = int((time.time() - catch_up_window - APPLE_EPOCH) * 1e9) #message.date is in nanoseconds since 2001
+    first_id = database.execute(FIRST_MESSAGE_SINCE_QUERY.format(','.join('?' * len(handle_rowids))), list(handle_rowids) + [since, checkpoint])[0][0] #first missed message inside the window
+    return first_id - 1 if first_id is not None else max(checkpoint, database.get_last_message_id())
+
+_store = None #shared checkpoint store
+_store_lock = threading.Lock() #lock guarding the shared store
+
+# function: get the checkpoint store shared by every conversation
+# parameters: none
+# returns: store - CheckpointStore
+def get_checkpoint_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore()
+        return _store
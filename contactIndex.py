@@ -0,0 +1,117 @@
+import bisect
+import difflib
+from collections import Counter
+
+FUZZY_SEARCH = True #rank close matches when nothing contains the query
+FUZZY_MIN_SCORE = 0.75 #similarity a word must have to a query word to fuzzy match it
+FUZZY_CANDIDATES = 100 #words sharing the most bigrams with a query word that are scored for similarity
+FUZZY_LIMIT = 50 #most fuzzy matches returned
+
+# function: get the substrings of a string up to three characters long
+# parameters: text - string
+# returns: grams - set of strings
+def get_grams(text):
+    return {text[i:i + size] for size in (1, 2, 3) for i in range(len(text) - size + 1)}
+
+# function: get the substrings of a string of one length
+# parameters: text - string, size - int
+# returns: grams - set of strings
+def get_sized_grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+# class - search index over contact names with prefix, token, trigram and fuzzy lookup
+class ContactIndex:
+    # function: constructor
+    # parameters: self - ContactIndex, names - list of strings in display order
+    # returns: nothing
+    def __init__(self, names):
+        self.names = list(names) #names in display order, so results are rows of the contact list
+        self.lowered = [name.lower() for name in self.names] #names compared case insensitively
+        tokens = sorted((token, row) for row, name in enumerate(self.lowered) for token in name.split()) #every word of every name
+        self.token_keys = [token for token, _ in tokens] #sorted words, searched by prefix
+        self.token_rows = [row for _, row in tokens] #row of each sorted word
+        self.grams = {} #map of every substring up to three characters to rows containing it, in ascending order
+        for row, name in enumerate(self.lowered):
+            for gram in get_grams(name):
+                self.grams.setdefault(gram, []).append(row)
+        self.words = sorted(set(self.token_keys)) #distinct words, matched fuzzily
+        self.word_bigrams = {} #map of bigram to words containing it
+        for word in self.words:
+            for bigram in get_sized_grams(word, 2):
+                self.word_bigrams.setdefault(bigram, []).append(word)
+
+    # function: get rows with a word starting with the query
+    # parameters: self - ContactIndex, query - lowercase string
+    # returns: rows - set of ints
+    def token_prefix_rows(self, query):
+        rows = set()
+        start = bisect.bisect_left(self.token_keys, query) #first word at or after the query
+        for position in range(start, len(self.token_keys)):
+            if not self.token_keys[position].startswith(query): #words are sorted, so the prefix run has ended
+                break
+            rows.add(self.token_rows[position])
+        return rows
+
+    # function: get rows whose name contains the query
+    # parameters: self - ContactIndex, query - lowercase string
+    # returns: rows - list of ints in ascending order
+    def substring_rows(self, query):
+        if len(query) <= 3: #if the query is short enough to be indexed directly
+            return self.grams.get(query, [])
+        postings = [self.grams.get(trigram, ()) for trigram in get_sized_grams(query, 3)]
+        return [row for row in min(postings, key=len) if query in self.lowered[row]] #verify the rarest trigram's rows
+
+    # function: get the words similar to a query word
+    # parameters: self - ContactIndex, query_word - lowercase string
+    # returns: map of word to similarity - dictionary
+    def similar_words(self, query_word):
+        shared = Counter()
+        for bigram in get_sized_grams(query_word, 2): #count shared bigrams per word
+            shared.update(self.word_bigrams.get(bigram, ()))
+        matcher = difflib.SequenceMatcher(b=query_word)
+        similar = {}
+        for word, _ in shared.most_common(FUZZY_CANDIDATES): #score the closest candidates
+            matcher.set_seq1(word)
+            if matcher.quick_ratio() >= FUZZY_MIN_SCORE and matcher.ratio() >= FUZZY_MIN_SCORE:
+                similar[word] = matcher.ratio()
+        return similar
+
+    # function: get rows whose words are similar to every query word, best first
+    # parameters: self - ContactIndex, query - lowercase string
+    # returns: rows - list of ints
+    def fuzzy_rows(self, query):
+        scores = None
+        for query_word in query.split(): #every query word must match a word of the name
+            word_scores = Counter()
+            for word, similarity in self.similar_words(query_word).items():
+                start = bisect.bisect_left(self.token_keys, word)
+                for position in range(start, len(self.token_keys)):
+                    if self.token_keys[position] != word:
+                        break
+                    row = self.token_rows[position]
+                    word_scores[row] = max(word_scores[row], similarity) #best word of the name for this query word
+            scores = word_scores if scores is None else Counter({row: scores[row] + score for row, score in word_scores.items() if row in scores})
+        if not scores:
+            return []
+        return [row for row, _ in scores.most_common(FUZZY_LIMIT)]
+
+    # function: search names, ranking name prefixes first, then word prefixes, then other matches
+    # parameters: self - ContactIndex, text - string
+    # returns: rows - list of ints
+    def search(self, text):
+        query = text.lower()
+        if not query: #if the search is empty
+            return list(range(len(self.names)))
+        rows = self.substring_rows(query)
+        if not rows: #if nothing contains the query
+            return self.fuzzy_rows(query) if FUZZY_SEARCH else []
+        word_rows = self.token_prefix_rows(query)
+        name_prefix, word_prefix, contains = [], [], []
+        for row in rows: #bucket rows by rank, keeping display order within each rank
+            if self.lowered[row].startswith(query):
+                name_prefix.append(row)
+            elif row in word_rows:
+                word_prefix.append(row)
+            else:
+                contains.append(row)
+        return name_prefix + word_prefix + contains
@@ -0,0 +1,187 @@
+import subprocess
+import threading
+import time
+import os
+import re
+from contactsSnapshot import SNAPSHOT_MAX_AGE, SNAPSHOT_PATH, is_snapshot_stale, load_contacts_snapshot, refresh_contacts_snapshot
+
+LOOKUP_SCRIPT = 'getContactNumber.applescript' #applescript that looks up the numbers of contact names, one per line
+LOOKUP_TIMEOUT = 60 #longest time a batch of applescript lookups may take, in seconds
+FALLBACK_CACHE_TTL = SNAPSHOT_MAX_AGE #seconds a number found by applescript is remembered
+
+# function: strip everything but digits and a leading plus from a phone number
+# parameters: number - string
+# returns: number - string
+def clean_number(number):
+    return re.sub(r"[^\d+]", "", number)
+
+# class - resolves contact names to numbers from the contacts snapshot, looking up names it lacks with applescript in one batch
+class ContactResolver:
+    # function: constructor
+    # parameters: self - ContactResolver, snapshot_path - string
+    # returns: nothing
+    def __init__(self, snapshot_path=SNAPSHOT_PATH):
+        self.snapshot_path = snapshot_path
+        self.lock = threading.Lock() #lock guarding everything below
+        self.contacts = {} #map of name to number from the snapshot
+        self.folded = {} #map of casefolded name to name
+        self.folded_names = [] #list of (casefolded name, name) in sorted order, for matching part of a name
+        self.snapshot_mtime = None #modification time of the loaded snapshot, so a rewritten snapshot is reloaded
+        self.fetched_at = None #time the loaded snapshot was fetched
+        self.refresh_attempted_at = 0 #time the fetcher last ran, so a failing fetcher is not rerun for every lookup
+        self.resolved = {} #map of name to number resolved from the snapshot
+        self.fallback = {} #map of name to (number, expiry time) resolved by applescript
+
+    # function: load the snapshot again if it changed on disk, clearing names resolved from the old one
+    # parameters: self - ContactResolver
+    # returns: nothing
+    def reload_snapshot(self):
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime_ns
+        except OSError: #if there is no snapshot yet
+            mtime = None
+        if mtime == self.snapshot_mtime:
+            return
+        self.contacts, self.fetched_at = load_contacts_snapshot(self.snapshot_path)
+        self.folded_names = [(name.casefold(), name) for name in sorted(self.contacts)] #sort once per snapshot, not once per lookup
+        self.folded = {folded: name for folded, name in reversed(self.folded_names)} #first name in sorted order wins
+        self.snapshot_mtime = mtime
+        self.resolved = {} #resolved numbers may have changed
+
+    # function: check whether the loaded snapshot is stale and due a fetch, at most once per snapshot age, marking the attempt so only one caller fetches, called with the lock held
+    # parameters: self - ContactResolver
+    # returns: should refresh - boolean
+    def claim_refresh(self):
+        if not is_snapshot_stale(self.fetched_at) or time.time() - self.refresh_attempted_at < SNAPSHOT_MAX_AGE:
+            return False
+        self.refresh_attempted_at = time.time()
+        return True
+
+    # function: fetch contacts into a new snapshot, called without the lock so other lookups are answered meanwhile
+    # parameters: self - ContactResolver
+    # returns: nothing
+    def refresh_snapshot(self):
+        try:
+            refresh_contacts_snapshot(self.snapshot_path) #run the cached fetcher once for every name
+        except OSError as e: #if the fetcher source is missing
+            print(f"could not refresh contacts: {e}")
+
+    # function: find a name in the snapshot, exactly, ignoring case, or as part of a longer name like Contacts does
+    # parameters: self - ContactResolver, name - string
+    # returns: number - string, or None if no contact matches
+    def match_snapshot(self, name):
+        if name in self.contacts:
+            return self.contacts[name]
+        folded = name.strip().casefold()
+        if not folded: #a blank name would be part of every name
+            return None
+        if folded in self.folded:
+            return self.contacts[self.folded[folded]]
+        for folded_name, contact_name in self.folded_names: #first name containing it, in sorted order
+            if folded in folded_name:
+                return self.contacts[contact_name]
+        return None
+
+    # function: resolve names to numbers from the cache, the snapshot, and a single applescript batch for the rest
+    # parameters: self - ContactResolver, names - list of strings
+    # returns: map of name to number for every name that resolved
+    def resolve_many(self, names):
+        with self.lock:
+            self.reload_snapshot()
+            numbers = {}
+            now = time.time()
+            for name in names: #answer what is cached
+                if name in self.resolved:
+                    numbers[name] = self.resolved[name]
+                elif name in self.fallback and self.fallback[name][1] > now:
+                    numbers[name] = self.fallback[name][0]
+            missing = [name for name in dict.fromkeys(names) if name not in numbers]
+            refresh = bool(missing) and self.claim_refresh() #a missing name may be a new contact
+        if refresh:
+            self.refresh_snapshot() #fetch without holding the lock
+        with self.lock:
+            if refresh:
+                self.reload_snapshot() #swap the new snapshot in
+            for name in missing: #look names up in the snapshot
+                number = self.match_snapshot(name)
+                if number:
+                    numbers[name] = self.resolved[name] = clean_number(number)
+            missing = [name for name in missing if name not in numbers and name.strip()] #Contacts would match a blank name to anyone
+        if missing: #look up what the snapshot lacks without holding the lock
+            found = lookup_with_applescript(missing)
+            with self.lock:
+                expiry = time.time() + FALLBACK_CACHE_TTL
+                for name, number in found.items():
+                    self.fallback[name] = (number, expiry)
+            numbers.update(found)
+        return numbers
+
+    # function: resolve one name to a number
+    # parameters: self - ContactResolver, name - string
+    # returns: number - string, raises LookupError if the name did not resolve
+    def resolve(self, name):
+        number = self.resolve_many([name]).get(name)
+        if not number:
+            raise LookupError(f"no number found for {name}")
+        return number
+
+    # function: forget resolved numbers, so they are looked up again
+    # parameters: self - ContactResolver, name - string or None for every name
+    # returns: nothing
+    def invalidate(self, name=None):
+        with self.lock:
+            if name is None:
+                self.resolved = {}
+                self.fallback = {}
+                self.snapshot_mtime = None #reload the snapshot too
+            else:
+                self.resolved.pop(name, None)
+                self.fallback.pop(name, None)
+
+# function: look up the numbers of contact names with one applescript run
+# parameters: names - list of strings
+# returns: map of name to number for every name Contacts has a number for
+def lookup_with_applescript(names):
+    try:
+        process = subprocess.run(['osascript', LOOKUP_SCRIPT, *names], capture_output=True, text=True, timeout=LOOKUP_TIMEOUT) #pass names as arguments so no escaping is needed
+    except (OSError, subprocess.TimeoutExpired) as e: #if osascript is missing or Contacts did not answer
+        print(f"contact lookup failed: {e}")
+        return {}
+    if process.returncode != 0:
+        print(f"contact lookup failed: {process.stderr.strip()}")
+        return {}
+    numbers = {}
+    for name, line in zip(names, process.stdout.split('\n')): #one line per name, in order
+        number = clean_number(line)
+        if number:
+            numbers[name] = number
+    return numbers
+
+_resolver = None #shared resolver
+_resolver_lock = threading.Lock() #lock guarding the shared resolver
+
+# function: get the resolver shared by every script
+# parameters: none
+# returns: resolver - ContactResolver
+def get_contact_resolver():
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            _resolver = ContactResolver()
+        return _resolver
+
+# function: gets contact number from contact name
+# parameters: name - string
+# returns: phone number, raises LookupError if the name did not resolve
+def get_contact_number(name):
+    return get_contact_resolver().resolve(name)
+
+# function: gets the numbers of several contacts in one batch
+# parameters: names - list of strings
+# returns: list of phone numbers in the order of names, raises LookupError if any name did not resolve
+def get_contact_numbers(names):
+    numbers = get_contact_resolver().resolve_many(names)
+    unresolved = [name for name in names if not numbers.get(name)]
+    if unresolved:
+        raise LookupError(f"no number found for {', '.join(unresolved)}")
+    return [numbers[name] for name in names]
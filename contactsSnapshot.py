@@ -0,0 +1,96 @@
+import subprocess
+import hashlib
+import json
+import time
+import os
+
+FETCHER_SOURCE = 'FetchContacts.swift' #swift script that prints contacts as json
+FETCHER_CACHE_DIR = '.contacts_fetcher' #compiled fetchers, one per source hash
+SNAPSHOT_PATH = 'contacts_snapshot.json' #last fetched contacts, so the window opens without waiting for the fetcher
+SNAPSHOT_MAX_AGE = 600 #seconds before a snapshot is refreshed in the background
+
+# function: hash a source file
+# parameters: path - string
+# returns: content hash - string
+def hash_source(path):
+    with open(path, "rb") as source_file: #open source file
+        return hashlib.sha256(source_file.read()).hexdigest()
+
+# function: get the compiled contacts fetcher, compiling it only when the swift source has changed
+# parameters: source - string, cache_dir - string
+# returns: path of the fetcher - string, or None if compilation failed
+def get_fetcher_binary(source=FETCHER_SOURCE, cache_dir=FETCHER_CACHE_DIR):
+    binary = os.path.join(cache_dir, f"ContactsFile-{hash_source(source)[:16]}") #name binaries after their source hash
+    if os.path.exists(binary): #if this source was already compiled
+        return binary
+    os.makedirs(cache_dir, exist_ok=True)
+    partial = f"{binary}.partial" #compile beside the final name so an interrupted build is never used
+    try:
+        subprocess.run(['swiftc', '-o', partial, source], check=True) #compile swift script
+    except (subprocess.CalledProcessError, OSError) as e: #if error occurs during compilation
+        print(f"Error during Swift compilation: {e}") #print error
+        return None
+    os.replace(partial, binary) #publish compiled fetcher
+    for name in os.listdir(cache_dir): #remove fetchers built from older sources
+        path = os.path.join(cache_dir, name)
+        if path != binary:
+            os.remove(path)
+    return binary
+
+# function: run the contacts fetcher
+# parameters: source - string, cache_dir - string
+# returns: contacts - dictionary of name to number sorted by name, or None if fetching failed
+def fetch_contacts(source=FETCHER_SOURCE, cache_dir=FETCHER_CACHE_DIR):
+    binary = get_fetcher_binary(source, cache_dir) #get compiled fetcher
+    if binary is None:
+        return None
+    try:
+        result = subprocess.run([os.path.abspath(binary)], capture_output=True, text=True, check=True) #get contacts from fetcher
+    except subprocess.CalledProcessError as e: #if error occurs during execution
+        print(f"Error: {e}") #print error
+        return None
+    return dict(sorted(json.loads(result.stdout).items(), key=lambda x: x[0])) #sort contacts alphabetically
+
+# function: load the contacts snapshot
+# parameters: path - string
+# returns: (contacts - dictionary sorted by name, fetched_at - float or None if there is no snapshot)
+def load_contacts_snapshot(path=SNAPSHOT_PATH):
+    try:
+        with open(path) as snapshot_file: #open snapshot
+            snapshot = json.load(snapshot_file)
+        return snapshot["contacts"], snapshot["fetched_at"]
+    except (OSError, ValueError, KeyError): #if there is no readable snapshot
+        return {}, None
+
+# function: save the contacts snapshot, replacing the old one atomically
+# parameters: contacts - dictionary, path - string
+# returns: nothing
+def save_contacts_snapshot(contacts, path=SNAPSHOT_PATH):
+    partial = f"{path}.partial"
+    with open(partial, "w") as snapshot_file: #write snapshot beside the old one
+        json.dump({"fetched_at": time.time(), "contacts": contacts}, snapshot_file)
+    os.replace(partial, path) #publish snapshot
+
+# function: check whether a snapshot should be refreshed
+# parameters: fetched_at - float or None
+# returns: stale - boolean
+def is_snapshot_stale(fetched_at):
+    return fetched_at is None or time.time() - fetched_at > SNAPSHOT_MAX_AGE
+
+# function: fetch contacts and save them as the new snapshot
+# parameters: path - string
+# returns: contacts - dictionary, or None if fetching failed
+def refresh_contacts_snapshot(path=SNAPSHOT_PATH):
+    contacts = fetch_contacts() #run fetcher
+    if contacts is not None:
+        save_contacts_snapshot(contacts, path) #save snapshot
+    return contacts
+
+# function: compare two sets of contacts
+# parameters: old_contacts - dictionary, new_contacts - dictionary
+# returns: (added - list of names, removed - list of names, changed - list of names)
+def diff_contacts(old_contacts, new_contacts):
+    added = [name for name in new_contacts if name not in old_contacts]
+    removed = [name for name in old_contacts if name not in new_contacts]
+    changed = [name for name in new_contacts if name in old_contacts and old_contacts[name] != new_contacts[name]]
+    return added, removed, changed
@@ -0,0 +1,132 @@
+try:
+    import tiktoken
+except ImportError: #token counts fall back to an estimate when tiktoken is not installed
+    tiktoken = None
+
+HISTORY_TOKEN_BUDGET = 3000 #tokens of recent turns sent with each prompt
+SUMMARY_MAX_TOKENS = 300 #longest summary of older turns
+MESSAGE_TOKEN_OVERHEAD = 4 #tokens the chat format adds around each message
+MIN_RECENT_MESSAGES = 2 #the latest exchange is always kept, even over budget
+SUMMARY_MIN_TOKENS = 500 #tokens of turns that left the window before they are summarized, so the summary is not rewritten after every reply
+
+_encoding = None #shared tiktoken encoding, None until load_encoding succeeds
+
+# function: load the tiktoken encoding, which downloads it on first use, so call it off the event loop
+# parameters: none
+# returns: nothing
+def load_encoding():
+    global _encoding
+    if tiktoken is None or _encoding is not None: #if tiktoken is not installed or the encoding is loaded
+        return
+    try:
+        _encoding = tiktoken.get_encoding("cl100k_base") #load encoding once
+    except Exception as e: #if the encoding cannot be downloaded, such as offline
+        print(f"could not load tiktoken encoding, estimating token counts: {e}")
+
+# function: count the tokens in a piece of text
+# parameters: text - string
+# returns: token count - int
+def count_tokens(text):
+    if _encoding is None: #if tiktoken is not installed or its encoding is not loaded
+        return len(text) // 4 + 1 #roughly four characters per token
+    return len(_encoding.encode(text))
+
+# function: count the tokens in a list of prompt messages, counting only the text parts of multi-part content
+# parameters: messages - list of message dictionaries
+# returns: token count - int
+def count_message_tokens(messages):
+    tokens = 0
+    for message in messages:
+        content = message["content"] or ""
+        if not isinstance(content, str): #if the content has image parts
+            content = ' '.join(part.get("text", "") for part in content)
+        tokens += count_tokens(content) + MESSAGE_TOKEN_OVERHEAD
+    return tokens
+
+# class - conversation history that keeps recent turns within a token budget and summarizes older ones
+class ConversationHistory:
+    # function: constructor
+    # parameters: self - ConversationHistory, token_budget - int
+    # returns: nothing
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET):
+        self.token_budget = token_budget #set token budget for recent turns
+        self.recent = [] #list of (message, token count) in the window
+        self.recent_tokens = 0 #tokens in the window
+        self.unsummarized = [] #list of (message, token count) that left the window but are not in the summary yet
+        self.unsummarized_tokens = 0 #tokens waiting to be summarized
+        self.summary = None #summary of every older message
+        self.cached_messages = None #assembled history, rebuilt only after a change
+
+    # function: add a message, moving the oldest messages out of the window when over budget
+    # parameters: self - ConversationHistory, message - dictionary
+    # returns: nothing
+    def append(self, message):
+        tokens = count_tokens(message["content"] or "") + MESSAGE_TOKEN_OVERHEAD #count tokens once per message
+        self.recent.append((message, tokens))
+        self.recent_tokens += tokens
+        while self.recent_tokens > self.token_budget and len(self.recent) > MIN_RECENT_MESSAGES: #if over budget
+            old_message, old_tokens = self.recent.pop(0) #move oldest message out of the window
+            self.recent_tokens -= old_tokens
+            self.unsummarized.append((old_message, old_tokens))
+            self.unsummarized_tokens += old_tokens
+        self.cached_messages = None #history changed
+
+    # function: get the history to send with a prompt
+    # parameters: self - ConversationHistory
+    # returns: list of messages
+    def get_messages(self):
+        if self.cached_messages is None: #if history changed since the last call
+            messages = []
+            if self.summary:
+                messages.append({"role": "assistant", "content": f"Summary of the earlier conversation: {self.summary}"}) #add summary of older turns
+            messages.extend(message for message, _ in self.recent) #add recent turns
+            self.cached_messages = messages
+        return self.cached_messages
+
+    # function: iterate over the history, so it can be used where a list of messages was
+    # parameters: self - ConversationHistory
+    # returns: iterator of messages
+    def __iter__(self):
+        return iter(self.get_messages())
+
+    # function: get the number of messages sent with a prompt
+    # parameters: self - ConversationHistory
+    # returns: number of messages
+    def __len__(self):
+        return len(self.get_messages())
+
+    # function: check whether enough messages are waiting to be worth folding into the summary
+    # parameters: self - ConversationHistory
+    # returns: needs summary - boolean
+    def needs_summary(self):
+        return self.unsummarized_tokens >= SUMMARY_MIN_TOKENS
+
+    # function: build the request that folds the waiting messages into the summary
+    # parameters: self - ConversationHistory
+    # returns: (messages - list of prompt messages, count - number of messages being summarized)
+    def build_summary_messages(self):
+        transcript = '\n'.join(f"{message['role']}: {message['content']}" for message, _ in self.unsummarized) #write waiting messages as a transcript
+        previous = f"Summary so far: {self.summary}\n\n" if self.summary else ""
+        content = (
+            f"{previous}New messages:\n{transcript}\n\n"
+            "Update the summary of this text conversation so it covers the new messages. "
+            "Keep names, plans, facts and the tone of the conversation. Reply with the summary only."
+        )
+        return [{"role": "user", "content": content}], len(self.unsummarized)
+
+    # function: store a new summary covering the first count waiting messages
+    # parameters: self - ConversationHistory, summary - string, count - int
+    # returns: nothing
+    def apply_summary(self, summary, count):
+        self.summary = summary #set summary
+        self.unsummarized_tokens -= sum(tokens for _, tokens in self.unsummarized[:count])
+        self.unsummarized = self.unsummarized[count:] #keep messages that left the window while summarizing
+        self.cached_messages = None #history changed
+
+# function: fold messages that left the window into the summary
+# parameters: history - ConversationHistory, client - AsyncOpenAI, gpt_model - string
+# returns: nothing
+async def summarize_history_async(history, client, gpt_model):
+    messages, count = history.build_summary_messages() #build summary request
+    completion = await client.chat.completions.create(model=gpt_model, messages=messages, max_tokens=SUMMARY_MAX_TOKENS) #generate summary
+    history.apply_summary(completion.choices[0].message.content, count) #store summary
@@ -0,0 +1,184 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+STAT_POLL_INTERVAL = 0.05 #seconds between stat checks when inotify is unavailable
+DATA_VERSION_INTERVAL = 1 #seconds between PRAGMA data_version checks when stat sees no change
+SETTLE_DELAY = 0.01 #seconds without inotify events before a write is treated as committed
+
+IN_MODIFY = 0x00000002 #file was modified
+IN_CLOSE_WRITE = 0x00000008 #writable file was closed
+IN_MOVED_TO = 0x00000080 #file was moved into the watched directory
+IN_CREATE = 0x00000100 #file was created in the watched directory
+IN_DELETE = 0x00000200 #file was deleted from the watched directory
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE #events that can mean a new message
+EVENT_HEADER = struct.Struct('iIII') #wd, mask, cookie, len of struct inotify_event
+
+# function: load the libc inotify functions
+# parameters: none
+# returns: libc - ctypes.CDLL or None when inotify is unavailable
+def load_inotify():
+    if not sys.platform.startswith('linux'): #inotify only exists on linux
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True) #load libc
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'): #if libc is too old
+        return None
+    return libc
+
+# class - wakes on writes to chat.db or chat.db-wal using inotify
+class InotifyChangeNotifier:
+    # function: constructor
+    # parameters: self - InotifyChangeNotifier, db_path - string, libc - ctypes.CDLL
+    # returns: nothing
+    def __init__(self, db_path, libc):
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC) #create inotify instance
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(db_path)) #watch the directory so a recreated -wal is still seen
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno() #get error before closing
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+        name = os.path.basename(db_path) #get database file name
+        self.names = {name, name + '-wal'} #files whose changes mean a new commit
+        self.wake_read, self.wake_write = os.pipe() #pipe used to wake a waiting thread
+
+    # function: check pending inotify events for database changes
+    # parameters: self - InotifyChangeNotifier
+    # returns: changed - boolean
+    def read_events(self):
+        changed = False
+        while True: #drain every pending event so a burst of writes counts once
+            try:
+                data = os.read(self.fd, 65536) #read pending events
+            except BlockingIOError: #if no events are left
+                return changed
+            offset = 0
+            while offset < len(data): #for each event in the buffer
+                _, _, _, name_length = EVENT_HEADER.unpack_from(data, offset) #get event header
+                name_start = offset + EVENT_HEADER.size
+                name = data[name_start:name_start + name_length].rstrip(b'\0').decode(errors='replace') #get file name
+                changed = changed or name in self.names #check whether the database changed
+                offset = name_start + name_length
+
+    # function: wait until the database changes, the timeout passes or wake is called
+    # parameters: self - InotifyChangeNotifier, timeout - float
+    # returns: changed - boolean, True when woken early
+    def wait_for_change(self, timeout):
+        deadline = time.monotonic() + timeout #get deadline
+        while True:
+            remaining = deadline - time.monotonic() #get time remaining
+            if remaining <= 0: #if timeout passed
+                return False
+            readable, _, _ = select.select([self.fd, self.wake_read], [], [], remaining) #sleep until an event arrives
+            if self.wake_read in readable: #if woken by another thread
+                os.read(self.wake_read, 4096) #clear wake pipe
+                return True
+            if readable and self.read_events(): #if chat.db or its wal changed
+                while select.select([self.fd], [], [], SETTLE_DELAY)[0]: #wait for the commit to reach the wal index
+                    self.read_events()
+                return True
+
+    # function: wake a thread blocked in wait_for_change
+    # parameters: self - InotifyChangeNotifier
+    # returns: nothing
+    def wake(self):
+        os.write(self.wake_write, b'\0') #write to wake pipe
+
+    # function: release the inotify instance
+    # parameters: self - InotifyChangeNotifier
+    # returns: nothing
+    def close(self):
+        for fd in (self.fd, self.wake_read, self.wake_write):
+            os.close(fd) #close file descriptor
+
+# class - wakes on changes to chat.db or chat.db-wal by polling stat and PRAGMA data_version
+class StatChangeNotifier:
+    # function: constructor
+    # parameters: self - StatChangeNotifier, db_path - string, database - ChatDatabase or None, poll_interval - float
+    # returns: nothing
+    def __init__(self, db_path, database=None, poll_interval=STAT_POLL_INTERVAL):
+        self.paths = [db_path, db_path + '-wal'] #files whose changes mean a new commit
+        self.database = database #database used for PRAGMA data_version
+        self.poll_interval = poll_interval #set stat poll interval
+        self.wake_flag = threading.Event() #wakes a waiting thread early
+        self.signature = self.get_signature() #get current file signature
+        self.data_version = None #data version, read lazily on the waiting thread's connection
+        self.next_data_version_check = 0 #time of next data version check
+
+    # function: get the size, mtime and inode of the database files
+    # parameters: self - StatChangeNotifier
+    # returns: signature - tuple
+    def get_signature(self):
+        signature = []
+        for path in self.paths: #for each watched file
+            try:
+                stat = os.stat(path) #stat file
+                signature.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+            except FileNotFoundError: #the -wal file does not always exist
+                signature.append(None)
+        return tuple(signature)
+
+    # function: check PRAGMA data_version, which changes whenever another connection commits
+    # parameters: self - StatChangeNotifier
+    # returns: changed - boolean
+    def check_data_version(self):
+        if self.database is None or time.monotonic() < self.next_data_version_check: #if not due yet
+            return False
+        self.next_data_version_check = time.monotonic() + DATA_VERSION_INTERVAL #schedule next check
+        data_version = self.database.execute("PRAGMA data_version")[0][0] #get data version
+        changed = self.data_version is not None and data_version != self.data_version #compare with last check
+        self.data_version = data_version
+        return changed
+
+    # function: wait until the database changes, the timeout passes or wake is called
+    # parameters: self - StatChangeNotifier, timeout - float
+    # returns: changed - boolean, True when woken early
+    def wait_for_change(self, timeout):
+        deadline = time.monotonic() + timeout #get deadline
+        while True:
+            remaining = deadline - time.monotonic() #get time remaining
+            if remaining <= 0: #if timeout passed
+                return False
+            if self.wake_flag.wait(min(self.poll_interval, remaining)): #if woken by another thread
+                self.wake_flag.clear()
+                return True
+            signature = self.get_signature() #get current file signature
+            if signature != self.signature: #if chat.db or its wal changed
+                self.signature = signature
+                self.data_version = None #this commit is handled, so re-read the data version baseline
+                return True
+            if self.check_data_version(): #if a commit did not move mtime or size
+                return True
+
+    # function: wake a thread blocked in wait_for_change
+    # parameters: self - StatChangeNotifier
+    # returns: nothing
+    def wake(self):
+        self.wake_flag.set() #set wake flag
+
+    # function: release resources
+    # parameters: self - StatChangeNotifier
+    # returns: nothing
+    def close(self):
+        pass
+
+# function: create the cheapest available change notifier for a database
+# parameters: db_path - string, database - ChatDatabase or None
+# returns: notifier - InotifyChangeNotifier or StatChangeNotifier
+def create_change_notifier(db_path, database=None):
+    libc = load_inotify() #load inotify on linux
+    if libc is not None:
+        try:
+            return InotifyChangeNotifier(db_path, libc) #use inotify
+        except OSError as e: #if the watch could not be created
+            print(f"inotify unavailable, falling back to stat polling: {e}")
+    return StatChangeNotifier(db_path, database) #poll stat and data_version
@@ -0,0 +1,84 @@
+import threading
+from chatDatabase import get_chat_database
+from canonicalHandle import canonicalize_handle
+
+# class - maps each target number to every handle ROWID that belongs to the same person
+class HandleIndex:
+    # function: constructor
+    # parameters: self - HandleIndex, database - ChatDatabase
+    # returns: nothing
+    def __init__(self, database):
+        self.database = database #set shared read-only database
+        self.lock = threading.Lock() #lock guarding the maps below
+        self.last_handle_id = 0 #ROWID of the last handle loaded
+        self.has_person_ids = None #whether handle has a person_centric_id column
+        self.has_countries = None #whether handle has a country column
+        self.handle_ids = {} #map of handle ROWID to handle id string
+        self.canonical_handles = {} #map of handle ROWID to canonical handle
+        self.rowids_by_canonical = {} #map of canonical handle to set of handle ROWIDs (iMessage, SMS, differently formatted numbers, ...)
+        self.rowids_by_person = {} #map of person_centric_id to set of handle ROWIDs (numbers and email aliases)
+        self.person_by_rowid = {} #map of handle ROWID to person_centric_id
+
+    # function: load handles added since the last refresh
+    # parameters: self - HandleIndex
+    # returns: changed - boolean
+    def refresh(self):
+        with self.lock:
+            if self.has_person_ids is None: #check the schema once
+                columns = [row[1] for row in self.database.execute("PRAGMA table_info(handle)")] #get handle columns
+                self.has_person_ids = 'person_centric_id' in columns
+                self.has_countries = 'country' in columns
+            person_column = 'person_centric_id' if self.has_person_ids else 'NULL' #older macOS versions have no person ids
+            country_column = 'country' if self.has_countries else 'NULL'
+            rows = self.database.execute(f"SELECT ROWID, id, {person_column}, {country_column} FROM handle WHERE ROWID > ? ORDER BY ROWID", (self.last_handle_id,)) #get new handles
+            for rowid, handle_id, person_id, country in rows: #for each new handle
+                canonical = canonicalize_handle(handle_id, country) #parse each handle once, as it appears
+                self.handle_ids[rowid] = handle_id
+                self.canonical_handles[rowid] = canonical
+                self.rowids_by_canonical.setdefault(canonical, set()).add(rowid) #group handles with the same canonical id
+                if person_id:
+                    self.rowids_by_person.setdefault(person_id, set()).add(rowid) #group handles of the same person
+                    self.person_by_rowid[rowid] = person_id
+                self.last_handle_id = rowid
+            return len(rows) > 0
+
+    # function: get every handle ROWID for a target number or email, however it is formatted
+    # parameters: self - HandleIndex, target_number - string
+    # returns: handle rowids - frozenset of ints
+    def get_handle_rowids(self, target_number):
+        canonical = canonicalize_handle(target_number) #cached after the first lookup
+        with self.lock:
+            rowids = set(self.rowids_by_canonical.get(canonical, ())) #get handles with this canonical id
+            for rowid in list(rowids): #for each handle
+                person_id = self.person_by_rowid.get(rowid)
+                if person_id:
+                    rowids |= self.rowids_by_person[person_id] #add the person's other handles
+            return frozenset(rowids)
+
+    # function: get the handle id string for a handle ROWID
+    # parameters: self - HandleIndex, rowid - int
+    # returns: handle id - string or None
+    def get_handle_id(self, rowid):
+        with self.lock:
+            return self.handle_ids.get(rowid)
+
+    # function: get the canonical handle for a handle ROWID
+    # parameters: self - HandleIndex, rowid - int
+    # returns: canonical handle - string or None
+    def get_canonical_handle(self, rowid):
+        with self.lock:
+            return self.canonical_handles.get(rowid)
+
+_indexes = {} #map of database path to handle index
+_indexes_lock = threading.Lock()
+
+# function: get the shared handle index for a database, loading it on first use
+# parameters: db_path - string
+# returns: index - HandleIndex
+def get_handle_index(db_path):
+    with _indexes_lock:
+        if db_path not in _indexes:
+            index = HandleIndex(get_chat_database(db_path)) #create index for database
+            index.refresh() #load every existing handle
+            _indexes[db_path] = index
+        return _indexes[db_path]
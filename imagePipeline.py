@@ -0,0 +1,49 @@
+import io
+import subprocess
+from PIL import Image, ImageOps
+
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener() #let Pillow decode HEIC photos directly
+except ImportError: #without pillow-heif, HEIC photos are decoded by ImageMagick
+    pass
+
+MAX_LONG_SIDE = 2048 #the vision model scales images to fit 2048x2048
+MAX_SHORT_SIDE = 768 #then scales the short side to 768, so larger images only cost upload time
+JPEG_QUALITY = 80 #quality used to re-encode images for upload
+DRAFT_TOLERANCE = 0.9 #jpegs may decode up to 10% under the target size, which lets a 12MP photo decode at a quarter scale
+
+# function: decode an image with ImageMagick into memory, for formats Pillow cannot open
+# parameters: filepath - string
+# returns: image - PIL.Image
+def decode_with_imagemagick(filepath):
+    output = subprocess.run(['magick', 'convert', filepath, 'jpeg:-'], check=True, capture_output=True).stdout #convert image to jpeg on stdout
+    return Image.open(io.BytesIO(output))
+
+# function: get the size that fits an image within the vision model's useful resolution
+# parameters: width - int, height - int
+# returns: (width, height)
+def get_vision_size(width, height):
+    scale = min(1, MAX_LONG_SIDE / max(width, height), MAX_SHORT_SIDE / min(width, height)) #never upscale
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+# function: decode, orient, downscale and re-encode an image for a vision request, without temporary files
+# parameters: filepath - string
+# returns: jpeg bytes
+def prepare_image(filepath):
+    try:
+        image = Image.open(filepath) #open image, reading only its header
+    except IOError: #if Pillow cannot open the format
+        image = decode_with_imagemagick(filepath)
+    with image:
+        width, height = get_vision_size(*image.size)
+        image.draft('RGB', (int(width * DRAFT_TOLERANCE), int(height * DRAFT_TOLERANCE))) #decode jpegs at a reduced scale, close to the target size
+        if image.mode in ('1', 'P'):
+            image = image.convert('RGB') #palettes cannot be resampled smoothly
+        image.thumbnail(get_vision_size(*image.size), Image.LANCZOS) #downscale before any other work
+        image = ImageOps.exif_transpose(image) #apply EXIF orientation to the small image
+        if image.mode != 'RGB':
+            image = image.convert('RGB') #drop alpha
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY) #re-encode into memory
+    return buffer.getvalue()
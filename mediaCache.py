@@ -0,0 +1,216 @@
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import time
+import os
+from collections import OrderedDict
+
+CACHE_PATH = 'media_cache.db' #name of on-disk cache file
+MEMORY_CACHE_SIZE = 256 #number of results kept in memory
+HASH_CACHE_SIZE = 4096 #number of attachment hashes kept in memory, the rest are read back from disk
+
+# function: hash the contents of a file
+# parameters: filepath - string
+# returns: content hash - string
+def hash_file(filepath):
+    digest = hashlib.blake2b(digest_size=20) #create hash
+    with open(filepath, "rb") as media_file: #open media file
+        for chunk in iter(lambda: media_file.read(1 << 20), b''): #read file in 1 MB chunks
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# function: resolve a future waiting for a result, unless its task was cancelled, called on the future's loop
+# parameters: future - asyncio.Future
+# returns: nothing
+def wake_waiter(future):
+    if not future.done():
+        future.set_result(None)
+
+# class - cache of image descriptions and audio transcripts keyed by attachment ROWID and content hash
+class MediaCache:
+    # function: constructor
+    # parameters: self - MediaCache, path - string, memory_size - int, hash_size - int
+    # returns: nothing
+    def __init__(self, path=CACHE_PATH, memory_size=MEMORY_CACHE_SIZE, hash_size=HASH_CACHE_SIZE):
+        self.memory_size = memory_size #set number of results kept in memory
+        self.hash_size = hash_size #set number of attachment hashes kept in memory
+        self.memory = OrderedDict() #map of (kind, content hash) to result, least recently used first
+        self.hashes = OrderedDict() #map of attachment ROWID to (content hash, size, mtime), least recently used first
+        self.in_flight = {} #map of (kind, content hash) being computed to the futures of callers waiting for it
+        self.lock = threading.Lock() #lock guarding the maps and the connection
+        self.conn = sqlite3.connect(path, check_same_thread=False) #connect to on-disk cache
+        self.conn.execute("PRAGMA journal_mode = WAL") #keep readers and the writer from blocking each other
+        self.conn.execute("PRAGMA synchronous = NORMAL") #commits are cheap and a lost result is only recomputed
+        self.conn.execute("CREATE TABLE IF NOT EXISTS media_result (kind TEXT NOT NULL, content_hash TEXT NOT NULL, result TEXT NOT NULL, created_at REAL NOT NULL, PRIMARY KEY (kind, content_hash))")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS attachment_hash (attachment_id INTEGER PRIMARY KEY, content_hash TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)")
+        self.conn.commit()
+
+    # function: get the content hash of an attachment, hashing the file only when it is new or changed
+    # parameters: self - MediaCache, attachment_id - int or None, filepath - string
+    # returns: content hash - string
+    def get_content_hash(self, attachment_id, filepath):
+        stat = os.stat(filepath) #stat file
+        with self.lock:
+            cached = self.hashes.get(attachment_id) #check memory
+            if cached is None and attachment_id is not None:
+                row = self.conn.execute("SELECT content_hash, size, mtime_ns FROM attachment_hash WHERE attachment_id = ?", (attachment_id,)).fetchone() #check disk
+                cached = tuple(row) if row else None
+            if cached and cached[1:] == (stat.st_size, stat.st_mtime_ns): #if file is unchanged since it was hashed
+                self.remember_hash(attachment_id, cached)
+                return cached[0]
+        content_hash = hash_file(filepath) #hash file outside the lock
+        if attachment_id is not None:
+            with self.lock:
+                self.remember_hash(attachment_id, (content_hash, stat.st_size, stat.st_mtime_ns)) #remember hash
+                self.conn.execute("INSERT OR REPLACE INTO attachment_hash VALUES (?, ?, ?, ?)", (attachment_id, content_hash, stat.st_size, stat.st_mtime_ns))
+                self.conn.commit()
+        return content_hash
+
+    # function: look up a result in memory, then on disk
+    # parameters: self - MediaCache, key - tuple
+    # returns: result - string or None
+    def lookup(self, key):
+        with self.lock:
+            if key in self.memory: #if result is in memory
+                self.memory.move_to_end(key) #mark as recently used
+                return self.memory[key]
+            row = self.conn.execute("SELECT result FROM media_result WHERE kind = ? AND content_hash = ?", key).fetchone() #check disk
+            if row:
+                self.remember(key, row[0]) #promote to memory
+                return row[0]
+        return None
+
+    # function: store a result in memory, evicting the least recently used, called with the lock held
+    # parameters: self - MediaCache, key - tuple, result - string
+    # returns: nothing
+    def remember(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key) #mark as recently used
+        while len(self.memory) > self.memory_size: #if memory is full
+            self.memory.popitem(last=False) #evict least recently used
+
+    # function: store an attachment hash in memory, evicting the least recently used, called with the lock held
+    # parameters: self - MediaCache, attachment_id - int, entry - (content hash, size, mtime)
+    # returns: nothing
+    def remember_hash(self, attachment_id, entry):
+        self.hashes[attachment_id] = entry
+        self.hashes.move_to_end(attachment_id) #mark as recently used
+        while len(self.hashes) > self.hash_size: #if memory is full
+            self.hashes.popitem(last=False) #evict least recently used
+
+    # function: claim the right to compute a result, or get a future to wait on if another caller already has, called on the caller's event loop
+    # parameters: self - MediaCache, key - tuple
+    # returns: future - asyncio.Future resolved when the result is ready, or None when the caller should compute the result
+    def claim(self, key):
+        with self.lock:
+            waiters = self.in_flight.get(key) #check whether another caller is computing this result
+            if waiters is None: #if this caller should compute it
+                self.in_flight[key] = []
+                return None
+            future = asyncio.get_running_loop().create_future() #resolved from whichever thread releases the claim
+            waiters.append(future)
+            return future
+
+    # function: store a computed result and wake callers waiting on it
+    # parameters: self - MediaCache, key - tuple, result - string or None
+    # returns: nothing
+    def release(self, key, result):
+        with self.lock:
+            if result is not None: #failed requests are retried next time
+                self.remember(key, result) #store in memory
+                self.conn.execute("INSERT OR REPLACE INTO media_result VALUES (?, ?, ?, ?)", key + (result, time.time())) #store on disk
+                self.conn.commit()
+            waiters = self.in_flight.pop(key)
+        for future in waiters: #wake waiting callers on their own loops
+            future.get_loop().call_soon_threadsafe(wake_waiter, future)
+
+    # function: get a cached result or compute it once, even when several conversations ask at the same time, with file and database work run in the executor
+    # parameters: self - MediaCache, kind - string, attachment_id - int or None, filepath - string, compute - coroutine function
+    # returns: result - string or None
+    async def get_or_compute_async(self, kind, attachment_id, filepath, compute):
+        loop = asyncio.get_running_loop() #get event loop
+        try:
+            key = (kind, await loop.run_in_executor(None, self.get_content_hash, attachment_id, filepath)) #hash file off the loop
+        except OSError: #if the file cannot be read the cache cannot help
+            return await compute()
+        while True:
+            result = await loop.run_in_executor(None, self.lookup, key) #check memory and disk
+            if result is not None:
+                return result
+            waiter = self.claim(key) #claim the computation
+            if waiter is None: #if this caller should compute it
+                break
+            await waiter #wait for the other caller without holding an executor thread, then look again
+        result = None
+        try:
+            result = await compute() #compute result
+            return result
+        finally:
+            self.release(key, result) #store result and wake waiting callers, even if the task was cancelled
+
+    # function: look up every result of a batch in memory, then on disk
+    # parameters: self - MediaCache, keys - list of tuples or None
+    # returns: list of results - string or None
+    def lookup_batch(self, keys):
+        return [None if key is None else self.lookup(key) for key in keys]
+
+    # function: claim every uncached result of a batch, so the batch can be computed in one call, called on the caller's event loop
+    # parameters: self - MediaCache, keys - list of tuples or None, results - list of cached results
+    # returns: (todo - indexes this caller should compute, waits - list of (index, future) computed by other callers)
+    def claim_batch(self, keys, results):
+        todo, waits = [], []
+        for index, key in enumerate(keys):
+            if key is None: #if the file cannot be read the cache cannot help
+                todo.append(index)
+            elif results[index] is None: #if the result is not cached
+                waiter = self.claim(key) #claim the computation
+                if waiter is None: #if this caller should compute it
+                    todo.append(index)
+                else:
+                    waits.append((index, waiter))
+        return todo, waits
+
+    # function: get cached results for a batch, computing every missing result with one call, with file and database work run in the executor
+    # parameters: self - MediaCache, kind - string, items - list of (attachment_id, filepath), compute_batch - coroutine function taking a list of filepaths and returning a list of results
+    # returns: list of results - string or None, in the order of items
+    async def get_or_compute_batch_async(self, kind, items, compute_batch):
+        loop = asyncio.get_running_loop() #get event loop
+        keys = [await loop.run_in_executor(None, self.get_batch_key, kind, attachment_id, filepath) for attachment_id, filepath in items] #hash files off the loop
+        results = await loop.run_in_executor(None, self.lookup_batch, keys) #check cache off the loop
+        todo, waits = self.claim_batch(keys, results) #claim on the loop with nothing awaited before the try, so a cancelled task cannot leave a claim behind
+        computed = [None] * len(todo)
+        try:
+            if todo:
+                computed = await compute_batch([items[index][1] for index in todo]) #compute missing results
+        finally:
+            for index, result in zip(todo, computed): #store results and wake waiting callers, even if the task was cancelled
+                results[index] = result
+                if keys[index] is not None:
+                    self.release(keys[index], result)
+        for index, waiter in waits: #collect results computed by other callers
+            await waiter
+            results[index] = await loop.run_in_executor(None, self.lookup, keys[index])
+        return results
+
+    # function: get the cache key of a file in a batch
+    # parameters: self - MediaCache, kind - string, attachment_id - int or None, filepath - string
+    # returns: key - tuple, or None if the file cannot be read
+    def get_batch_key(self, kind, attachment_id, filepath):
+        try:
+            return (kind, self.get_content_hash(attachment_id, filepath)) #key by content so forwarded media is shared
+        except OSError:
+            return None
+
+_media_cache = None #shared media cache
+_media_cache_lock = threading.Lock()
+
+# function: get the shared media cache
+# parameters: none
+# returns: cache - MediaCache
+def get_media_cache():
+    global _media_cache
+    with _media_cache_lock:
+        if _media_cache is None:
+            _media_cache = MediaCache() #open cache on first use
+        return _media_cache
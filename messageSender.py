@@ -0,0 +1,218 @@
+import os
+import queue
+import struct
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+from pipelineMetrics import current_conversation, get_pipeline_metrics
+
+try:
+    from Foundation import NSAppleEventDescriptor, NSAppleScript, NSURL
+except ImportError: #sends fall back to one osascript process each when PyObjC is not installed
+    NSAppleScript = None
+
+SEND_SCRIPT = 'sendMessage.applescript' #applescript that sends a message through Messages.app
+SEND_TIMEOUT = 30 #longest time a single send may take, in seconds
+MESSAGE_TRANSPORT = os.environ.get("MESSAGE_TRANSPORT") #transport to send with: applescript, osascript or fake, chosen automatically when unset
+FAKE_SEND_LOG = os.environ.get("FAKE_SEND_LOG") #file the fake transport records sends in, or None to keep them in memory only
+FAKE_SEND_LATENCY = float(os.environ.get("FAKE_SEND_LATENCY", "0")) #seconds a fake send takes
+
+# function: pack a four character apple event code into an int
+# parameters: code - string of four characters
+# returns: code - int
+def four_char_code(code):
+    return struct.unpack('>I', code.encode('ascii'))[0]
+
+# class - sends by running the compiled applescript in this process, so no process starts per message
+class AppleScriptTransport:
+    name = "applescript"
+
+    # function: constructor
+    # parameters: self - AppleScriptTransport, script_path - string
+    # returns: nothing
+    def __init__(self, script_path=SEND_SCRIPT):
+        self.script_path = os.path.abspath(script_path) #resolve now, in case the working directory changes
+        self.script = None #compiled script, compiled on the sender thread on first use
+
+    # function: compile the send script once
+    # parameters: self - AppleScriptTransport
+    # returns: nothing
+    def compile(self):
+        script, error = NSAppleScript.alloc().initWithContentsOfURL_error_(NSURL.fileURLWithPath_(self.script_path), None) #load script source
+        if script is None:
+            raise RuntimeError(f"could not load {self.script_path}: {error}")
+        compiled, error = script.compileAndReturnError_(None) #compile once for every send
+        if not compiled:
+            raise RuntimeError(f"could not compile {self.script_path}: {error}")
+        self.script = script
+
+    # function: send a message by calling the script's run handler with the number and text as parameters
+    # parameters: self - AppleScriptTransport, target_number - string, message - string
+    # returns: nothing, raises RuntimeError if the send failed
+    def send(self, target_number, message):
+        if self.script is None:
+            self.compile()
+        parameters = NSAppleEventDescriptor.listDescriptor() #run handler parameters, passed as values so nothing needs escaping
+        parameters.insertDescriptor_atIndex_(NSAppleEventDescriptor.descriptorWithString_(target_number), 1)
+        parameters.insertDescriptor_atIndex_(NSAppleEventDescriptor.descriptorWithString_(message), 2)
+        event = NSAppleEventDescriptor.appleEventWithEventClass_eventID_targetDescriptor_returnID_transactionID_(
+            four_char_code('aevt'), four_char_code('oapp'), NSAppleEventDescriptor.currentProcessDescriptor(), -1, 0) #run event, as osascript sends it
+        event.setParamDescriptor_forKeyword_(parameters, four_char_code('----'))
+        result, error = self.script.executeAppleEvent_error_(event, None) #run the script
+        if result is None:
+            raise RuntimeError(str(error))
+
+    # function: release the compiled script
+    # parameters: self - AppleScriptTransport
+    # returns: nothing
+    def close(self):
+        self.script = None
+
+# class - sends by running osascript with the number and text as arguments, without a shell
+class OsascriptTransport:
+    name = "osascript"
+
+    # function: constructor
+    # parameters: self - OsascriptTransport, script_path - string, timeout - float
+    # returns: nothing
+    def __init__(self, script_path=SEND_SCRIPT, timeout=SEND_TIMEOUT):
+        self.script_path = os.path.abspath(script_path) #resolve now, in case the working directory changes
+        self.timeout = timeout
+
+    # function: send a message
+    # parameters: self - OsascriptTransport, target_number - string, message - string
+    # returns: nothing, raises RuntimeError if the send failed
+    def send(self, target_number, message):
+        process = subprocess.run(['osascript', self.script_path, target_number, message], capture_output=True, timeout=self.timeout) #pass arguments directly so no escaping is needed
+        if process.returncode != 0:
+            raise RuntimeError(process.stderr.decode('utf-8', 'replace').strip() or f"osascript exited with {process.returncode}")
+
+    # function: nothing to release
+    # parameters: self - OsascriptTransport
+    # returns: nothing
+    def close(self):
+        pass
+
+# class - records sends instead of sending them, for running Chat Pilot off macOS
+class FakeTransport:
+    name = "fake"
+
+    # function: constructor
+    # parameters: self - FakeTransport, log_path - string or None, latency - float
+    # returns: nothing
+    def __init__(self, log_path=FAKE_SEND_LOG, latency=FAKE_SEND_LATENCY):
+        self.log_path = log_path
+        self.latency = latency
+        self.sent = [] #list of (time, target number, message) sent
+
+    # function: record a send
+    # parameters: self - FakeTransport, target_number - string, message - string
+    # returns: nothing
+    def send(self, target_number, message):
+        time.sleep(self.latency)
+        sent_at = time.time()
+        self.sent.append((sent_at, target_number, message))
+        if self.log_path is not None: #if sends are shared with another process
+            line = f"{sent_at}\t{target_number}\t{message.replace(chr(10), ' ')}\n"
+            file_descriptor = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT) #append in one write so concurrent senders never interleave
+            os.write(file_descriptor, line.encode())
+            os.close(file_descriptor)
+
+    # function: nothing to release
+    # parameters: self - FakeTransport
+    # returns: nothing
+    def close(self):
+        pass
+
+TRANSPORTS = {transport.name: transport for transport in (AppleScriptTransport, OsascriptTransport, FakeTransport)} #map of transport name to class
+
+# function: create the transport named by MESSAGE_TRANSPORT, or the fastest one available
+# parameters: name - string or None
+# returns: transport
+def create_transport(name=MESSAGE_TRANSPORT):
+    if name is None:
+        name = "applescript" if NSAppleScript is not None else "osascript" #run the script in process when PyObjC is installed
+    if name == "applescript" and NSAppleScript is None:
+        print("PyObjC is not installed, falling back to the osascript transport")
+        name = "osascript"
+    if name not in TRANSPORTS:
+        raise ValueError(f"unknown message transport {name}, expected one of {', '.join(TRANSPORTS)}")
+    return TRANSPORTS[name]()
+
+# class - long-lived worker sending queued messages one at a time through a transport
+class MessageSender:
+    # function: constructor
+    # parameters: self - MessageSender, transport - transport or None for create_transport()
+    # returns: nothing
+    def __init__(self, transport=None):
+        self.transport = transport if transport is not None else create_transport()
+        self.queue = queue.Queue() #queue of (target number, message, future, conversation, queued at) jobs
+        self.lock = threading.Lock() #lock guarding the counts below
+        self.sent = 0 #messages sent
+        self.failed = 0 #messages that could not be sent
+        self.thread = threading.Thread(target=self.run, daemon=True) #worker thread, which owns the transport
+        self.thread.start()
+
+    # function: queue a message, in order after every message queued before it
+    # parameters: self - MessageSender, target_number - string, message - string
+    # returns: future resolving to a result dictionary with target_number, ok, seconds, queue_seconds and error
+    def send(self, target_number, message):
+        future = Future()
+        self.queue.put((target_number, message, future, current_conversation.get(), time.perf_counter())) #remember the conversation, since the worker runs outside its context
+        return future
+
+    # function: send queued messages until stopped
+    # parameters: self - MessageSender
+    # returns: nothing
+    def run(self):
+        metrics = get_pipeline_metrics() #get shared pipeline metrics
+        while True:
+            job = self.queue.get()
+            if job is None: #if the sender was stopped
+                break
+            target_number, message, future, conversation, queued_at = job
+            started_at = time.time() #wall clock start, for the span log
+            start_time = time.perf_counter()
+            error = None
+            try:
+                self.transport.send(target_number, message)
+            except Exception as e: #keep the worker alive whatever the transport raises
+                error = str(e) or type(e).__name__
+            end_time = time.perf_counter()
+            with self.lock:
+                if error is None:
+                    self.sent += 1
+                else:
+                    self.failed += 1
+            result = {"target_number": target_number, "ok": error is None, "seconds": end_time - start_time, "queue_seconds": start_time - queued_at, "error": error}
+            metrics.record("send", end_time - queued_at, conversation, started_at - result["queue_seconds"], transport=self.transport.name, queue_seconds=result["queue_seconds"], **({"error": error} if error else {})) #time the send, including its wait in the queue
+            future.set_result(result)
+        self.transport.close()
+
+    # function: get send counts and queue length
+    # parameters: self - MessageSender
+    # returns: stats - dictionary
+    def get_stats(self):
+        with self.lock:
+            return {"transport": self.transport.name, "sent": self.sent, "failed": self.failed, "queued": self.queue.qsize()}
+
+    # function: stop the worker once every queued message is sent
+    # parameters: self - MessageSender, timeout - float or None
+    # returns: nothing
+    def stop(self, timeout=None):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+_sender = None #shared sender
+_sender_lock = threading.Lock() #lock guarding the shared sender
+
+# function: get the sender shared by every conversation, starting it on first use
+# parameters: none
+# returns: sender - MessageSender
+def get_message_sender():
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = MessageSender()
+        return _sender
@@ -0,0 +1,227 @@
+from chatDatabase import get_chat_database
+from databaseNotifier import create_change_notifier
+from handleIndex import get_handle_index
+from pipelineMetrics import get_pipeline_metrics
+import sqlite3
+import threading
+import queue
+
+MAX_LATENCY = 5 #longest time between polls of chat.db if a change notification is missed
+
+NEW_MESSAGES_QUERY = """
+    SELECT m.ROWID, m.text, CASE WHEN a.filename IS NOT NULL THEN 1 ELSE 0 END as is_media, a.mime_type, a.filename, a.ROWID, m.handle_id
+    FROM message m
+    LEFT JOIN message_attachment_join maj ON m.ROWID = maj.message_id
+    LEFT JOIN attachment a ON maj.attachment_id = a.ROWID
+    WHERE m.handle_id IN ({}) AND m.ROWID > ? AND m.ROWID <= ? AND m.is_from_me = 0
+    ORDER BY m.ROWID ASC
+    """ #get new messages from every subscribed handle, oldest first
+
+# class - queue of new messages from a single handle
+class Subscription:
+    # function: constructor
+    # parameters: self - Subscription, target_number - string, after_id - int ROWID to deliver messages after, or None for only messages arriving from now on
+    # returns: nothing
+    def __init__(self, target_number, after_id=None):
+        self.target_number = target_number #set target number
+        self.after_id = after_id #set where the watcher starts delivering when it adds the subscription
+        self.joined = threading.Event() #set once the watcher thread has added the subscription
+        self.queue = queue.Queue() #create queue of new message rows
+        self.ready = threading.Event() #set when rows are routed to this subscription, until they are drained
+        self.listeners = [] #callbacks run on the watcher thread when rows are routed
+
+    # function: get every row routed to this subscription since the last call
+    # parameters: self - Subscription
+    # returns: list of message rows, oldest first
+    def get_new_rows(self):
+        self.ready.clear() #clear before draining so a row routed mid-drain sets it again
+        rows = [] #create rows list
+        while True: #drain the queue without blocking
+            try:
+                rows.append(self.queue.get_nowait()) #get next row
+            except queue.Empty: #if queue is empty
+                return rows #return rows
+
+    # function: mark rows as ready and run listeners, called on the watcher thread
+    # parameters: self - Subscription
+    # returns: nothing
+    def notify(self):
+        self.ready.set() #mark rows as waiting
+        for listener in list(self.listeners): #for each listener
+            listener() #wake event loops waiting for rows
+
+# class - per-conversation cursor over a subscription that keeps unanswered messages until the reply is sent
+class ConversationCursor:
+    # function: constructor
+    # parameters: self - ConversationCursor, subscription - Subscription, last_id - int ROWID of the last message already processed
+    # returns: nothing
+    def __init__(self, subscription, last_id=0):
+        self.subscription = subscription #set subscription
+        self.last_id_seen = last_id #highest message ROWID fetched
+        self.last_id_answered = last_id #highest message ROWID covered by a sent reply
+        self.pending = [] #normalized unanswered messages, newest first
+
+    # function: get rows that arrived since the last fetch
+    # parameters: self - ConversationCursor
+    # returns: list of message rows, oldest first
+    def fetch_new_rows(self):
+        rows = [row for row in self.subscription.get_new_rows() if row[0] > self.last_id_seen] #skip anything already seen
+        if rows:
+            self.last_id_seen = max(row[0] for row in rows) #advance cursor
+        return rows
+
+    # function: add newly normalized messages to the unanswered messages
+    # parameters: self - ConversationCursor, messages - list of messages, newest first
+    # returns: nothing
+    def add_pending(self, messages):
+        self.pending = messages + self.pending #keep newest first
+
+    # function: drop the unanswered messages once a reply covering them is sent
+    # parameters: self - ConversationCursor
+    # returns: nothing
+    def acknowledge(self):
+        self.pending = [] #clear answered messages
+        self.last_id_answered = self.last_id_seen #record how far the conversation has answered
+
+# class - single chat.db poller that fans new messages out to every active conversation
+class MessageWatcher:
+    # function: constructor
+    # parameters: self - MessageWatcher, db_path - string, max_latency - float
+    # returns: nothing
+    def __init__(self, db_path, max_latency=MAX_LATENCY):
+        self.database = get_chat_database(db_path) #set shared read-only database
+        self.handle_index = get_handle_index(db_path) #set shared handle index
+        self.max_latency = max_latency #set longest time between polls
+        self.subscriptions = {} #map of target number to list of subscriptions
+        self.joining = [] #subscriptions the watcher thread has not added yet
+        self.routes = {} #map of handle ROWID to list of subscriptions, only grown on the watcher thread
+        self.lock = threading.Lock() #lock guarding subscriptions and the watcher thread
+        self.notifier = None #wakes the watcher thread when chat.db changes
+        self.thread = None #watcher thread
+        self.last_id_checked = None #id of the last message routed, read by the watcher thread when it starts
+
+    # function: subscribe to new messages from a handle, leaving every database read to the watcher thread
+    # parameters: self - MessageWatcher, target_number - string, after_id - int ROWID to deliver messages after, or None for only messages arriving from now on
+    # returns: subscription - Subscription
+    def subscribe(self, target_number, after_id=None):
+        subscription = Subscription(target_number, after_id) #create subscription
+        with self.lock:
+            self.joining.append(subscription) #the watcher thread adds it at its next poll
+            if self.thread is None: #if the watcher thread is not running
+                self.notifier = create_change_notifier(self.database.db_path, self.database) #watch chat.db and its wal
+                self.thread = threading.Thread(target=self.run, daemon=True) #create watcher thread
+                self.thread.start() #start watcher thread
+            else:
+                self.notifier.wake() #add the subscription now rather than at the next change
+        subscription.joined.wait() #return once the watcher's position is fixed, so no message written after this is missed
+        return subscription
+
+    # function: get the messages a new subscription missed before the watcher's position, called on the watcher thread
+    # parameters: self - MessageWatcher, subscription - Subscription
+    # returns: list of message rows, oldest first
+    def get_backfill_rows(self, subscription):
+        if subscription.after_id is None or subscription.after_id >= self.last_id_checked: #if the subscription starts at the watcher's position
+            return []
+        handle_rowids = sorted(self.handle_index.get_handle_rowids(subscription.target_number)) #get every handle of the target
+        if not handle_rowids:
+            return []
+        query = NEW_MESSAGES_QUERY.format(','.join('?' * len(handle_rowids)))
+        return self.database.execute(query, handle_rowids + [subscription.after_id, self.last_id_checked]) #get missed messages, oldest first
+
+    # function: unsubscribe from new messages
+    # parameters: self - MessageWatcher, subscription - Subscription
+    # returns: nothing
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.joining: #if the watcher thread has not added it yet
+                self.joining.remove(subscription)
+            subscriptions = self.subscriptions.get(subscription.target_number, []) #get subscriptions for handle
+            if subscription in subscriptions:
+                subscriptions.remove(subscription) #remove subscription
+            if not subscriptions:
+                self.subscriptions.pop(subscription.target_number, None) #forget handle with no subscriptions
+            self.build_routes() #stop routing to the removed subscription
+            if not self.subscriptions and not self.joining: #if no conversations are left
+                if self.notifier is not None:
+                    self.notifier.wake() #wake the watcher thread so it can exit
+
+    # function: map every handle ROWID of every subscribed target to its subscriptions, called with the lock held
+    # parameters: self - MessageWatcher
+    # returns: nothing
+    def build_routes(self):
+        routes = {} #create routes map
+        for target_number, subscriptions in self.subscriptions.items(): #for each subscribed target
+            for rowid in self.handle_index.get_handle_rowids(target_number): #for each handle of the target
+                routes.setdefault(rowid, []).extend(subscriptions)
+        self.routes = routes
+
+    # function: poll the database once and route new messages to subscriptions
+    # parameters: self - MessageWatcher
+    # returns: nothing
+    def poll(self):
+        last_message_id = self.database.get_last_message_id() #read the end of the message table
+        if self.last_id_checked is None: #if the watcher thread just started
+            self.last_id_checked = last_message_id #start from the last message in the database
+        if last_message_id <= self.last_id_checked and not self.joining: #if nothing was written and nobody subscribed since the last poll
+            return
+        handles_changed = self.handle_index.refresh() #pick up new handles, including those of new subscriptions
+        with self.lock:
+            joining = list(self.joining)
+        backfills = [self.get_backfill_rows(subscription) for subscription in joining] #query before adding anything, so a failed poll leaves the subscriptions waiting to be added
+        with self.lock: #add new subscriptions and copy the routes in one step, so routes only grow here and every routed handle is queried below
+            for subscription, backfill_rows in zip(joining, backfills):
+                if subscription not in self.joining: #if it was unsubscribed meanwhile
+                    continue
+                self.joining.remove(subscription)
+                self.subscriptions.setdefault(subscription.target_number, []).append(subscription) #add subscription to handle
+                for row in backfill_rows:
+                    subscription.queue.put(row[:-1]) #queue before anything routed below
+                if backfill_rows:
+                    subscription.notify() #wake conversation
+                subscription.joined.set() #wake the subscriber
+            if joining or handles_changed:
+                self.build_routes() #route new subscriptions and new handles of subscribed targets
+            handle_rowids = sorted(self.routes) #get every subscribed handle
+        rows = [] #create rows list
+        if handle_rowids:
+            query = NEW_MESSAGES_QUERY.format(','.join('?' * len(handle_rowids))) #same text while subscriptions are unchanged, so the statement stays cached
+            rows = self.database.execute(query, handle_rowids + [self.last_id_checked, last_message_id]) #get new messages from subscribed handles
+        with self.lock:
+            for row in rows: #for each new message
+                handle_rowid = row[-1] #get handle of message
+                for subscription in self.routes.get(handle_rowid, []): #for each conversation with this handle
+                    subscription.queue.put(row[:-1]) #route message to conversation
+                    subscription.notify() #wake conversation
+            self.last_id_checked = last_message_id #advance past every message, routed or not
+
+    # function: poll the database until every subscription is gone
+    # parameters: self - MessageWatcher
+    # returns: nothing
+    def run(self):
+        while True: #loop until every conversation has unsubscribed
+            with self.lock:
+                if not self.subscriptions and not self.joining: #if no conversations are left
+                    self.database.close() #close the watcher thread's connection
+                    self.notifier.close() #stop watching chat.db
+                    self.notifier = None
+                    self.thread = None #let the next subscription start a new thread
+                    self.last_id_checked = None #the next thread starts from the end of the database again
+                    return
+            try:
+                with get_pipeline_metrics().span("poll"): #time the poll, shared by every conversation
+                    self.poll() #poll database
+            except sqlite3.Error as e: #if the database is busy or unavailable
+                print(f"Error polling messages: {e}") #print error and retry next tick
+            self.notifier.wait_for_change(self.max_latency) #sleep until chat.db changes
+
+_watchers = {} #map of database path to watcher
+_watchers_lock = threading.Lock()
+
+# function: get the shared watcher for a database
+# parameters: db_path - string
+# returns: watcher - MessageWatcher
+def get_message_watcher(db_path):
+    with _watchers_lock:
+        if db_path not in _watchers:
+            _watchers[db_path] = MessageWatcher(db_path) #create watcher for database
+        return _watchers[db_path]
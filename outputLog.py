@@ -0,0 +1,48 @@
+import threading
+from collections import deque
+from itertools import islice
+
+OUTPUT_LOG_MAX_LINES = 5000 #lines kept per conversation, older lines are dropped
+
+# class - bounded, thread-safe log of a conversation's console output, numbered so readers fetch only new lines
+class OutputLog:
+    # function: constructor
+    # parameters: self - OutputLog, max_lines - int
+    # returns: nothing
+    def __init__(self, max_lines=OUTPUT_LOG_MAX_LINES):
+        self.lock = threading.Lock() #lock guarding the lines and sequence below
+        self.lines = deque(maxlen=max_lines) #most recent lines, oldest dropped first
+        self.next_sequence = 0 #sequence number of the next line appended
+
+    # function: add a line, dropping the oldest line when full
+    # parameters: self - OutputLog, line - string
+    # returns: nothing
+    def append(self, line):
+        with self.lock:
+            self.lines.append(str(line))
+            self.next_sequence += 1
+
+    # function: get the lines appended since a sequence number
+    # parameters: self - OutputLog, sequence - int
+    # returns: (lines - list of strings, next sequence - int, dropped - int lines no longer kept)
+    def read_since(self, sequence):
+        with self.lock:
+            first_sequence = self.next_sequence - len(self.lines) #sequence number of the oldest line kept
+            start = max(sequence, first_sequence)
+            count = self.next_sequence - start
+            lines = list(islice(reversed(self.lines), count))[::-1] #read from the newest end, so the cost follows the new lines only
+            return lines, self.next_sequence, start - sequence
+
+    # function: get the number of lines kept
+    # parameters: self - OutputLog
+    # returns: line count - int
+    def __len__(self):
+        with self.lock:
+            return len(self.lines)
+
+    # function: iterate over a copy of the lines kept
+    # parameters: self - OutputLog
+    # returns: iterator of strings
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.lines))
@@ -0,0 +1,225 @@
+import contextvars
+import threading
+import bisect
+import json
+import time
+import os
+from collections import deque
+
+STAGES = ("poll", "normalize", "image_description", "transcription", "completion", "humanized_delay", "send", "reply") #stages of the reply pipeline, reply covering a whole burst from arrival to send
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120) #upper bounds in seconds, with an overflow bucket after the last
+SPAN_LOG_MAX = 10000 #most recent spans kept for export
+METRICS_PROMETHEUS_PATH = 'pipeline_metrics.prom' #prometheus text export
+METRICS_JSONL_PATH = 'pipeline_spans.jsonl' #json lines export of recent spans
+TOKEN_FIELDS = ("prompt_tokens", "completion_tokens") #span fields counted into token totals
+PATH_FIELD = "path" #span field naming the path that produced a reply, counted into path totals
+
+current_conversation = contextvars.ContextVar("current_conversation", default=None) #conversation whose work is running, inherited by the tasks it starts
+
+# class - latency histogram with fixed buckets
+class Histogram:
+    # function: constructor
+    # parameters: self - Histogram
+    # returns: nothing
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS) + 1) #observations per bucket
+        self.count = 0 #observations
+        self.total = 0.0 #sum of observations in seconds
+        self.max = 0.0 #longest observation in seconds
+
+    # function: add an observation
+    # parameters: self - Histogram, seconds - float
+    # returns: nothing
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(HISTOGRAM_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    # function: estimate a quantile as the upper bound of the bucket holding it
+    # parameters: self - Histogram, quantile - float between 0 and 1
+    # returns: seconds - float
+    def quantile(self, quantile):
+        rank = quantile * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(HISTOGRAM_BUCKETS[bucket], self.max) if bucket < len(HISTOGRAM_BUCKETS) else self.max
+        return 0.0
+
+    # function: summarize the histogram
+    # parameters: self - Histogram
+    # returns: summary - dictionary
+    def summary(self):
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0.0, "p50": self.quantile(0.5), "p95": self.quantile(0.95), "max": self.max}
+
+# class - timing of one stage, recorded when its block exits
+class Span:
+    # function: constructor
+    # parameters: self - Span, metrics - PipelineMetrics, stage - string, conversation - string or None, fields - dictionary
+    # returns: nothing
+    def __init__(self, metrics, stage, conversation, fields):
+        self.metrics = metrics
+        self.stage = stage
+        self.conversation = conversation
+        self.fields = fields #extra values recorded with the span, such as token counts
+
+    # function: start timing
+    # parameters: self - Span
+    # returns: span - Span
+    def __enter__(self):
+        self.started_at = time.time() #wall clock start, for the span log
+        self.start_time = time.perf_counter()
+        return self
+
+    # function: stop timing and record the span, marking it if the stage raised
+    # parameters: self - Span, exc_type - exception class or None, exc - exception or None, traceback - traceback or None
+    # returns: False, so exceptions propagate
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None: #if the stage failed
+            self.fields["error"] = exc_type.__name__
+        self.metrics.record(self.stage, time.perf_counter() - self.start_time, self.conversation, self.started_at, **self.fields)
+        return False
+
+# class - per-conversation and global stage histograms, token and response path totals and a log of recent spans
+class PipelineMetrics:
+    # function: constructor
+    # parameters: self - PipelineMetrics
+    # returns: nothing
+    def __init__(self):
+        self.lock = threading.Lock() #lock guarding everything below
+        self.histograms = {} #map of (conversation, stage) to Histogram
+        self.global_histograms = {} #map of stage to Histogram across every conversation
+        self.tokens = {} #map of (conversation, field) to token total
+        self.paths = {} #map of (conversation, path) to replies produced by that path
+        self.spans = deque(maxlen=SPAN_LOG_MAX) #recent spans, oldest dropped first
+
+    # function: time a stage, attributing it to the current conversation unless one is given
+    # parameters: self - PipelineMetrics, stage - string, conversation - string or None, **fields - extra values recorded with the span
+    # returns: span - Span context manager
+    def span(self, stage, conversation=None, **fields):
+        return Span(self, stage, conversation if conversation is not None else current_conversation.get(), fields)
+
+    # function: record a finished stage
+    # parameters: self - PipelineMetrics, stage - string, seconds - float, conversation - string or None, started_at - float or None, **fields - extra values recorded with the span
+    # returns: nothing
+    def record(self, stage, seconds, conversation=None, started_at=None, **fields):
+        with self.lock:
+            self.histograms.setdefault((conversation, stage), Histogram()).observe(seconds)
+            self.global_histograms.setdefault(stage, Histogram()).observe(seconds)
+            for field in TOKEN_FIELDS: #add token counts to the conversation's totals
+                if field in fields:
+                    self.tokens[(conversation, field)] = self.tokens.get((conversation, field), 0) + fields[field]
+            if fields.get(PATH_FIELD) is not None: #count the path that produced the reply
+                self.paths[(conversation, fields[PATH_FIELD])] = self.paths.get((conversation, fields[PATH_FIELD]), 0) + 1
+            self.spans.append({"time": started_at if started_at is not None else time.time() - seconds, "conversation": conversation, "stage": stage, "seconds": seconds, **fields})
+
+    # function: summarize stage timings for one conversation, or across every conversation
+    # parameters: self - PipelineMetrics, conversation - string or None for every conversation
+    # returns: map of stage to summary dictionary, in pipeline order
+    def summary(self, conversation=None):
+        with self.lock:
+            if conversation is None:
+                histograms = self.global_histograms
+            else:
+                histograms = {stage: histogram for (histogram_conversation, stage), histogram in self.histograms.items() if histogram_conversation == conversation}
+            order = {stage: position for position, stage in enumerate(STAGES)}
+            return {stage: histograms[stage].summary() for stage in sorted(histograms, key=lambda stage: order.get(stage, len(STAGES)))}
+
+    # function: get token totals for one conversation, or across every conversation
+    # parameters: self - PipelineMetrics, conversation - string or None for every conversation
+    # returns: map of token field to total - dictionary
+    def token_totals(self, conversation=None):
+        with self.lock:
+            totals = dict.fromkeys(TOKEN_FIELDS, 0)
+            for (token_conversation, field), total in self.tokens.items():
+                if conversation is None or token_conversation == conversation:
+                    totals[field] += total
+            return totals
+
+    # function: get response path totals for one conversation, or across every conversation
+    # parameters: self - PipelineMetrics, conversation - string or None for every conversation
+    # returns: map of path to replies produced by it - dictionary
+    def path_totals(self, conversation=None):
+        with self.lock:
+            totals = {}
+            for (path_conversation, path), total in self.paths.items():
+                if conversation is None or path_conversation == conversation:
+                    totals[path] = totals.get(path, 0) + total
+            return totals
+
+    # function: format stage timings as a text table
+    # parameters: self - PipelineMetrics, conversation - string or None for every conversation
+    # returns: table - string
+    def format_summary(self, conversation=None):
+        lines = [f"{'stage':<18}{'count':>7}{'mean':>9}{'p50':>9}{'p95':>9}{'max':>9}"]
+        for stage, summary in self.summary(conversation).items():
+            lines.append(f"{stage:<18}{summary['count']:>7}{summary['mean']:>9.3f}{summary['p50']:>9.3f}{summary['p95']:>9.3f}{summary['max']:>9.3f}")
+        totals = self.token_totals(conversation)
+        lines.append(f"tokens: {totals['prompt_tokens']} prompt, {totals['completion_tokens']} completion")
+        paths = self.path_totals(conversation)
+        if paths: #if any reply has been produced
+            lines.append("paths: " + ', '.join(f"{path} {total}" for path, total in sorted(paths.items())))
+        return '\n'.join(lines)
+
+    # function: format every per-conversation histogram, token total and response path total in prometheus text format
+    # parameters: self - PipelineMetrics
+    # returns: exposition - string
+    def to_prometheus(self):
+        lines = ["# HELP chat_pilot_stage_seconds Time spent in each stage of the reply pipeline.", "# TYPE chat_pilot_stage_seconds histogram"]
+        with self.lock:
+            for (conversation, stage), histogram in sorted(self.histograms.items(), key=lambda item: (item[0][0] or '', item[0][1])):
+                labels = f'conversation="{escape_label(conversation or "")}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(HISTOGRAM_BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'chat_pilot_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f"chat_pilot_stage_seconds_sum{{{labels}}} {histogram.total}")
+                lines.append(f"chat_pilot_stage_seconds_count{{{labels}}} {histogram.count}")
+            lines += ["# HELP chat_pilot_tokens_total Tokens sent to and generated by the model.", "# TYPE chat_pilot_tokens_total counter"]
+            for (conversation, field), total in sorted(self.tokens.items(), key=lambda item: (item[0][0] or '', item[0][1])):
+                lines.append(f'chat_pilot_tokens_total{{conversation="{escape_label(conversation or "")}",kind="{field.split("_")[0]}"}} {total}')
+            lines += ["# HELP chat_pilot_response_paths_total Replies produced by each response path.", "# TYPE chat_pilot_response_paths_total counter"]
+            for (conversation, path), total in sorted(self.paths.items(), key=lambda item: (item[0][0] or '', item[0][1])):
+                lines.append(f'chat_pilot_response_paths_total{{conversation="{escape_label(conversation or "")}",path="{escape_label(path)}"}} {total}')
+        return '\n'.join(lines) + '\n'
+
+    # function: write the prometheus text export, replacing the old one atomically
+    # parameters: self - PipelineMetrics, path - string
+    # returns: nothing
+    def export_prometheus(self, path=METRICS_PROMETHEUS_PATH):
+        partial = f"{path}.partial"
+        with open(partial, "w") as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        os.replace(partial, path) #publish export, so a scraper never reads half a file
+
+    # function: write the recent spans as json lines
+    # parameters: self - PipelineMetrics, path - string
+    # returns: number of spans written - int
+    def export_jsonl(self, path=METRICS_JSONL_PATH):
+        with self.lock:
+            spans = list(self.spans)
+        with open(path, "w") as spans_file:
+            for span in spans:
+                spans_file.write(json.dumps(span) + '\n')
+        return len(spans)
+
+# function: escape a prometheus label value
+# parameters: value - string
+# returns: escaped value - string
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+_metrics = None #shared pipeline metrics
+_metrics_lock = threading.Lock()
+
+# function: get the shared pipeline metrics
+# parameters: none
+# returns: metrics - PipelineMetrics
+def get_pipeline_metrics():
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = PipelineMetrics()
+        return _metrics
@@ -0,0 +1,144 @@
+from canonicalHandle import canonicalize_handle
+import hashlib
+import re
+
+AUTOMATON_MIN_PHRASES = 60 #phrases before an automaton beats searching for each phrase in turn
+
+# class - automatic reply sent when a message contains a phrase
+class ResponseRule:
+    # function: constructor
+    # parameters: self - ResponseRule, phrase - string, or a regular expression when regex is set, response - string, priority - int, higher wins when several rules match, whole_word - boolean, regex - boolean, case_sensitive - boolean, senders - list of numbers or emails the rule answers, or None for everyone
+    # returns: nothing
+    def __init__(self, phrase, response, priority=0, whole_word=False, regex=False, case_sensitive=False, senders=None):
+        self.phrase = phrase
+        self.response = response
+        self.priority = priority
+        self.whole_word = whole_word
+        self.regex = regex
+        self.case_sensitive = case_sensitive
+        self.senders = None if senders is None else frozenset(canonicalize_handle(sender) for sender in senders) #compare senders however their numbers are formatted
+
+    # function: describe the rule
+    # parameters: self - ResponseRule
+    # returns: description - string
+    def __repr__(self):
+        return f"ResponseRule({self.phrase!r}, {self.response!r}, priority={self.priority})"
+
+# function: check whether a match starts and ends on word boundaries
+# parameters: text - string, start - int, end - int
+# returns: whole word - boolean
+def is_whole_word(text, start, end):
+    before = text[start - 1] if start > 0 else ' '
+    after = text[end] if end < len(text) else ' '
+    return not (before.isalnum() or before == '_') and not (after.isalnum() or after == '_')
+
+# class - aho-corasick automaton finding every phrase in a text in one pass
+class PhraseAutomaton:
+    # function: constructor, building the trie and its failure links
+    # parameters: self - PhraseAutomaton, phrases - list of (phrase, value)
+    # returns: nothing
+    def __init__(self, phrases):
+        self.transitions = [{}] #map of character to next state, per state
+        self.outputs = [[]] #list of (phrase length, value) ending at each state, including those of its failure states
+        for phrase, value in phrases: #add each phrase to the trie
+            state = 0
+            for char in phrase:
+                if char not in self.transitions[state]:
+                    self.transitions.append({})
+                    self.outputs.append([])
+                    self.transitions[state][char] = len(self.transitions) - 1
+                state = self.transitions[state][char]
+            self.outputs[state].append((len(phrase), value))
+        self.failures = [0] * len(self.transitions) #longest proper suffix of each state that is also in the trie
+        queue = list(self.transitions[0].values()) #states one character deep fail to the root
+        for state in queue: #breadth first, so shallower failure links are ready first
+            for char, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                failure = self.failures[state]
+                while failure and char not in self.transitions[failure]:
+                    failure = self.failures[failure]
+                self.failures[next_state] = self.transitions[failure].get(char, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.failures[next_state]] #inherit phrases ending here too
+
+    # function: find every phrase in a text
+    # parameters: self - PhraseAutomaton, text - string
+    # returns: generator of (start, end, value)
+    def find_all(self, text):
+        transitions = self.transitions
+        failures = self.failures
+        outputs = self.outputs
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in transitions[state]:
+                state = failures[state]
+            state = transitions[state].get(char, 0)
+            for length, value in outputs[state]:
+                yield end - length, end, value
+
+# class - phrases searched for one at a time, faster than an automaton for a handful of phrases
+class PhraseList:
+    # function: constructor
+    # parameters: self - PhraseList, phrases - list of (phrase, value)
+    # returns: nothing
+    def __init__(self, phrases):
+        self.phrases = list(phrases)
+
+    # function: find every phrase in a text
+    # parameters: self - PhraseList, text - string
+    # returns: generator of (start, end, value)
+    def find_all(self, text):
+        for phrase, value in self.phrases:
+            start = text.find(phrase)
+            while start != -1:
+                yield start, start + len(phrase), value
+                start = text.find(phrase, start + 1)
+
+# function: build the fastest phrase matcher for a number of phrases
+# parameters: phrases - list of (phrase, value)
+# returns: PhraseList or PhraseAutomaton
+def create_phrase_matcher(phrases):
+    phrases = list(phrases)
+    return PhraseAutomaton(phrases) if len(phrases) >= AUTOMATON_MIN_PHRASES else PhraseList(phrases)
+
+# class - every response rule compiled up front, so each message is matched in one pass
+class RuleEngine:
+    # function: constructor, compiling literal phrases into phrase matchers and regular expressions once
+    # parameters: self - RuleEngine, rules - list of ResponseRule or (phrase, response) tuples
+    # returns: nothing
+    def __init__(self, rules):
+        self.rules = [rule if isinstance(rule, ResponseRule) else ResponseRule(*rule) for rule in rules]
+        self.ranks = [(-rule.priority, index) for index, rule in enumerate(self.rules)] #higher priority first, then earlier rules, like the old first-match order
+        self.folded_phrases = create_phrase_matcher((rule.phrase.lower(), index) for index, rule in enumerate(self.rules) if not rule.regex and not rule.case_sensitive and rule.phrase) #matched against lowercased text
+        self.exact_phrases = create_phrase_matcher((rule.phrase, index) for index, rule in enumerate(self.rules) if not rule.regex and rule.case_sensitive and rule.phrase) #matched against the text as sent
+        self.has_exact_phrases = any(not rule.regex and rule.case_sensitive and rule.phrase for rule in self.rules)
+        self.catch_all = [index for index, rule in enumerate(self.rules) if not rule.regex and not rule.phrase] #an empty phrase is in every message
+        self.fingerprint = hashlib.sha256(repr([(rule.phrase, rule.response, rule.priority, rule.whole_word, rule.regex, rule.case_sensitive, sorted(rule.senders) if rule.senders is not None else None) for rule in self.rules]).encode()).hexdigest()[:16] #identifies the rule set, so checkpoints of other rule sets are not reused
+        self.patterns = [(re.compile(r"\b(?:" + rule.phrase + r")\b" if rule.whole_word else rule.phrase, 0 if rule.case_sensitive else re.IGNORECASE), index) for index, rule in enumerate(self.rules) if rule.regex] #regular expressions, tried one by one
+
+    # function: check whether a rule answers a sender
+    # parameters: self - RuleEngine, index - int, sender - canonical handle or None
+    # returns: applies - boolean
+    def applies_to(self, index, sender):
+        senders = self.rules[index].senders
+        return senders is None or sender in senders
+
+    # function: find the best rule for a message
+    # parameters: self - RuleEngine, text - string, sender - number or email of the sender, or None to match only rules for everyone
+    # returns: rule - ResponseRule, or None if no rule matches
+    def match(self, text, sender=None):
+        if not text:
+            return None
+        sender = canonicalize_handle(sender)
+        best = min((self.ranks[index] for index in self.catch_all if self.applies_to(index, sender)), default=None) #rank of the best matching rule
+        folded_text = text.lower() #lowercase once per message, not once per rule
+        for start, end, index in self.folded_phrases.find_all(folded_text):
+            if (best is None or self.ranks[index] < best) and (not self.rules[index].whole_word or is_whole_word(folded_text, start, end)) and self.applies_to(index, sender):
+                best = self.ranks[index]
+        if self.has_exact_phrases:
+            for start, end, index in self.exact_phrases.find_all(text):
+                if (best is None or self.ranks[index] < best) and (not self.rules[index].whole_word or is_whole_word(text, start, end)) and self.applies_to(index, sender):
+                    best = self.ranks[index]
+        for pattern, index in self.patterns:
+            if (best is None or self.ranks[index] < best) and self.applies_to(index, sender) and pattern.search(text):
+                best = self.ranks[index]
+        return None if best is None else self.rules[best[1]]